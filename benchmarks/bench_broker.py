@@ -0,0 +1,171 @@
+# Connection and routing benchmark for libmeross.broker.
+#
+# The broker runs in a separate process (one core); the simulated devices live
+# in this process and connect with real device credentials. Each device
+# subscribes to its own /appliance/<uuid>/subscribe topic, then a single app
+# connection publishes messages to random devices and the round trip until all
+# messages are delivered is measured.
+#
+#   python benchmarks/bench_broker.py --devices 5000 --messages 50000
+import argparse
+import asyncio
+import multiprocessing
+import random
+import resource
+import ssl
+import time
+
+from libmeross import broker as mb
+from libmeross.mqtt import generate_app_password, generate_password
+
+SHARED_KEY = "bench"
+USER_ID = "1000"
+
+
+def _run_broker(port: int, ready, cert: str | None, key: str | None) -> None:
+    async def main():
+        context = mb.create_ssl_context(cert, key) if cert else None
+        server = await mb.Broker(SHARED_KEY).serve(
+            "127.0.0.1", port, ssl_context=context
+        )
+        ready.set()
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(main())
+
+
+class _Device(asyncio.Protocol):
+    def __init__(self, received: list[int], done: asyncio.Event, total: int):
+        self.received = received
+        self.done = done
+        self.total = total
+        self.ready = asyncio.get_running_loop().create_future()
+        self.buffer = bytearray()
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        buf = self.buffer
+        buf += data
+        while len(buf) >= 2:
+            length, shift, idx = 0, 0, 1
+            while idx < len(buf):
+                byte = buf[idx]
+                length |= (byte & 0x7F) << shift
+                idx += 1
+                if not byte & 0x80:
+                    break
+                shift += 7
+            else:
+                return
+            if idx + length > len(buf):
+                return
+            kind = buf[0] & 0xF0
+            del buf[: idx + length]
+            if kind == mb.SUBACK and not self.ready.done():
+                self.ready.set_result(True)
+            elif kind == mb.PUBLISH:
+                self.received[0] += 1
+                if self.received[0] >= self.total:
+                    self.done.set()
+
+
+async def _connect(port, uuid, idx, received, done, total, context):
+    loop = asyncio.get_running_loop()
+    mac = f"48:e1:e9:{idx >> 16 & 0xFF:02x}:{idx >> 8 & 0xFF:02x}:{idx & 0xFF:02x}"
+    transport, proto = await loop.create_connection(
+        lambda: _Device(received, done, total), "127.0.0.1", port, ssl=context
+    )
+    transport.write(
+        mb.encode_connect(
+            f"fmware:{uuid}_bench", mac, generate_password(USER_ID, mac, SHARED_KEY)
+        )
+        + mb.encode_subscribe(1, [(f"/appliance/{uuid}/subscribe", 1)])
+    )
+    await proto.ready
+    return transport
+
+
+async def _bench(argv) -> None:
+    context = None
+    if argv.cert:
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+
+    received, done = [0], asyncio.Event()
+    uuids = [f"{random.getrandbits(128):032x}" for _ in range(argv.devices)]
+
+    start = time.perf_counter()
+    transports = []
+    for offset in range(0, argv.devices, argv.batch):
+        batch = uuids[offset : offset + argv.batch]
+        transports += await asyncio.gather(
+            *(
+                _connect(argv.port, uuid, offset + i, received, done, argv.messages, context)
+                for i, uuid in enumerate(batch)
+            )
+        )
+    elapsed = time.perf_counter() - start
+    print(f"Connected {argv.devices} devices in {elapsed:.2f}s "
+          f"({argv.devices / elapsed:.0f} connects/s)")
+
+    reader, writer = await asyncio.open_connection("127.0.0.1", argv.port, ssl=context)
+    writer.write(
+        mb.encode_connect("app:bench", USER_ID, generate_app_password(USER_ID, SHARED_KEY))
+    )
+    await reader.readexactly(4)
+
+    payload = b'{"header":{"namespace":"Appliance.Control.ToggleX","method":"SET"},"payload":{"togglex":{"channel":0,"onoff":1}}}'
+    start = time.perf_counter()
+    for i in range(argv.messages):
+        uuid = uuids[i % len(uuids)] if argv.round_robin else random.choice(uuids)
+        writer.write(mb.encode_publish(f"/appliance/{uuid}/subscribe", payload))
+        if i % 1000 == 999:
+            await writer.drain()
+    await writer.drain()
+    try:
+        await asyncio.wait_for(done.wait(), argv.timeout)
+    except asyncio.TimeoutError:
+        print("Timed out waiting for deliveries")
+    elapsed = time.perf_counter() - start
+    print(f"Delivered {received[0]}/{argv.messages} messages in {elapsed:.2f}s "
+          f"({received[0] / elapsed:.0f} msg/s)")
+
+    writer.close()
+    for transport in transports:
+        transport.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=250)
+    parser.add_argument("--port", type=int, default=18883)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--round-robin", action="store_true")
+    parser.add_argument("--cert", type=str, default=None)
+    parser.add_argument("--cert-key", type=str, default=None)
+    argv = parser.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < argv.devices * 2 + 64:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, argv.devices * 2 + 64), hard))
+
+    ready = multiprocessing.Event()
+    proc = multiprocessing.Process(
+        target=_run_broker, args=(argv.port, ready, argv.cert, argv.cert_key), daemon=True
+    )
+    proc.start()
+    ready.wait(10)
+    try:
+        asyncio.run(_bench(argv))
+    finally:
+        proc.terminate()
+
+
+if __name__ == "__main__":
+    main()
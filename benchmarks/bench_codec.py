@@ -0,0 +1,123 @@
+# Pack/unpack benchmark: caterpillar vs. the precompiled codecs.
+#
+# Every operation runs on the same random headers, records and partition
+# tables through caterpillar's generic pack()/unpack() and through the
+# struct.Struct based codecs from libmeross.ambz2.layout, and the results are
+# compared before anything is timed.
+#
+#   python benchmarks/bench_codec.py --count 20000
+import argparse
+import random
+import time
+
+from caterpillar.py import pack, unpack
+from rich.console import Console
+from rich.table import Table
+
+from libmeross.ambz2.layout import (
+    FF_32,
+    HEADER_CODEC,
+    RECORD_CODEC,
+    Header,
+    ImageType,
+    PartitionTable,
+    PartitionTableInfo,
+    PartitionTableRecord,
+    PartitionType,
+    pack_partition_table,
+    unpack_partition_table,
+)
+
+
+def _header(rng: random.Random) -> Header:
+    return Header(
+        segment_size=rng.getrandbits(20),
+        next_=rng.getrandbits(32),
+        type=rng.choice(list(ImageType)),
+        encrypted=rng.random() < 0.5,
+        is_special=rng.random() < 0.5,
+        serial=rng.getrandbits(32),
+    )
+
+
+def _record(rng: random.Random) -> PartitionTableRecord:
+    return PartitionTableRecord(
+        start=rng.getrandbits(24),
+        length=rng.getrandbits(24),
+        type=rng.choice(list(PartitionType)),
+        hkey_valid=True,
+        hash_key=rng.randbytes(32),
+    )
+
+
+def _table(rng: random.Random) -> PartitionTable:
+    records = [_record(rng) for _ in range(rng.randint(1, 6))]
+    user_data = rng.randbytes(rng.randint(0, 64))
+    return PartitionTable(
+        hdr=_header(rng),
+        info=PartitionTableInfo(
+            eFWV=rng.getrandbits(8),
+            num=len(records),
+            fw1_idx=1,
+            fw2_idx=2,
+            user_len=len(user_data),
+            boot_record=_record(rng),
+            records=records,
+            user_data=user_data,
+        ),
+        hash=FF_32,
+    )
+
+
+def _time(func, items) -> float:
+    start = time.perf_counter()
+    for item in items:
+        func(item)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=20000)
+    argv = parser.parse_args()
+
+    rng = random.Random(1)
+    headers = [_header(rng) for _ in range(argv.count)]
+    records = [_record(rng) for _ in range(argv.count)]
+    tables = [_table(rng) for _ in range(argv.count // 10)]
+    cases = [
+        ("Header", headers, HEADER_CODEC.pack, HEADER_CODEC.unpack),
+        ("PartitionTableRecord", records, RECORD_CODEC.pack, RECORD_CODEC.unpack),
+        ("PartitionTable", tables, pack_partition_table, unpack_partition_table),
+    ]
+
+    table = Table(title=f"caterpillar vs. codec ({argv.count} objects)")
+    table.add_column("Struct")
+    table.add_column("Operation")
+    table.add_column("caterpillar", justify="right")
+    table.add_column("codec", justify="right")
+    table.add_column("Speedup", justify="right")
+    for name, objects, codec_pack, codec_unpack in cases:
+        model = type(objects[0])
+        blobs = [pack(obj) for obj in objects]
+        assert [codec_pack(obj) for obj in objects] == blobs
+        assert [codec_pack(codec_unpack(blob)) for blob in blobs] == blobs
+
+        for operation, slow, fast, items in (
+            ("pack", pack, codec_pack, objects),
+            ("unpack", lambda blob: unpack(model, blob), codec_unpack, blobs),
+        ):
+            slow_time = _time(slow, items)
+            fast_time = _time(fast, items)
+            table.add_row(
+                name,
+                operation,
+                f"{len(items) / slow_time:,.0f}/s",
+                f"{len(items) / fast_time:,.0f}/s",
+                f"{slow_time / fast_time:.1f}x",
+            )
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    main()
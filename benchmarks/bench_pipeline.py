@@ -0,0 +1,222 @@
+# Throughput benchmark for the inbound message pipeline.
+#
+# A local broker (libmeross.broker) runs in its own process and a number of
+# synthetic publisher processes push signed PUSH messages for many devices.
+# A single paho client subscribed to /appliance/+/publish feeds either the
+# in-process InboundPipeline or a ShardedPipeline with N worker processes.
+# Per-device ordering of the results is checked at the end.
+#
+#   python benchmarks/bench_pipeline.py --workers 0 --messages 100000
+#   python benchmarks/bench_pipeline.py --workers 4 --messages 100000
+#
+# With --direct the broker and paho are skipped and the payloads are
+# submitted to the pipeline from memory, which measures the pipeline alone.
+import argparse
+import asyncio
+import multiprocessing
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+from libmeross import broker as mb
+from libmeross.mqtt import generate_app_password, generate_password
+from libmeross.pipeline import (
+    InboundPipeline,
+    ShardedPipeline,
+    Verdict,
+    process_message,
+)
+from libmeross.protocol import LocalMessage
+
+SHARED_KEY = "bench"
+USER_ID = "1000"
+
+
+def _run_broker(port: int, ready) -> None:
+    async def main():
+        # the consumer is expected to fall behind, never drop it
+        broker = mb.Broker(SHARED_KEY, write_high_water=1 << 30)
+        server = await broker.serve("127.0.0.1", port)
+        ready.set()
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(main())
+
+
+def _payloads(publisher: int, devices: int, messages: int) -> list[tuple[str, bytes]]:
+    result = []
+    for seq in range(messages):
+        uuid = f"{publisher:04x}{seq % devices:028x}"
+        message = LocalMessage.new(
+            "PUSH",
+            "Appliance.System.Online",
+            {"online": {"status": 1, "id": str(seq)}},
+            shared_key=SHARED_KEY,
+        )
+        result.append((uuid, message.model_dump_json(by_alias=True).encode()))
+    return result
+
+
+def _run_publisher(idx: int, port: int, devices: int, messages: int, start) -> None:
+    async def main():
+        payloads = _payloads(idx, devices, messages)
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        mac = f"48:e1:e9:00:{idx >> 8 & 0xFF:02x}:{idx & 0xFF:02x}"
+        writer.write(
+            mb.encode_connect(
+                f"fmware:bench{idx}_x", mac, generate_password(USER_ID, mac, SHARED_KEY)
+            )
+        )
+        await reader.readexactly(4)
+        start.wait()
+        for i, (uuid, payload) in enumerate(payloads):
+            writer.write(mb.encode_publish(f"/appliance/{uuid}/publish", payload))
+            if i % 500 == 499:
+                await writer.drain()
+        await writer.drain()
+        await asyncio.sleep(1)
+        writer.close()
+
+    asyncio.run(main())
+
+
+class _Sink:
+    def __init__(self, total: int) -> None:
+        self.total = total
+        self.count = 0
+        self.last: dict[str, int] = {}
+        self.out_of_order = 0
+        self.done = threading.Event()
+
+    def __call__(self, uuid: str, verdict: Verdict, payload: dict | None) -> None:
+        self.count += 1
+        if verdict is Verdict.ACCEPTED:
+            seq = int(payload["online"]["id"])
+            if seq < self.last.get(uuid, -1):
+                self.out_of_order += 1
+            self.last[uuid] = seq
+        if self.count >= self.total:
+            self.done.set()
+
+
+def _make_pipeline(argv, sink: _Sink):
+    if argv.workers:
+        pipeline = ShardedPipeline(
+            lambda r: sink(r.uuid, r.verdict, r.payload),
+            workers=argv.workers,
+            batch_size=argv.batch,
+            shared_key=SHARED_KEY,
+        )
+        return pipeline, pipeline.submit
+
+    pipeline = InboundPipeline(SHARED_KEY)
+
+    def submit(uuid: str, payload: bytes) -> None:
+        result = process_message(pipeline, uuid, 0, payload)
+        sink(uuid, result.verdict, result.payload)
+
+    return pipeline, submit
+
+
+def _flusher(pipeline, sink: _Sink) -> None:
+    while not sink.done.wait(0.05):
+        pipeline.flush()
+
+
+def _bench_direct(argv) -> None:
+    total = argv.publishers * argv.messages
+    payloads = [
+        item
+        for idx in range(argv.publishers)
+        for item in _payloads(idx, argv.devices, argv.messages)
+    ]
+    sink = _Sink(total)
+    pipeline, submit = _make_pipeline(argv, sink)
+    if argv.workers:
+        threading.Thread(target=_flusher, args=(pipeline, sink), daemon=True).start()
+
+    start = time.perf_counter()
+    for uuid, payload in payloads:
+        submit(uuid, payload)
+    sink.done.wait(argv.timeout)
+    _report(argv, sink, time.perf_counter() - start, pipeline)
+
+
+def _bench_mqtt(argv) -> None:
+    total = argv.publishers * argv.messages
+    ready, start = multiprocessing.Event(), multiprocessing.Event()
+    broker = multiprocessing.Process(
+        target=_run_broker, args=(argv.port, ready), daemon=True
+    )
+    broker.start()
+    ready.wait(10)
+
+    sink = _Sink(total)
+    pipeline, submit = _make_pipeline(argv, sink)
+
+    client = mqtt.Client(client_id="app:bench", protocol=mqtt.MQTTv311)
+    client.username_pw_set(USER_ID, generate_app_password(USER_ID, SHARED_KEY))
+    subscribed = threading.Event()
+    client.on_connect = lambda c, u, f, rc, p=None: c.subscribe("/appliance/+/publish")
+    client.on_subscribe = lambda *args: subscribed.set()
+    client.on_message = lambda c, u, msg: submit(msg.topic.split("/")[2], msg.payload)
+    client.connect("127.0.0.1", argv.port)
+    client.loop_start()
+    subscribed.wait(10)
+    if argv.workers:
+        threading.Thread(target=_flusher, args=(pipeline, sink), daemon=True).start()
+
+    publishers = [
+        multiprocessing.Process(
+            target=_run_publisher,
+            args=(idx, argv.port, argv.devices, argv.messages, start),
+            daemon=True,
+        )
+        for idx in range(argv.publishers)
+    ]
+    for process in publishers:
+        process.start()
+    time.sleep(1 + argv.messages / 20000)  # payload generation
+
+    begin = time.perf_counter()
+    start.set()
+    sink.done.wait(argv.timeout)
+    _report(argv, sink, time.perf_counter() - begin, pipeline)
+
+    client.loop_stop()
+    for process in publishers + [broker]:
+        process.terminate()
+
+
+def _report(argv, sink: _Sink, elapsed: float, pipeline) -> None:
+    mode = f"{argv.workers} workers" if argv.workers else "in-process"
+    print(
+        f"[{mode}] processed {sink.count}/{sink.total} messages in {elapsed:.2f}s "
+        f"({sink.count / elapsed:.0f} msg/s), out of order: {sink.out_of_order}"
+    )
+    if isinstance(pipeline, ShardedPipeline):
+        pipeline.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=0)
+    parser.add_argument("--publishers", type=int, default=4)
+    parser.add_argument("--devices", type=int, default=500)
+    parser.add_argument("--messages", type=int, default=25000, help="per publisher")
+    parser.add_argument("--batch", type=int, default=256)
+    parser.add_argument("--port", type=int, default=18884)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--direct", action="store_true")
+    argv = parser.parse_args()
+
+    if argv.direct:
+        _bench_direct(argv)
+    else:
+        _bench_mqtt(argv)
+
+
+if __name__ == "__main__":
+    main()
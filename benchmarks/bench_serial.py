@@ -0,0 +1,106 @@
+# Serial throughput benchmark against the simulated chip console.
+#
+# The simulator paces its output to the selected baud rate, so the numbers
+# show how close the readers get to the line rate (baud / 10 bytes/s of
+# console output), and how much of the flash that means per second.
+#
+#   python benchmarks/bench_serial.py --length 0x10000
+#   python benchmarks/bench_serial.py --baudrate 1500000 --length 0x40000
+#
+# Modes:
+#   fallback      DB dumps in fallback mode (plain pyserial)
+#   threaded      DB dumps in fallback mode through SerialTransport
+#   download      DW dumps in download mode
+#   verified      DW dumps checked with hashq (read --binary)
+import argparse
+import functools
+import io
+import random
+import time
+
+import serial
+
+from rich.console import Console
+from rich.table import Table
+
+from libmeross.commands.chip.amebaz2.download import (
+    VerifiedReader,
+    change_baudrate,
+    enter_download_mode,
+)
+from libmeross.commands.chip.amebaz2.dump import ChunkedReader, read_memory
+from libmeross.commands.chip.amebaz2.simulator import ChipSimulator
+from libmeross.commands.chip.amebaz2.transport import SerialTransport
+from libmeross.commands.chip.amebaz2.util import init_fallback_connection
+
+MODES = ("fallback", "threaded", "download", "verified")
+
+
+def run(mode: str, flash: bytes, baudrate: int, length: int, chunk_size: int) -> dict:
+    with ChipSimulator(flash) as simulator:
+        ser = serial.Serial(simulator.port, 115200, timeout=0.5)
+        if mode != "fallback":
+            ser = SerialTransport(ser)
+        assert init_fallback_connection(ser, Console())
+
+        download = mode in ("download", "verified")
+        if download:
+            enter_download_mode(ser)
+            assert change_baudrate(ser, baudrate)
+        elif baudrate != 115200:
+            # the fallback console has no ucfg, just run the link faster
+            simulator.baudrate = ser.baudrate = baudrate
+
+        reader = ChunkedReader(
+            ser,
+            chunk_size,
+            reader=(
+                VerifiedReader(ser)
+                if mode == "verified"
+                else functools.partial(read_memory, words=download, prompt=not download)
+            ),
+            prompt=not download,
+        )
+        output = io.BytesIO()
+        sent = simulator.bytes_sent
+        start = time.monotonic()
+        assert reader.read(0x98000000, length, output)
+        elapsed = time.monotonic() - start
+        assert output.getvalue() == flash[:length]
+        ser.close()
+        return {
+            "elapsed": elapsed,
+            "rate": length / elapsed,
+            "line": (simulator.bytes_sent - sent) / elapsed,
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--baudrate", type=int, default=921600)
+    parser.add_argument("--length", type=lambda x: int(x, 0), default=0x10000)
+    parser.add_argument("--chunk-size", type=lambda x: int(x, 0), default=0x8000)
+    parser.add_argument("--modes", type=lambda x: x.split(","), default=MODES)
+    argv = parser.parse_args()
+
+    flash = random.Random(1).randbytes(max(argv.length, 0x10000))
+    table = Table(title=f"Serial throughput at {argv.baudrate} baud")
+    table.add_column("Mode")
+    table.add_column("Time", justify="right")
+    table.add_column("Data", justify="right")
+    table.add_column("Line", justify="right")
+    table.add_column("Line usage", justify="right")
+    for mode in argv.modes:
+        result = run(mode, flash, argv.baudrate, argv.length, argv.chunk_size)
+        table.add_row(
+            mode,
+            f"{result['elapsed']:.2f}s",
+            f"{result['rate'] / 1024:.1f} KiB/s",
+            f"{result['line'] / 1024:.1f} KiB/s",
+            f"{result['line'] / (argv.baudrate / 10):.0%}",
+        )
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    main()
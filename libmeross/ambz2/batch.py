@@ -0,0 +1,220 @@
+# Batch verification of many flash dumps (see verify.py for the checks).
+#
+# Files are spread over a process pool; each worker hashes its file (SHA-256
+# of the content) before verifying it. Results are cached by that hash in a
+# JSON file, together with the size and mtime of every path seen, so on a
+# rerun:
+#
+#   - files whose size and mtime did not change are not read at all
+#   - other files are hashed, but only verified if their content is new
+#     (renamed or copied dumps are verified once)
+#
+# The cache is bound to the set of HMAC keys: results of other keys are not
+# reused.
+import csv
+import hashlib
+import json
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field, fields
+from pathlib import Path
+from typing import Iterator
+
+from libmeross.ambz2.image import FlashImage, FlashImageError
+from libmeross.ambz2.verify import verify
+
+CACHE_VERSION = 1
+CACHE_NAME = ".verify-cache.json"
+CHUNK_SIZE = 0x100000
+
+STATUS_PASSED = "passed"
+STATUS_FAILED = "failed"
+STATUS_ERROR = "error"
+
+
+@dataclass
+class DumpSummary:
+    path: str
+    sha256: str
+    status: str  # passed, failed or error
+    calibration: str = ""
+    partition_table: str = ""
+    segments_passed: int = 0
+    segments_failed: int = 0
+    segments_skipped: int = 0
+    failed: list[str] = field(default_factory=list)
+    error: str = ""
+    cached: bool = False
+
+
+def content_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fp:
+        while chunk := fp.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def summarize(path: Path, sha256: str, keys: list[bytes]) -> DumpSummary:
+    summary = DumpSummary(str(path), sha256, STATUS_ERROR)
+    try:
+        with FlashImage(path) as image:
+            checks = verify(image, keys)
+    except (OSError, ValueError, FlashImageError) as e:
+        summary.error = str(e)
+        return summary
+
+    calibration, table, *segments = checks
+    summary.calibration = calibration.status
+    summary.partition_table = table.status
+    for check in segments:
+        if check.passed is None:
+            summary.segments_skipped += 1
+        elif check.passed:
+            summary.segments_passed += 1
+        else:
+            summary.segments_failed += 1
+    summary.failed = [f"{c.region}: {c.name}" for c in checks if c.passed is False]
+    summary.status = STATUS_FAILED if summary.failed else STATUS_PASSED
+    return summary
+
+
+# --- cache ---
+def keys_id(keys: list[bytes]) -> str:
+    return hashlib.sha256(b"".join(keys)).hexdigest()[:16]
+
+
+class VerifyCache:
+    """Results by content hash, plus (size, mtime) -> content hash per path."""
+
+    def __init__(self, path: Path | None, keys: list[bytes]) -> None:
+        self.path = path
+        self.keys = keys_id(keys)
+        self.results: dict[str, dict] = {}
+        self.files: dict[str, tuple[int, int, str]] = {}
+        if path is None or not path.is_file():
+            return
+        try:
+            data = json.loads(path.read_text())
+        except (OSError, ValueError):
+            return  # rebuilt on save
+        if data.get("version") != CACHE_VERSION or data.get("keys") != self.keys:
+            return
+        self.results = data.get("results", {})
+        self.files = {name: tuple(value) for name, value in data.get("files", {}).items()}
+
+    @staticmethod
+    def _stat(path: Path) -> tuple[int, int]:
+        stat = path.stat()
+        return stat.st_size, stat.st_mtime_ns
+
+    def known_hash(self, path: Path) -> str | None:
+        entry = self.files.get(str(path))
+        if entry is None or entry[:2] != self._stat(path):
+            return None
+        return entry[2] if entry[2] in self.results else None
+
+    def get(self, path: Path, sha256: str) -> DumpSummary:
+        # only called for hashes the cache knows
+        return DumpSummary(**self.results[sha256], path=str(path), sha256=sha256, cached=True)
+
+    def put(self, path: Path, summary: DumpSummary) -> None:
+        self.files[str(path)] = (*self._stat(path), summary.sha256)
+        # errors (e.g. unreadable files) are retried on the next run
+        if summary.status != STATUS_ERROR:
+            result = asdict(summary)
+            for name in ("path", "sha256", "cached"):
+                del result[name]
+            self.results[summary.sha256] = result
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        data = {
+            "version": CACHE_VERSION,
+            "keys": self.keys,
+            "results": self.results,
+            "files": self.files,
+        }
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(data))
+        os.replace(tmp, self.path)
+
+
+# --- workers ---
+_keys: list[bytes] = []
+_known: frozenset[str] = frozenset()
+
+
+def _init_worker(keys: list[bytes], known: frozenset[str]) -> None:
+    global _keys, _known
+    _keys, _known = keys, known
+
+
+def _verify_worker(path: Path) -> DumpSummary | str:
+    """Summary of a dump, or only its content hash if the cache knows it."""
+    try:
+        sha256 = content_hash(path)
+    except OSError as e:
+        return DumpSummary(str(path), "", STATUS_ERROR, error=str(e))
+    if sha256 in _known:
+        return sha256
+    return summarize(path, sha256, _keys)
+
+
+def verify_paths(
+    files: list[Path],
+    keys: list[bytes] | None = None,
+    cache: VerifyCache | None = None,
+    workers: int | None = None,
+) -> Iterator[DumpSummary]:
+    """Summaries of all *files*, in order; new results are added to *cache*."""
+    keys = keys or []
+    cache = cache or VerifyCache(None, keys)
+    pending = []
+    for path in files:
+        try:
+            sha256 = cache.known_hash(path)
+        except OSError:
+            sha256 = None
+        pending.append((path, sha256))
+
+    todo = [path for path, sha256 in pending if sha256 is None]
+    known = frozenset(cache.results)
+    workers = min(workers or os.cpu_count() or 1, max(len(todo), 1))
+    if workers == 1:
+        _init_worker(keys, known)
+        results = map(_verify_worker, todo)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(keys, known))
+        chunksize = max(1, len(todo) // (workers * 4))
+        results = executor.map(_verify_worker, todo, chunksize=chunksize)
+
+    try:
+        for path, sha256 in pending:
+            if sha256 is not None:
+                yield cache.get(path, sha256)
+                continue
+            result = next(results)
+            summary = cache.get(path, result) if isinstance(result, str) else result
+            if summary.sha256:
+                cache.put(path, summary)
+            yield summary
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+
+# --- output ---
+def write_csv(summaries: list[DumpSummary], path: Path) -> None:
+    with open(path, "w", newline="") as fp:
+        writer = csv.DictWriter(fp, [f.name for f in fields(DumpSummary)])
+        writer.writeheader()
+        for summary in summaries:
+            writer.writerow(asdict(summary) | {"failed": "; ".join(summary.failed)})
+
+
+def write_json(summaries: list[DumpSummary], path: Path) -> None:
+    path.write_text(json.dumps([asdict(summary) for summary in summaries], indent=2))
@@ -0,0 +1,155 @@
+# Precompiled codecs for fixed-size caterpillar structs.
+#
+# caterpillar packs and unpacks every field on its own (one context, one
+# stream access and one struct.Struct per field), which dominates when
+# thousands of headers or records are decoded while scanning a dump. A Codec
+# translates the members of a fixed-size struct into a single struct.Struct
+# format once:
+#
+#   uint8/16/32, boolean  -> B/H/I, ?
+#   IntEnum fields        -> format of the enum's __struct__
+#   Bytes(n)              -> ns
+#   padding[n]            -> nx
+#
+# and builds the same model objects as caterpillar (unknown enum values stay
+# plain integers). Members with a dynamic length, conditions or nested structs
+# are not compiled: Codec(model) rejects them with a CodecError, and
+# Codec(model, prefix=True) compiles only the fixed members in front of them,
+# leaving the rest to the caller (or caterpillar).
+import struct
+
+from collections.abc import Callable
+
+from caterpillar.fields import (
+    INVALID_DEFAULT,
+    Bytes,
+    Enum,
+    Padding,
+    PyStructFormattedField,
+    has_default,
+)
+
+
+class CodecError(Exception):
+    pass
+
+
+def _enum_decoder(model, default):
+    members = {member.value: member for member in model}
+
+    def decode(value):
+        member = members.get(value)
+        if member is not None:
+            return member
+        # same as caterpillar: the field default, else the raw value
+        return value if default is INVALID_DEFAULT else default
+
+    return decode
+
+
+class Codec:
+    """Pack/unpack a fixed-size caterpillar struct with one struct.Struct.
+
+    >>> HEADER = Codec(Header)
+    >>> header = HEADER.unpack(data, offset)  # same as unpack(Header, data[offset:])
+    >>> HEADER.pack(header) == pack(header)
+    True
+    """
+
+    def __init__(self, model: type, prefix: bool = False) -> None:
+        self.model = model
+        self.names: list[str] = []  # members set on the model, in order
+        self.tail: list[str] = []  # members not compiled (prefix=True)
+        self._decoders: dict[int, Callable[[int], object]] = {}
+        self._bytes: dict[int, int] = {}  # index -> length
+        order, fmt = None, []
+        for member in model.__struct__.fields:
+            field = member.field
+            if self.tail:
+                self.tail.append(member.name)
+                continue
+            try:
+                ch = self._format(field)
+            except CodecError as e:
+                if not prefix:
+                    raise CodecError(f"{model.__name__}.{member.name}: {e}")
+                self.tail.append(member.name)
+                continue
+            if order not in (None, field.order.ch):
+                raise CodecError(f"{model.__name__}.{member.name}: mixed byte order")
+            order = field.order.ch
+            fmt.append(ch)
+            if not isinstance(field.struct, Padding):
+                if isinstance(field.struct, Enum):
+                    default = field.struct.default
+                    if not has_default(default):
+                        default = field.default if has_default(field.default) else INVALID_DEFAULT
+                    self._decoders[len(self.names)] = _enum_decoder(field.struct.model, default)
+                elif isinstance(field.struct, Bytes) and isinstance(field.struct.length, int):
+                    self._bytes[len(self.names)] = field.struct.length
+                self.names.append(member.name)
+        self.struct = struct.Struct((order or "<") + "".join(fmt))
+        self.size = self.struct.size
+
+    @staticmethod
+    def _format(field) -> str:
+        if field._has_cond or field._has_offset or field.bits:
+            raise CodecError("conditional, offset or bit fields are not supported")
+        amount = field.amount
+        atom = field.struct
+        if isinstance(atom, Padding):
+            if atom.fill != b"\x00" or not isinstance(amount, int):
+                raise CodecError("only fixed zero padding is supported")
+            return f"{amount}x"
+        if amount not in (None, 1) and not isinstance(amount, bool):
+            raise CodecError("sequences are not supported")
+        if isinstance(atom, Enum):
+            atom = atom.struct
+        if isinstance(atom, PyStructFormattedField):
+            return atom.text
+        if isinstance(atom, Bytes) and isinstance(atom.length, int):
+            return f"{atom.length}s"
+        raise CodecError(f"{atom!r} has no fixed size")
+
+    # --- unpack ---
+    def fields(self, data, offset: int = 0) -> dict:
+        """The compiled members at *offset* as a dict (no model object)."""
+        if offset < 0 or offset + self.size > len(data):
+            raise CodecError(
+                f"{self.model.__name__} needs {self.size} bytes at {offset:#x}, "
+                f"buffer has {len(data)}"
+            )
+        values = list(self.struct.unpack_from(data, offset))
+        for idx, decode in self._decoders.items():
+            values[idx] = decode(values[idx])
+        return dict(zip(self.names, values))
+
+    def unpack(self, data, offset: int = 0):
+        if self.tail:
+            raise CodecError(f"{self.model.__name__} is not fixed-size, use fields()")
+        return self.model(**self.fields(data, offset))
+
+    def unpack_many(self, data, count: int, offset: int = 0) -> list:
+        return [self.unpack(data, offset + idx * self.size) for idx in range(count)]
+
+    # --- pack ---
+    def values(self, obj) -> list:
+        values = [getattr(obj, name) for name in self.names]
+        for idx in self._decoders:
+            values[idx] = int(values[idx])
+        for idx, length in self._bytes.items():
+            # struct would silently pad or cut, caterpillar writes as is
+            if len(values[idx]) != length:
+                raise CodecError(
+                    f"{self.model.__name__}.{self.names[idx]} must be {length} bytes long"
+                )
+        return values
+
+    def pack(self, obj) -> bytes:
+        if self.tail:
+            raise CodecError(f"{self.model.__name__} is not fixed-size")
+        return self.struct.pack(*self.values(obj))
+
+    def pack_into(self, buffer, offset: int, obj) -> None:
+        self.struct.pack_into(buffer, offset, *self.values(obj))
+
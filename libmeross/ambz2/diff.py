@@ -0,0 +1,159 @@
+# Sector-level diff of flash dumps.
+#
+# Both dumps are memory-mapped (FlashImage) and every 4 KiB sector is hashed
+# once; only sectors with different digests are compared byte by byte. The
+# digests of a dump can be kept and reused, so comparing many dumps against
+# one reference reads the reference only once.
+#
+# Within runs of changed sectors the differing byte ranges are found by
+# XOR-ing both runs as integers and searching the result for non-zero bytes,
+# which keeps the per-byte work in C.
+import hashlib
+import re
+
+from dataclasses import dataclass, field
+
+from libmeross.ambz2.image import FlashImage
+
+SECTOR_SIZE = 0x1000
+UNMAPPED = "unmapped"
+
+_NONZERO = re.compile(rb"[^\x00]+")
+
+
+@dataclass
+class Change:
+    offset: int
+    length: int
+    region: str
+
+    @property
+    def end(self) -> int:
+        return self.offset + self.length
+
+
+@dataclass
+class RegionDiff:
+    name: str
+    sectors: int = 0
+    bytes: int = 0
+    changes: list[Change] = field(default_factory=list)
+
+
+@dataclass
+class DiffResult:
+    sectors: int  # compared (of the larger dump)
+    changed_sectors: list[int]
+    changes: list[Change]
+
+    @property
+    def identical(self) -> bool:
+        return not self.changes
+
+    @property
+    def changed_bytes(self) -> int:
+        return sum(change.length for change in self.changes)
+
+    def by_region(self) -> list[RegionDiff]:
+        regions: dict[str, RegionDiff] = {}
+        sectors: set[tuple[str, int]] = set()
+        for change in self.changes:
+            region = regions.setdefault(change.region, RegionDiff(change.region))
+            region.bytes += change.length
+            region.changes.append(change)
+            # a sector may hold changes of two regions (e.g. sector 0)
+            first, last = change.offset // SECTOR_SIZE, (change.end - 1) // SECTOR_SIZE
+            sectors.update((change.region, sector) for sector in range(first, last + 1))
+        for name, _ in sectors:
+            regions[name].sectors += 1
+        return list(regions.values())
+
+
+def sector_digests(data: memoryview, sector_size: int = SECTOR_SIZE) -> list[bytes]:
+    """SHA-1 of every sector (the last one may be shorter)."""
+    sha1 = hashlib.sha1
+    return [
+        sha1(data[pos : pos + sector_size]).digest()
+        for pos in range(0, len(data), sector_size)
+    ]
+
+
+def changed_sectors(a: list[bytes], b: list[bytes]) -> list[int]:
+    # sectors present in only one dump count as changed
+    changed = [idx for idx, (x, y) in enumerate(zip(a, b)) if x != y]
+    return changed + list(range(min(len(a), len(b)), max(len(a), len(b))))
+
+
+def sector_runs(sectors: list[int]) -> list[tuple[int, int]]:
+    # [1, 2, 3, 7] -> [(1, 4), (7, 8)] as (first, end) sector
+    runs: list[tuple[int, int]] = []
+    for sector in sectors:
+        if runs and runs[-1][1] == sector:
+            runs[-1] = (runs[-1][0], sector + 1)
+        else:
+            runs.append((sector, sector + 1))
+    return runs
+
+
+def byte_ranges(a: memoryview, b: memoryview, start: int, end: int) -> list[tuple[int, int]]:
+    """(offset, length) of all differing bytes in [start, end)."""
+    end_a, end_b = min(end, len(a)), min(end, len(b))
+    common = min(end_a, end_b)
+    ranges = []
+    if common > start:
+        x = int.from_bytes(a[start:common], "little")
+        y = int.from_bytes(b[start:common], "little")
+        xor = (x ^ y).to_bytes(common - start, "little")
+        ranges = [(start + m.start(), m.end() - m.start()) for m in _NONZERO.finditer(xor)]
+    else:
+        common = start
+    # the tail of the longer dump differs as a whole
+    tail = max(end_a, end_b)
+    if tail > common:
+        if ranges and sum(ranges[-1]) == common:
+            ranges[-1] = (ranges[-1][0], tail - ranges[-1][0])
+        else:
+            ranges.append((common, tail - common))
+    return ranges
+
+
+def _split(image: FlashImage, offset: int, length: int) -> list[Change]:
+    # cut a byte range at region boundaries
+    changes = []
+    end = offset + length
+    while offset < end:
+        region = image.region_at(offset)
+        if region is None:
+            # up to the next region that starts inside the range
+            starts = [r.offset for r in image.regions if offset < r.offset < end]
+            stop = min(starts, default=end)
+            name = UNMAPPED
+        else:
+            # a partition may start inside a fixed region (see region_at)
+            stop = min(region.end, end)
+            starts = [r.offset for r in image.regions if offset < r.offset < stop]
+            stop = min(starts, default=stop)
+            name = region.name
+        if changes and changes[-1].region == name and changes[-1].end == offset:
+            changes[-1].length += stop - offset
+        else:
+            changes.append(Change(offset, stop - offset, name))
+        offset = stop
+    return changes
+
+
+def diff(
+    a: FlashImage,
+    b: FlashImage,
+    digests_a: list[bytes] | None = None,
+    digests_b: list[bytes] | None = None,
+) -> DiffResult:
+    """Compare two dumps; regions are taken from the layout of *a*."""
+    digests_a = digests_a if digests_a is not None else sector_digests(a.data)
+    digests_b = digests_b if digests_b is not None else sector_digests(b.data)
+    sectors = changed_sectors(digests_a, digests_b)
+    changes = []
+    for first, end in sector_runs(sectors):
+        for offset, length in byte_ranges(a.data, b.data, first * SECTOR_SIZE, end * SECTOR_SIZE):
+            changes += _split(a, offset, length)
+    return DiffResult(max(len(digests_a), len(digests_b)), sectors, changes)
@@ -0,0 +1,212 @@
+# pyright: reportGeneralTypeIssues=false
+# Read-only view of a complete AmebaZ2 flash dump.
+#
+# The dump is memory-mapped and nothing is decoded up front: the partition
+# table and the image headers are unpacked (with the precompiled codecs of the
+# structs in layout.py) the first time they are accessed, and every region is exported as
+# a memoryview slice of the mapping, so large dumps are never copied.
+#
+#   0x0000  calibration pattern (16 bytes) + 16 bytes 0xFF
+#   0x0020  partition table (keys, Header, PartitionTableInfo, hash)
+#   0x1000  system data
+#   0x2000  calibration data
+#   ....    one region per partition record (boot, fw1, fw2, user, ...)
+#
+# Every image in a partition starts with two public keys (0x40 bytes) and a
+# Header. Further headers of the same image are chained with `next_`, an
+# offset relative to the previous header.
+import mmap
+import os
+
+from dataclasses import dataclass
+from functools import cached_property
+from pathlib import Path
+
+from libmeross.ambz2.layout import (
+    Addr_FlashBase,
+    Addr_FlashCalibrationData,
+    Addr_FlashPartitionTable,
+    Addr_FlashSystemData,
+    CALIBRATION_PATTERN,
+    HEADER_CODEC,
+    Header,
+    ImageType,
+    Len_FlashCalibrationData,
+    Len_FlashCalibrationPattern,
+    Len_FlashPartitionTable,
+    Len_FlashSystemData,
+    PartitionTable,
+    PartitionTableRecord,
+    PartitionType,
+    unpack_partition_table,
+)
+
+IMAGE_KEYS_SIZE = 0x40
+HEADER_SIZE = 0x60
+NO_NEXT = 0xFFFFFFFF
+# headers followed per image before giving up on a broken chain
+MAX_HEADERS = 32
+
+
+@dataclass
+class ImageHeader:
+    offset: int  # of the header within the dump
+    header: Header
+
+    @property
+    def type(self) -> ImageType | int:
+        return self.header.type
+
+    @property
+    def valid(self) -> bool:
+        # erased flash decodes as an unknown type with a huge segment
+        return isinstance(self.header.type, ImageType) and self.header.segment_size != NO_NEXT
+
+
+@dataclass
+class Region:
+    name: str
+    offset: int
+    length: int
+    # None for the fixed regions in front of the partitions
+    record: PartitionTableRecord | None = None
+
+    @property
+    def address(self) -> int:
+        return Addr_FlashBase + self.offset
+
+    @property
+    def end(self) -> int:
+        return self.offset + self.length
+
+
+class FlashImageError(Exception):
+    pass
+
+
+class FlashImage:
+    """Memory-mapped flash dump, decoded lazily.
+
+    >>> with FlashImage("flash.bin") as image:
+    ...     fw1 = image.view("fw1")  # memoryview, no copy
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self.errors: list[str] = []
+        with open(self.path, "rb") as fp:
+            size = os.fstat(fp.fileno()).st_size
+            if size < Addr_FlashSystemData - Addr_FlashBase:
+                raise FlashImageError(f"{self.path} is too small for a flash dump ({size} bytes)")
+            self._map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        self.data = memoryview(self._map)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __enter__(self) -> "FlashImage":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.data.release()
+        try:
+            self._map.close()
+        except BufferError:
+            # a caller still holds a region view; the map is freed with it
+            pass
+
+    # --- layout ---
+    @property
+    def calibration_valid(self) -> bool:
+        return self.data[: len(CALIBRATION_PATTERN)] == CALIBRATION_PATTERN
+
+    @cached_property
+    def partition_table(self) -> PartitionTable | None:
+        start = Addr_FlashPartitionTable - Addr_FlashBase
+        try:
+            table = unpack_partition_table(self.data[start : start + Len_FlashPartitionTable])
+        except Exception as e:
+            self.errors.append(f"Invalid partition table: {e}")
+            return None
+        if table.hdr.type != ImageType.PARTAB:
+            self.errors.append(f"Partition table has image type {table.hdr.type!r}")
+        return table
+
+    @cached_property
+    def regions(self) -> list[Region]:
+        regions = [
+            Region("calibration pattern", 0, Len_FlashCalibrationPattern),
+            Region(
+                "partition table",
+                Addr_FlashPartitionTable - Addr_FlashBase,
+                Len_FlashPartitionTable,
+            ),
+            Region("system data", Addr_FlashSystemData - Addr_FlashBase, Len_FlashSystemData),
+            Region(
+                "calibration data",
+                Addr_FlashCalibrationData - Addr_FlashBase,
+                Len_FlashCalibrationData,
+            ),
+        ]
+        table = self.partition_table
+        if table is None:
+            return regions
+
+        for record in [table.info.boot_record, *table.info.records]:
+            if isinstance(record.type, PartitionType):
+                name = record.type.name.lower()
+            else:
+                name = f"type {record.type}"
+            if record.start + record.length > len(self.data):
+                self.errors.append(
+                    f"Partition {name} ({record.start:#x}+{record.length:#x}) "
+                    "exceeds the dump"
+                )
+            regions.append(Region(name, record.start, record.length, record))
+        return regions
+
+    def region(self, name: str) -> Region | None:
+        return next((r for r in self.regions if r.name == name), None)
+
+    def region_at(self, offset: int) -> Region | None:
+        # partitions win over the fixed regions (the boot image may overlap)
+        for region in reversed(self.regions):
+            if region.offset <= offset < region.end:
+                return region
+        return None
+
+    def view(self, region: str | Region) -> memoryview:
+        """Zero-copy slice of a region (clipped to the dump)."""
+        if isinstance(region, str):
+            found = self.region(region)
+            if found is None:
+                raise KeyError(region)
+            region = found
+        return self.data[region.offset : min(region.end, len(self.data))]
+
+    # --- images ---
+    def header_at(self, offset: int) -> ImageHeader | None:
+        if offset < 0 or offset + HEADER_SIZE > len(self.data):
+            return None
+        return ImageHeader(offset, HEADER_CODEC.unpack(self.data, offset))
+
+    def image_headers(self, region: str | Region) -> list[ImageHeader]:
+        """Headers of the image in a partition, following the `next_` chain."""
+        found = self.region(region) if isinstance(region, str) else region
+        if found is None or found.record is None:
+            return []
+        headers = []
+        offset = found.offset + IMAGE_KEYS_SIZE
+        while len(headers) < MAX_HEADERS:
+            header = self.header_at(offset)
+            if header is None or not header.valid:
+                break
+            headers.append(header)
+            next_ = header.header.next_
+            if next_ in (NO_NEXT, 0) or not found.offset <= offset + next_ < found.end:
+                break
+            offset += next_
+        return headers
@@ -59,6 +59,8 @@ from caterpillar.py import (
     unpack,
 )
 
+from libmeross.ambz2.codec import Codec, CodecError
+
 
 set_struct_flags(S_DISCARD_UNNAMED, S_REPLACE_TYPES)
 
@@ -248,13 +250,84 @@ class PartitionTable:
         #  Hash: from the first byte of partition table to the end of user data
         #  (two public keys + Header + partition info + partition records + user data),
         #  calculated before encryption if the encryption is on
-        hmac_obj = HMAC(user_key, SHA256())
-        data = pack(self)[:-32]
-        hmac_obj.update(data)
-        self.hash = hmac_obj.finalize()
+        self._hash_body(user_key, pack_info(self.info))
 
     def set_segment_size(self) -> None:
         # the segment size is the size of all dynamic fields within the
         # partition table info
-        size = len(pack(self.info))  # minus static fields is done in bootloader
+        size = len(pack_info(self.info))  # minus static fields is done in bootloader
         self.hdr.segment_size = size
+
+    def sign(self, user_key: bytes) -> bytes:
+        """Set the segment size and hash and return the packed table.
+
+        Same as set_segment_size() + build_hash() + pack(), but every part
+        is packed only once.
+        """
+        info = pack_info(self.info)
+        self.hdr.segment_size = len(info)
+        return self._hash_body(user_key, info) + self.hash
+
+    def _hash_body(self, user_key: bytes, info: bytes) -> bytes:
+        body = self.dec_pubkey + self.hash_pubkey + HEADER_CODEC.pack(self.hdr) + info
+        hmac_obj = HMAC(user_key, SHA256())
+        hmac_obj.update(body)
+        self.hash = hmac_obj.finalize()
+        return body
+
+
+# --- Precompiled codecs ---
+# Header and records have a fixed size and are packed with one struct.Struct
+# each (see codec.py). The partition table info and the table itself are
+# compiled up to their first nested or dynamic member; records and user data
+# are appended here.
+HEADER_CODEC = Codec(Header)
+RECORD_CODEC = Codec(PartitionTableRecord)
+INFO_CODEC = Codec(PartitionTableInfo, prefix=True)
+TABLE_CODEC = Codec(PartitionTable, prefix=True)
+
+
+def pack_info(info: PartitionTableInfo) -> bytes:
+    """Same as pack(info)."""
+    return b"".join(
+        [
+            INFO_CODEC.struct.pack(*INFO_CODEC.values(info)),
+            RECORD_CODEC.pack(info.boot_record),
+            *map(RECORD_CODEC.pack, info.records),
+            info.user_data,
+        ]
+    )
+
+
+def pack_partition_table(table: PartitionTable) -> bytes:
+    """Same as pack(table)."""
+    return b"".join(
+        [
+            TABLE_CODEC.struct.pack(*TABLE_CODEC.values(table)),
+            HEADER_CODEC.pack(table.hdr),
+            pack_info(table.info),
+            table.hash,
+        ]
+    )
+
+
+def unpack_partition_table(data, offset: int = 0) -> PartitionTable:
+    """Same as unpack(PartitionTable, data[offset:]), raises CodecError."""
+    pos = offset + TABLE_CODEC.size
+    table = TABLE_CODEC.fields(data, offset)
+    table["hdr"] = HEADER_CODEC.unpack(data, pos)
+    pos += HEADER_CODEC.size
+
+    info = INFO_CODEC.fields(data, pos)
+    pos += INFO_CODEC.size
+    info["boot_record"] = RECORD_CODEC.unpack(data, pos)
+    pos += RECORD_CODEC.size
+    info["records"] = RECORD_CODEC.unpack_many(data, info["num"], pos)
+    pos += RECORD_CODEC.size * info["num"]
+    end = pos + info["user_len"]
+    if end + len(FF_32) > len(data):
+        raise CodecError(f"User data ({info['user_len']:#x} bytes) exceeds the buffer")
+    info["user_data"] = bytes(data[pos:end])
+    table["info"] = PartitionTableInfo(**info)
+    table["hash"] = bytes(data[end : end + len(FF_32)])
+    return PartitionTable(**table)
@@ -0,0 +1,198 @@
+# pyright: reportGeneralTypeIssues=false, reportCallIssue=false
+# Partition table specs.
+#
+# A spec describes a partition table as plain data (JSON or TOML):
+#
+#   {
+#     "eFWV": 0,
+#     "fw1_idx": 1,
+#     "fw2_idx": 2,
+#     "boot": {"start": "0x4000", "length": "0xC000"},
+#     "records": [
+#       {"type": "FW1", "start": "0x10000", "length": "0xF8000"},
+#       {"type": "FW2", "start": "0x108000", "length": "0xF8000"}
+#     ],
+#     "user_data": "",   # hex
+#     "key": "47E5..."   # HMAC key (hex), default: HASH_KEY
+#   }
+#
+# Numbers may be given as integers or strings ("0x..."). A matrix spec
+# builds several tables at once: every entry of "variants" is merged over the
+# remaining keys and needs a "name".
+import json
+import struct
+import tomllib
+
+from copy import deepcopy
+from pathlib import Path
+
+from libmeross.ambz2.codec import CodecError
+from libmeross.ambz2.layout import (
+    CALIBRATION_PATTERN,
+    FF_32,
+    HASH_KEY,
+    Header,
+    ImageType,
+    Len_FlashCalibrationPattern,
+    PartitionTable,
+    PartitionTableInfo,
+    PartitionTableRecord,
+    PartitionType,
+)
+
+VARIANTS = "variants"
+
+
+class SpecError(ValueError):
+    pass
+
+
+def load_spec(path: Path) -> dict:
+    try:
+        if path.suffix.lower() == ".toml":
+            with open(path, "rb") as fp:
+                return tomllib.load(fp)
+        with open(path, "r") as fp:
+            return json.load(fp)
+    except (json.JSONDecodeError, tomllib.TOMLDecodeError) as e:
+        raise SpecError(f"Invalid spec {path}: {e}")
+
+
+def expand_matrix(spec: dict) -> list[tuple[str | None, dict]]:
+    """(name, spec) for every table described by *spec*."""
+    if VARIANTS not in spec:
+        return [(None, spec)]
+    variants = spec[VARIANTS]
+    if not isinstance(variants, list) or not variants:
+        raise SpecError("No variants given")
+    base = {k: v for k, v in spec.items() if k != VARIANTS}
+    tables = []
+    for idx, variant in enumerate(variants):
+        if not isinstance(variant, dict):
+            raise SpecError(f"Variant {idx} is not an object")
+        if "name" not in variant:
+            raise SpecError(f"Variant {idx} has no name")
+        merged = deepcopy(base)
+        merged.update(deepcopy(variant))
+        tables.append((str(merged.pop("name")), merged))
+    names = [name for name, _ in tables]
+    if len(set(names)) != len(names):
+        raise SpecError("Variant names must be unique")
+    return tables
+
+
+def _int(spec: dict, name: str, default: int | None = None) -> int:
+    value = spec.get(name, default)
+    if value is None:
+        raise SpecError(f"Missing field {name!r}")
+    try:
+        return int(value, 0) if isinstance(value, str) else int(value)
+    except (TypeError, ValueError):
+        raise SpecError(f"Invalid number for {name!r}: {value!r}")
+
+
+def _hex(spec: dict, name: str, default: bytes, length: int | None = None) -> bytes:
+    value = spec.get(name)
+    if value is None:
+        return default
+    try:
+        data = bytes.fromhex(value)
+    except (TypeError, ValueError):
+        raise SpecError(f"Invalid hex string for {name!r}")
+    if length is not None and len(data) != length:
+        raise SpecError(f"{name!r} must be {length} bytes long")
+    return data
+
+
+def _record(spec: dict, default_type: PartitionType | None = None) -> PartitionTableRecord:
+    if "type" in spec:
+        try:
+            kind = PartitionType[str(spec["type"]).upper()]
+        except KeyError:
+            raise SpecError(f"Unknown partition type {spec['type']!r}")
+    elif default_type is not None:
+        kind = default_type
+    else:
+        raise SpecError("Missing field 'type' in record")
+    hash_key = _hex(spec, "hash_key", FF_32, 32)
+    return PartitionTableRecord(
+        start=_int(spec, "start"),
+        length=_int(spec, "length"),
+        type=kind,
+        dbg_skip=bool(spec.get("dbg_skip", False)),
+        hkey_valid=hash_key != FF_32,
+        hash_key=hash_key,
+    )
+
+
+def table_from_spec(spec: dict) -> PartitionTable:
+    if "boot" not in spec:
+        raise SpecError("Missing field 'boot'")
+    records = [_record(record) for record in spec.get("records", [])]
+    user_data = _hex(spec, "user_data", b"")
+    info = PartitionTableInfo(
+        eFWV=_int(spec, "eFWV", 0),
+        num=len(records),
+        fw1_idx=_int(spec, "fw1_idx", 1),
+        fw2_idx=_int(spec, "fw2_idx", 2),
+        ota_trap=_int(spec, "ota_trap", 0),
+        mp_trap=_int(spec, "mp_trap", 0),
+        key_exp_op=_int(spec, "key_exp_op", 0),
+        user_len=len(user_data),
+        boot_record=_record(spec["boot"], PartitionType.BOOT),
+        records=records,
+        user_data=user_data,
+    )
+    for name in ("fw1_idx", "fw2_idx"):
+        if getattr(info, name) > len(records):
+            raise SpecError(f"{name} points behind the last record")
+    header = Header(
+        segment_size=0,
+        type=ImageType.PARTAB,
+        encrypted=False,
+        is_special=True,
+        serial=_int(spec, "serial", 0),
+    )
+    return PartitionTable(hdr=header, info=info)
+
+
+def _record_spec(record: PartitionTableRecord) -> dict:
+    spec = {
+        "type": getattr(record.type, "name", record.type),
+        "start": f"{record.start:#x}",
+        "length": f"{record.length:#x}",
+    }
+    if record.dbg_skip:
+        spec["dbg_skip"] = True
+    if record.hkey_valid:
+        spec["hash_key"] = record.hash_key.hex()
+    return spec
+
+
+def spec_from_table(table: PartitionTable) -> dict:
+    """The spec of an existing (e.g. dumped) table."""
+    info = table.info
+    spec = {
+        "eFWV": info.eFWV,
+        "fw1_idx": info.fw1_idx,
+        "fw2_idx": info.fw2_idx,
+        "serial": table.hdr.serial,
+        "boot": {k: v for k, v in _record_spec(info.boot_record).items() if k != "type"},
+        "records": [_record_spec(record) for record in info.records],
+    }
+    if info.ota_trap or info.mp_trap or info.key_exp_op:
+        spec.update(ota_trap=info.ota_trap, mp_trap=info.mp_trap, key_exp_op=info.key_exp_op)
+    if info.user_data:
+        spec["user_data"] = info.user_data.hex()
+    return spec
+
+
+def build_blob(spec: dict, key: bytes | None = None) -> bytes:
+    """Calibration pattern + signed partition table, ready for 0x98000000."""
+    table = table_from_spec(spec)
+    key = key or _hex(spec, "key", HASH_KEY, 32)
+    prefix = CALIBRATION_PATTERN.ljust(Len_FlashCalibrationPattern, b"\xff")
+    try:
+        return prefix + table.sign(key)
+    except (struct.error, CodecError) as e:
+        raise SpecError(f"Field out of range: {e}")
@@ -0,0 +1,174 @@
+# Partition table reconstruction from the images in a dump.
+#
+# Images always start at a sector boundary with two public keys followed by
+# the first Header, so a single pass over all sectors (one struct unpack of
+# the raw header fields per sector, see HEADER_CODEC) builds an index of
+# candidate images. Every candidate is then checked by following its `next_`
+# chain; headers found inside an accepted image are dropped from the index.
+#
+# From the images found, the records are inferred:
+#
+#   boot  first BOOT image, up to the next image
+#   fw1   first firmware image, up to the second one
+#   fw2   second firmware image, at least as large as fw1 (clipped to the dump)
+#   user  non-erased sectors behind the last firmware partition
+#
+# With only one firmware image, the rest of the flash is split in two equal
+# halves for fw1 and fw2 (the default layout on 2 MB flash).
+from dataclasses import dataclass, field
+
+from libmeross.ambz2.image import (
+    HEADER_SIZE,
+    IMAGE_KEYS_SIZE,
+    MAX_HEADERS,
+    NO_NEXT,
+    FlashImage,
+    ImageHeader,
+)
+from libmeross.ambz2.layout import HEADER_CODEC, ImageType
+
+SECTOR_SIZE = 0x1000
+HASH_SIZE = 32
+# the partition table and system/calibration data come first
+FIRST_IMAGE_SECTOR = 3
+ERASED_SECTOR = b"\xff" * SECTOR_SIZE
+
+_TYPES = {t.value for t in ImageType} - {ImageType.PARTAB.value, ImageType.UNKNOWN.value}
+
+
+@dataclass
+class FoundImage:
+    offset: int  # of the public keys (sector aligned)
+    headers: list[ImageHeader] = field(default_factory=list)
+
+    @property
+    def type(self) -> ImageType | int:
+        return self.headers[0].type
+
+    @property
+    def end(self) -> int:
+        last = self.headers[-1]
+        return last.offset + HEADER_SIZE + last.header.segment_size + HASH_SIZE
+
+    @property
+    def length(self) -> int:
+        return self.end - self.offset
+
+
+@dataclass
+class Reconstruction:
+    images: list[FoundImage]
+    spec: dict  # see libmeross.ambz2.partab
+    notes: list[str] = field(default_factory=list)
+
+
+def _align(value: int) -> int:
+    return -(-value // SECTOR_SIZE) * SECTOR_SIZE
+
+
+def header_index(data: memoryview, first_sector: int = FIRST_IMAGE_SECTOR) -> dict[int, tuple]:
+    """Sector offset -> raw Header fields of every plausible first header."""
+    unpack_from = HEADER_CODEC.struct.unpack_from
+    size = len(data)
+    index = {}
+    last = size - IMAGE_KEYS_SIZE - HEADER_SIZE
+    for offset in range(first_sector * SECTOR_SIZE, last, SECTOR_SIZE):
+        fields = unpack_from(data, offset + IMAGE_KEYS_SIZE)
+        segment_size, next_, image_type = fields[:3]
+        if image_type not in _TYPES or segment_size == 0:
+            continue
+        end = offset + IMAGE_KEYS_SIZE + HEADER_SIZE + segment_size + HASH_SIZE
+        if end > size or (next_ != NO_NEXT and (next_ < HEADER_SIZE or offset + next_ >= size)):
+            continue
+        index[offset] = fields
+    return index
+
+
+def follow_chain(image: FlashImage, offset: int) -> FoundImage | None:
+    """The image at *offset* if all headers of its chain are valid."""
+    found = FoundImage(offset)
+    pos = offset + IMAGE_KEYS_SIZE
+    while len(found.headers) < MAX_HEADERS:
+        header = image.header_at(pos)
+        if header is None or not header.valid:
+            return None
+        found.headers.append(header)
+        if pos + HEADER_SIZE + header.header.segment_size + HASH_SIZE > len(image):
+            return None
+        next_ = header.header.next_
+        if next_ in (NO_NEXT, 0):
+            return found
+        pos += next_
+    return None
+
+
+def find_images(image: FlashImage) -> list[FoundImage]:
+    images = []
+    end = 0
+    for offset in sorted(header_index(image.data)):
+        if offset < end:
+            continue  # inside the previous image
+        found = follow_chain(image, offset)
+        if found is not None:
+            images.append(found)
+            end = found.end
+    return images
+
+
+def _erased(image: FlashImage, start: int, end: int) -> bool:
+    for pos in range(start, end, SECTOR_SIZE):
+        sector = image.data[pos : min(pos + SECTOR_SIZE, end)].tobytes()
+        if sector != ERASED_SECTOR[: len(sector)]:
+            return False
+    return True
+
+
+def _record(kind: str, start: int, length: int) -> dict:
+    return {"type": kind, "start": f"{start:#x}", "length": f"{length:#x}"}
+
+
+def reconstruct(image: FlashImage) -> Reconstruction:
+    images = find_images(image)
+    size = len(image)
+    notes = []
+    boot = next((i for i in images if i.type == ImageType.BOOT), None)
+    firmware = [
+        i for i in images if i.type != ImageType.BOOT and (boot is None or i.offset > boot.offset)
+    ]
+
+    if boot is None:
+        raise ValueError("No boot image found")
+    if not firmware:
+        raise ValueError("No firmware image found behind the boot image")
+    spec = {
+        "eFWV": 0,
+        "fw1_idx": 1,
+        "fw2_idx": 2,
+        "boot": {"start": f"{boot.offset:#x}", "length": f"{firmware[0].offset - boot.offset:#x}"},
+        "records": [],
+    }
+
+    fw1 = firmware[0]
+    if len(firmware) > 1:
+        fw2_start = firmware[1].offset
+        fw1_length = fw2_start - fw1.offset
+        fw2_length = min(max(fw1_length, _align(firmware[1].length)), size - fw2_start)
+        if len(firmware) > 2:
+            notes.append(f"{len(firmware) - 2} more firmware images ignored")
+    else:
+        fw1_length = ((size - fw1.offset) // 2) // SECTOR_SIZE * SECTOR_SIZE
+        fw2_start, fw2_length = fw1.offset + fw1_length, fw1_length
+        if fw1.end > fw2_start:
+            fw1_length = _align(fw1.length)
+            fw2_start = fw1.offset + fw1_length
+            fw2_length = ((size - fw2_start) // SECTOR_SIZE) * SECTOR_SIZE
+        notes.append("Only one firmware image found, FW2 takes the free space behind it")
+    spec["records"] += [
+        _record("FW1", fw1.offset, fw1_length),
+        _record("FW2", fw2_start, fw2_length),
+    ]
+
+    user_start = fw2_start + fw2_length
+    if user_start < size and not _erased(image, user_start, size):
+        spec["records"].append(_record("USER", user_start, size - user_start))
+    return Reconstruction(images, spec, notes)
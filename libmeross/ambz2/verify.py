@@ -0,0 +1,145 @@
+# Hash verification of flash dumps.
+#
+# The partition table is signed with HMAC-SHA256 over everything from the
+# first public key up to the end of the user data; the hash follows directly.
+# Images in the boot and firmware partitions use the same format per segment:
+# (public keys +) Header + segment_size bytes, followed by a 32 byte hash.
+# A segment is checked against HMAC-SHA256 with the hash key of its partition
+# record (if valid), the known keys and plain SHA-256.
+#
+# All data is streamed from the memory-mapped dump in fixed-size chunks, so
+# nothing is copied regardless of the size of a segment.
+from dataclasses import dataclass
+
+from cryptography.hazmat.primitives.hashes import SHA256, Hash
+from cryptography.hazmat.primitives.hmac import HMAC
+
+from libmeross.ambz2.image import HEADER_SIZE, IMAGE_KEYS_SIZE, FlashImage, ImageHeader, Region
+from libmeross.ambz2.layout import HASH_KEY, Addr_FlashPartitionTable, Addr_FlashBase, ImageType
+
+CHUNK_SIZE = 0x10000
+HASH_SIZE = 32
+
+
+@dataclass
+class Check:
+    region: str
+    name: str
+    offset: int
+    length: int
+    passed: bool | None  # None: not checked
+    method: str = ""
+
+    @property
+    def status(self) -> str:
+        if self.passed is None:
+            return "skipped"
+        return "passed" if self.passed else "failed"
+
+
+def digests(data: memoryview, algorithms: list, chunk_size: int = CHUNK_SIZE) -> list[bytes]:
+    """Feed *data* to cryptography HMAC/Hash objects in one pass of chunks."""
+    for pos in range(0, len(data), chunk_size):
+        chunk = data[pos : pos + chunk_size]
+        for algorithm in algorithms:
+            algorithm.update(chunk)
+    return [algorithm.finalize() for algorithm in algorithms]
+
+
+def _hashers(keys: list[tuple[str, bytes]], sha256: bool) -> dict[str, HMAC | Hash]:
+    hashers: dict[str, HMAC | Hash] = {f"hmac ({name})": HMAC(key, SHA256()) for name, key in keys}
+    if sha256:
+        hashers["sha256"] = Hash(SHA256())
+    return hashers
+
+
+def check_hash(
+    image: FlashImage,
+    region: str,
+    name: str,
+    start: int,
+    end: int,
+    keys: list[tuple[str, bytes]],
+    sha256: bool = True,
+) -> Check:
+    """Check the hash stored at *end* over the data from *start* to *end*."""
+    check = Check(region, name, start, end - start, None)
+    if end + HASH_SIZE > len(image) or end <= start:
+        check.method = "out of bounds"
+        return check
+
+    data = image.data[start:end]
+    stored = image.data[end : end + HASH_SIZE]
+    try:
+        hashers = _hashers(keys, sha256)
+        check.passed, check.method = False, "no key matches"
+        for method, value in zip(hashers, digests(data, list(hashers.values()))):
+            if value == stored:
+                check.passed, check.method = True, method
+                break
+    finally:
+        data.release()
+        stored.release()
+    return check
+
+
+def verify_partition_table(image: FlashImage, keys: list[tuple[str, bytes]]) -> Check:
+    table = image.partition_table
+    start = Addr_FlashPartitionTable - Addr_FlashBase
+    if table is None:
+        return Check("partition table", "partition table", start, 0, False, "not found")
+    end = start + IMAGE_KEYS_SIZE + HEADER_SIZE + table.hdr.segment_size
+    return check_hash(image, "partition table", "partition table", start, end, keys, sha256=False)
+
+
+def segment_range(region: Region, idx: int, header: ImageHeader) -> tuple[int, int]:
+    # the public keys in front of the first header are part of its segment
+    start = region.offset if idx == 0 else header.offset
+    return start, header.offset + HEADER_SIZE + header.header.segment_size
+
+
+def verify_images(image: FlashImage, keys: list[tuple[str, bytes]]) -> list[Check]:
+    checks = []
+    for region in image.regions:
+        if region.record is None:
+            continue
+        headers = image.image_headers(region)
+        if not headers:
+            checks.append(Check(region.name, "image", region.offset, 0, None, "no image"))
+            continue
+
+        record_keys = list(keys)
+        if region.record.hkey_valid:
+            record_keys.insert(0, ("record key", region.record.hash_key))
+        for idx, header in enumerate(headers):
+            start, end = segment_range(region, idx, header)
+            checks.append(
+                check_hash(
+                    image,
+                    region.name,
+                    f"segment {idx} ({ImageType(header.type).name})",
+                    start,
+                    end,
+                    record_keys,
+                )
+            )
+    return checks
+
+
+def verify(image: FlashImage, user_keys: list[bytes] | None = None) -> list[Check]:
+    """Calibration pattern, partition table and image hashes of a dump."""
+    keys = [("default key", HASH_KEY)]
+    keys += [(f"key {idx}", key) for idx, key in enumerate(user_keys or [], 1)]
+    checks = [
+        Check(
+            "calibration pattern",
+            "calibration pattern",
+            0,
+            16,
+            image.calibration_valid,
+            "pattern",
+        ),
+        verify_partition_table(image, keys),
+    ]
+    checks += verify_images(image, keys)
+    return checks
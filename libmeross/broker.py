@@ -0,0 +1,585 @@
+# Minimal MQTT 3.1.1 broker used to self-host Meross devices. Only the parts of
+# the protocol that devices and the app actually use are implemented:
+#
+#   - CONNECT/CONNACK with device (or app) credentials derived from the shared key
+#   - PUBLISH with QoS 0/1/2 (inbound), QoS 0/1 delivery without redelivery
+#   - SUBSCRIBE/UNSUBSCRIBE including '+' and '#' wildcards
+#   - PINGREQ, DISCONNECT and last will messages
+#
+# Persistent sessions and retained messages are not supported. Every connection
+# is handled by a plain asyncio.Protocol (no coroutine per client), which keeps
+# the per-connection overhead small enough for thousands of devices on a single
+# core. Device topics (/appliance/<uuid>/subscribe) are routed through a dict
+# lookup, wildcard subscriptions go through a topic tree.
+import asyncio
+import ssl
+import struct
+
+from dataclasses import dataclass
+
+from libmeross import mqtt
+from libmeross.util import logger
+
+# --- Packet Types ---
+CONNECT = 0x10
+CONNACK = 0x20
+PUBLISH = 0x30
+PUBACK = 0x40
+PUBREC = 0x50
+PUBREL = 0x60
+PUBCOMP = 0x70
+SUBSCRIBE = 0x80
+SUBACK = 0x90
+UNSUBSCRIBE = 0xA0
+UNSUBACK = 0xB0
+PINGREQ = 0xC0
+PINGRESP = 0xD0
+DISCONNECT = 0xE0
+
+# --- CONNACK return codes ---
+RC_ACCEPTED = 0
+RC_UNACCEPTABLE_PROTOCOL = 1
+RC_IDENTIFIER_REJECTED = 2
+RC_BAD_CREDENTIALS = 4
+RC_NOT_AUTHORIZED = 5
+
+SUBACK_FAILURE = 0x80
+DEFAULT_MAX_PACKET_SIZE = 0x40000  # 256K bytes
+# clients whose output buffer grows beyond this limit are dropped
+DEFAULT_WRITE_HIGH_WATER = 0x100000  # 1M bytes
+
+_U16 = struct.Struct(">H")
+_PINGRESP = bytes((PINGRESP, 0))
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def encode_length(length: int) -> bytes:
+    data = bytearray()
+    while True:
+        byte, length = length & 0x7F, length >> 7
+        data.append(byte | 0x80 if length else byte)
+        if not length:
+            return bytes(data)
+
+
+def encode_string(value: str | bytes) -> bytes:
+    if isinstance(value, str):
+        value = value.encode()
+    return _U16.pack(len(value)) + value
+
+
+def encode_packet(header: int, body: bytes = b"") -> bytes:
+    return bytes((header,)) + encode_length(len(body)) + body
+
+
+def encode_connect(
+    client_id: str,
+    username: str | None = None,
+    password: str | None = None,
+    keepalive: int = 60,
+) -> bytes:
+    flags = 0x02  # clean session
+    payload = encode_string(client_id)
+    if username is not None:
+        flags |= 0x80
+        payload += encode_string(username)
+    if password is not None:
+        flags |= 0x40
+        payload += encode_string(password)
+    body = encode_string("MQTT") + bytes((4, flags)) + _U16.pack(keepalive)
+    return encode_packet(CONNECT, body + payload)
+
+
+def encode_publish(
+    topic: str | bytes,
+    payload: bytes,
+    qos: int = 0,
+    packet_id: int = 0,
+    retain: bool = False,
+) -> bytes:
+    body = encode_string(topic)
+    if qos:
+        body += _U16.pack(packet_id)
+    return encode_packet(PUBLISH | qos << 1 | int(retain), body + payload)
+
+
+def encode_subscribe(packet_id: int, topics: list[tuple[str, int]]) -> bytes:
+    body = _U16.pack(packet_id)
+    for topic, qos in topics:
+        body += encode_string(topic) + bytes((qos,))
+    return encode_packet(SUBSCRIBE | 0x02, body)
+
+
+def _read_string(data: bytes, pos: int) -> tuple[bytes, int]:
+    if pos + 2 > len(data):
+        raise ProtocolError("Truncated string")
+    (length,) = _U16.unpack_from(data, pos)
+    end = pos + 2 + length
+    if end > len(data):
+        raise ProtocolError("Truncated string")
+    return data[pos + 2 : end], end
+
+
+@dataclass
+class BrokerStats:
+    connections: int = 0
+    total_connections: int = 0
+    rejected: int = 0
+    received: int = 0
+    delivered: int = 0
+    dropped: int = 0
+
+
+class _TopicNode:
+    __slots__ = ("children", "subscribers")
+
+    def __init__(self) -> None:
+        self.children: dict[str, _TopicNode] = {}
+        self.subscribers: dict["MQTTProtocol", int] = {}
+
+
+class TopicTree:
+    def __init__(self) -> None:
+        self.root = _TopicNode()
+
+    def add(self, topic_filter: str, client: "MQTTProtocol", qos: int) -> None:
+        node = self.root
+        for level in topic_filter.split("/"):
+            node = node.children.setdefault(level, _TopicNode())
+        node.subscribers[client] = qos
+
+    def remove(self, topic_filter: str, client: "MQTTProtocol") -> None:
+        path = [self.root]
+        levels = topic_filter.split("/")
+        for level in levels:
+            node = path[-1].children.get(level)
+            if node is None:
+                return
+            path.append(node)
+
+        path[-1].subscribers.pop(client, None)
+        # prune empty branches
+        for idx in range(len(levels), 0, -1):
+            node = path[idx]
+            if node.subscribers or node.children:
+                break
+            del path[idx - 1].children[levels[idx - 1]]
+
+    def match(self, levels: list[str], into: dict["MQTTProtocol", int]) -> None:
+        # topics starting with '$' must not match wildcards at the first level
+        self._match(self.root, levels, 0, into, levels[0].startswith("$"))
+
+    def _match(self, node, levels, idx, into, system) -> None:
+        children = node.children
+        if not system:
+            multi = children.get("#")
+            if multi is not None:
+                _merge(into, multi.subscribers)
+
+        if idx == len(levels):
+            _merge(into, node.subscribers)
+            return
+
+        child = children.get(levels[idx])
+        if child is not None:
+            self._match(child, levels, idx + 1, into, False)
+        if not system:
+            child = children.get("+")
+            if child is not None:
+                self._match(child, levels, idx + 1, into, False)
+
+
+def _merge(into: dict, subscribers: dict) -> None:
+    for client, qos in subscribers.items():
+        if into.get(client, -1) < qos:
+            into[client] = qos
+
+
+class MQTTProtocol(asyncio.Protocol):
+    def __init__(self, broker: "Broker") -> None:
+        self.broker = broker
+        self.transport: asyncio.Transport | None = None
+        self.buffer = bytearray()
+        self.client_id: str | None = None
+        self.username: str | None = None
+        self.keepalive = 0
+        self.last_seen = 0.0
+        self.subscriptions: set[str] = set()
+        self.will: tuple[str, bytes, int, bool] | None = None
+        self.next_packet_id = 1
+        self.closing = False
+
+    # --- asyncio.Protocol ---
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+        self.last_seen = self.broker.loop.time()
+        self.broker.clients.add(self)
+
+    def connection_lost(self, exc) -> None:
+        self.broker.detach(self, graceful=self.closing)
+        self.transport = None
+
+    def data_received(self, data: bytes) -> None:
+        self.last_seen = self.broker.loop.time()
+        buf = self.buffer
+        buf += data
+        size, pos = len(buf), 0
+        limit = self.broker.max_packet_size
+        try:
+            while size - pos >= 2:
+                # remaining length (at most four bytes)
+                length, shift, idx = 0, 0, pos + 1
+                while True:
+                    if idx >= size:
+                        length = -1
+                        break
+                    byte = buf[idx]
+                    length |= (byte & 0x7F) << shift
+                    idx += 1
+                    if not byte & 0x80:
+                        break
+                    shift += 7
+                    if shift > 21:
+                        raise ProtocolError("Malformed remaining length")
+
+                if length < 0:
+                    break
+                if length > limit:
+                    raise ProtocolError(f"Packet too large ({length} bytes)")
+                if idx + length > size:
+                    break
+
+                header = buf[pos]
+                body = bytes(buf[idx : idx + length])
+                pos = idx + length
+                self.handle(header, body)
+                if self.transport is None or self.transport.is_closing():
+                    break
+        except ProtocolError as e:
+            logger.debug(f"({self.client_id}) Protocol error: {e}")
+            self.abort()
+        del buf[:pos]
+
+    # --- packet handling ---
+    def handle(self, header: int, body: bytes) -> None:
+        kind = header & 0xF0
+        if self.client_id is None and kind != CONNECT:
+            raise ProtocolError("Expected CONNECT")
+
+        if kind == PUBLISH:
+            self.on_publish(header, body)
+        elif kind == PINGREQ:
+            self.transport.write(_PINGRESP)
+        elif kind == PUBACK or kind == PUBCOMP:
+            pass  # no redelivery, nothing to acknowledge
+        elif kind == PUBREL:
+            self.transport.write(encode_packet(PUBCOMP, body[:2]))
+        elif kind == PUBREC:
+            self.transport.write(encode_packet(PUBREL | 0x02, body[:2]))
+        elif kind == SUBSCRIBE:
+            self.on_subscribe(body)
+        elif kind == UNSUBSCRIBE:
+            self.on_unsubscribe(body)
+        elif kind == CONNECT:
+            self.on_connect(body)
+        elif kind == DISCONNECT:
+            self.closing = True
+            self.will = None
+            self.transport.close()
+        else:
+            raise ProtocolError(f"Unexpected packet type {kind >> 4}")
+
+    def on_connect(self, body: bytes) -> None:
+        if self.client_id is not None:
+            raise ProtocolError("Duplicate CONNECT")
+
+        name, pos = _read_string(body, 0)
+        if pos + 4 > len(body):
+            raise ProtocolError("Truncated CONNECT")
+        level, flags = body[pos], body[pos + 1]
+        (keepalive,) = _U16.unpack_from(body, pos + 2)
+        pos += 4
+        if name not in (b"MQTT", b"MQIsdp") or level not in (3, 4):
+            self.reject(RC_UNACCEPTABLE_PROTOCOL)
+            return
+
+        client_id, pos = _read_string(body, pos)
+        will = None
+        if flags & 0x04:
+            will_topic, pos = _read_string(body, pos)
+            will_payload, pos = _read_string(body, pos)
+            will = (will_topic.decode(), will_payload, (flags >> 3) & 0x03, bool(flags & 0x20))
+
+        username = password = None
+        if flags & 0x80:
+            username, pos = _read_string(body, pos)
+        if flags & 0x40:
+            password, pos = _read_string(body, pos)
+
+        try:
+            client_id = client_id.decode()
+            username = username.decode() if username is not None else None
+            password = password.decode() if password is not None else None
+        except UnicodeDecodeError:
+            raise ProtocolError("Invalid UTF-8 in CONNECT")
+
+        if not client_id:
+            self.reject(RC_IDENTIFIER_REJECTED)
+            return
+
+        code = self.broker.authenticate(client_id, username, password)
+        if code != RC_ACCEPTED:
+            logger.debug(f"({client_id}) Rejected connection from {username!r}")
+            self.reject(code)
+            return
+
+        self.client_id = client_id
+        self.username = username
+        self.keepalive = keepalive
+        self.will = will
+        self.broker.attach(self)
+        self.transport.write(bytes((CONNACK, 2, 0, RC_ACCEPTED)))
+
+    def on_publish(self, header: int, body: bytes) -> None:
+        qos = (header >> 1) & 0x03
+        topic, pos = _read_string(body, 0)
+        if qos:
+            if pos + 2 > len(body):
+                raise ProtocolError("Truncated PUBLISH")
+            packet_id = body[pos : pos + 2]
+            pos += 2
+            if qos == 1:
+                self.transport.write(encode_packet(PUBACK, packet_id))
+            elif qos == 2:
+                self.transport.write(encode_packet(PUBREC, packet_id))
+            else:
+                raise ProtocolError("Invalid QoS")
+
+        try:
+            topic = topic.decode()
+        except UnicodeDecodeError:
+            raise ProtocolError("Invalid UTF-8 in topic")
+        if "+" in topic or "#" in topic:
+            raise ProtocolError("Wildcards are not allowed in topic names")
+        self.broker.publish(topic, body[pos:], qos, bool(header & 0x01))
+
+    def on_subscribe(self, body: bytes) -> None:
+        packet_id, pos = body[:2], 2
+        granted = bytearray()
+        while pos < len(body):
+            topic_filter, pos = _read_string(body, pos)
+            if pos >= len(body):
+                raise ProtocolError("Truncated SUBSCRIBE")
+            qos = min(body[pos] & 0x03, 1)
+            pos += 1
+            try:
+                topic_filter = topic_filter.decode()
+            except UnicodeDecodeError:
+                granted.append(SUBACK_FAILURE)
+                continue
+
+            if self.broker.subscribe(self, topic_filter, qos):
+                granted.append(qos)
+            else:
+                granted.append(SUBACK_FAILURE)
+        self.transport.write(encode_packet(SUBACK, packet_id + granted))
+
+    def on_unsubscribe(self, body: bytes) -> None:
+        packet_id, pos = body[:2], 2
+        while pos < len(body):
+            topic_filter, pos = _read_string(body, pos)
+            self.broker.unsubscribe(self, topic_filter.decode(errors="replace"))
+        self.transport.write(encode_packet(UNSUBACK, packet_id))
+
+    # --- helpers ---
+    def send(self, data: bytes) -> None:
+        transport = self.transport
+        if transport is None or transport.is_closing():
+            return
+        if transport.get_write_buffer_size() > self.broker.write_high_water:
+            # a device that does not read its messages must not stall the broker
+            logger.debug(f"({self.client_id}) Dropping slow consumer")
+            self.broker.stats.dropped += 1
+            self.abort()
+            return
+        transport.write(data)
+
+    def packet_id(self) -> int:
+        packet_id = self.next_packet_id
+        self.next_packet_id = packet_id % 0xFFFF + 1
+        return packet_id
+
+    def reject(self, code: int) -> None:
+        self.broker.stats.rejected += 1
+        self.closing = True
+        self.transport.write(bytes((CONNACK, 2, 0, code)))
+        self.transport.close()
+
+    def abort(self) -> None:
+        if self.transport is not None:
+            self.transport.abort()
+
+
+class Broker:
+    def __init__(
+        self,
+        shared_key: str | None = None,
+        user_id: str | None = None,
+        allow_anonymous: bool = False,
+        max_packet_size: int = DEFAULT_MAX_PACKET_SIZE,
+        write_high_water: int = DEFAULT_WRITE_HIGH_WATER,
+    ) -> None:
+        self.shared_key = shared_key
+        self.user_id = user_id
+        self.allow_anonymous = allow_anonymous
+        self.max_packet_size = max_packet_size
+        self.write_high_water = write_high_water
+        self.stats = BrokerStats()
+        self.clients: set[MQTTProtocol] = set()
+        self.sessions: dict[str, MQTTProtocol] = {}
+        # exact topic -> {client: qos}, used for all non-wildcard filters
+        self.exact: dict[str, dict[MQTTProtocol, int]] = {}
+        self.wildcards = TopicTree()
+        self.wildcard_count = 0
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self._keepalive_task: asyncio.Task | None = None
+
+    def authenticate(
+        self, client_id: str, username: str | None, password: str | None
+    ) -> int:
+        if self.allow_anonymous:
+            return RC_ACCEPTED
+        if username is None or password is None:
+            return RC_NOT_AUTHORIZED
+        if not mqtt.verify_password(username, password, self.shared_key, self.user_id):
+            return RC_BAD_CREDENTIALS
+        return RC_ACCEPTED
+
+    def attach(self, client: MQTTProtocol) -> None:
+        previous = self.sessions.get(client.client_id)
+        if previous is not None:
+            # session takeover: the device reconnected before the old socket died
+            logger.debug(f"({client.client_id}) Taking over existing session")
+            previous.closing = True
+            previous.will = None
+            self.detach(previous, graceful=True)
+            previous.abort()
+
+        self.sessions[client.client_id] = client
+        self.stats.connections += 1
+        self.stats.total_connections += 1
+
+    def detach(self, client: MQTTProtocol, graceful: bool) -> None:
+        self.clients.discard(client)
+        if client.client_id is None or self.sessions.get(client.client_id) is not client:
+            return
+
+        del self.sessions[client.client_id]
+        self.stats.connections -= 1
+        for topic_filter in list(client.subscriptions):
+            self.unsubscribe(client, topic_filter)
+
+        if not graceful and client.will is not None:
+            topic, payload, qos, retain = client.will
+            client.will = None
+            self.publish(topic, payload, qos, retain)
+
+    def subscribe(self, client: MQTTProtocol, topic_filter: str, qos: int) -> bool:
+        if not topic_filter or not _valid_filter(topic_filter):
+            return False
+
+        if "+" in topic_filter or "#" in topic_filter:
+            # a repeated SUBSCRIBE only replaces the QoS
+            if topic_filter not in client.subscriptions:
+                self.wildcard_count += 1
+            self.wildcards.add(topic_filter, client, qos)
+        else:
+            self.exact.setdefault(topic_filter, {})[client] = qos
+        client.subscriptions.add(topic_filter)
+        return True
+
+    def unsubscribe(self, client: MQTTProtocol, topic_filter: str) -> None:
+        if topic_filter not in client.subscriptions:
+            return
+
+        client.subscriptions.discard(topic_filter)
+        if "+" in topic_filter or "#" in topic_filter:
+            self.wildcards.remove(topic_filter, client)
+            self.wildcard_count -= 1
+        else:
+            subscribers = self.exact.get(topic_filter)
+            if subscribers is not None:
+                subscribers.pop(client, None)
+                if not subscribers:
+                    del self.exact[topic_filter]
+
+    def publish(self, topic: str, payload: bytes, qos: int = 0, retain: bool = False):
+        self.stats.received += 1
+        subscribers = self.exact.get(topic)
+        if self.wildcard_count:
+            targets = dict(subscribers) if subscribers else {}
+            self.wildcards.match(topic.split("/"), targets)
+            subscribers = targets
+        if not subscribers:
+            return
+
+        topic_data = encode_string(topic)
+        packet0 = None
+        for client, sub_qos in list(subscribers.items()):
+            if min(qos, sub_qos) == 0:
+                if packet0 is None:
+                    packet0 = encode_packet(PUBLISH, topic_data + payload)
+                client.send(packet0)
+            else:
+                packet_id = _U16.pack(client.packet_id())
+                client.send(encode_packet(PUBLISH | 0x02, topic_data + packet_id + payload))
+            self.stats.delivered += 1
+
+    async def check_keepalive(self, interval: float = 5.0) -> None:
+        # one sweep for all clients instead of a timer per connection
+        while True:
+            await asyncio.sleep(interval)
+            now = self.loop.time()
+            for client in list(self.clients):
+                # clients that never finish CONNECT are dropped as well
+                timeout = client.keepalive * 1.5 if client.keepalive else None
+                if client.client_id is None:
+                    timeout = 10.0
+                if timeout and now - client.last_seen > timeout:
+                    logger.debug(f"({client.client_id}) Keepalive timeout")
+                    client.abort()
+
+    async def serve(
+        self,
+        host: str,
+        port: int,
+        ssl_context: ssl.SSLContext | None = None,
+        backlog: int = 1024,
+    ) -> asyncio.Server:
+        self.loop = asyncio.get_running_loop()
+        server = await self.loop.create_server(
+            lambda: MQTTProtocol(self), host, port, ssl=ssl_context, backlog=backlog
+        )
+        self._keepalive_task = self.loop.create_task(self.check_keepalive())
+        return server
+
+
+def _valid_filter(topic_filter: str) -> bool:
+    levels = topic_filter.split("/")
+    for idx, level in enumerate(levels):
+        if "#" in level and (level != "#" or idx != len(levels) - 1):
+            return False
+        if "+" in level and level != "+":
+            return False
+    return True
+
+
+def create_ssl_context(certfile: str, keyfile: str | None = None) -> ssl.SSLContext:
+    # devices only speak TLSv1.2 and do not send client certificates
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    context.load_cert_chain(certfile, keyfile)
+    return context
@@ -1,5 +1,12 @@
-from libmeross.commands import device, cloud, chip, discover
+from libmeross.commands import device, cloud, chip, discover, mqtt, telemetry
 
 from .shared import submodule
 
-CMD_LIST = (submodule(device), submodule(cloud), submodule(chip), discover.install_parser)
+CMD_LIST = (
+    submodule(device),
+    submodule(cloud),
+    submodule(chip),
+    submodule(mqtt),
+    submodule(telemetry),
+    discover.install_parser,
+)
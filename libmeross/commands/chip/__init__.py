@@ -1,4 +1,4 @@
-from libmeross.commands.chip import amebaz2, mtk
+from libmeross.commands.chip import amebaz2, mtk, scan
 
 __submodule__ = True
-__doc__ = "Commands for working with various chips used in Meross' products"
\ No newline at end of file
+__doc__ = "Commands for working with various chips used in Meross' products"
@@ -1,4 +1,4 @@
-from libmeross.commands.chip.amebaz2 import console, read
+from libmeross.commands.chip.amebaz2 import batch, console, diff, parse, partab, read, serve, simulate, verify, write
 
 __doc__ = """\
 Commands for working with RTL8720C* chips
@@ -0,0 +1,161 @@
+import argparse
+import time
+
+from pathlib import Path
+
+from rich.console import Console
+from rich.table import Table
+
+from libmeross.ambz2.batch import (
+    CACHE_NAME,
+    STATUS_PASSED,
+    DumpSummary,
+    VerifyCache,
+    verify_paths,
+    write_csv,
+    write_json,
+)
+from libmeross.scan import collect_files
+from libmeross.util import logger
+from libmeross.commands.shared import parser_get_usage, require_info_level
+from libmeross.commands.chip.amebaz2.verify import hexkey
+
+
+def install_parser(subparsers: argparse._SubParsersAction) -> None:
+    parser = subparsers.add_parser(
+        "batch",
+        help="Verify all flash dumps in a directory",
+        usage=parser_get_usage(__name__),
+        description="Chip Tool - Batch Verification",
+    )
+    parser.add_argument(
+        "paths",
+        type=Path,
+        nargs="+",
+        help="Flash dumps or directories (searched recursively)",
+    )
+    parser.add_argument(
+        "--key",
+        type=hexkey,
+        action="append",
+        help="Additional HMAC key (hex) to try besides the default key (can be repeated)",
+        default=[],
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Number of worker processes (default: one per CPU)",
+        default=None,
+    )
+    parser.add_argument(
+        "--cache",
+        type=Path,
+        help=f"Result cache (default: {CACHE_NAME} in the first directory)",
+        default=None,
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Verify all dumps again and don't update the cache",
+        default=False,
+    )
+    parser.add_argument(
+        "--csv",
+        type=Path,
+        help="Save the summary as CSV",
+        default=None,
+    )
+    parser.add_argument(
+        "--report",
+        type=Path,
+        help="Save the summary as JSON",
+        default=None,
+    )
+    parser.add_argument(
+        "--all",
+        action="store_true",
+        help="Show passed dumps too, not only failed ones",
+        default=False,
+    )
+    parser.set_defaults(func=cli)
+
+
+STYLES = {"passed": "green", "failed": "red", "skipped": "yellow", "error": "red"}
+
+
+def _styled(status: str) -> str:
+    return f"[{STYLES[status]}]{status}[/]" if status else ""
+
+
+def print_summaries(summaries: list[DumpSummary], console: Console) -> None:
+    table = Table(title="Batch Verification")
+    table.add_column("Dump", justify="left", style="bold")
+    table.add_column("Calibration", justify="left")
+    table.add_column("Partition Table", justify="left")
+    table.add_column("Segments", justify="right")
+    table.add_column("Result", justify="left", overflow="fold")
+    for summary in summaries:
+        result = _styled(summary.status)
+        if summary.error or summary.failed:
+            result += f" ({summary.error or ', '.join(summary.failed)})"
+        segments = summary.segments_passed + summary.segments_failed + summary.segments_skipped
+        table.add_row(
+            summary.path,
+            _styled(summary.calibration),
+            _styled(summary.partition_table),
+            f"{summary.segments_passed}/{segments}",
+            result,
+        )
+    console.print(table)
+
+
+def _cache_path(argv: argparse.Namespace) -> Path | None:
+    if argv.no_cache:
+        return None
+    if argv.cache:
+        return argv.cache
+    directory = next((path for path in argv.paths if path.is_dir()), None)
+    return directory / CACHE_NAME if directory else None
+
+
+def cli(argv: argparse.Namespace) -> None:
+    require_info_level(argv)
+    start = time.perf_counter()
+    cache_path = _cache_path(argv)
+    skip = {cache_path.resolve()} if cache_path else set()
+    files = [
+        path
+        for path in collect_files(argv.paths)
+        if not path.name.startswith(CACHE_NAME) and path.resolve() not in skip
+    ]
+    if not files:
+        logger.error("No dumps found")
+        return
+
+    cache = VerifyCache(cache_path, argv.key)
+    summaries = list(verify_paths(files, argv.key, cache, argv.workers))
+    try:
+        cache.save()
+    except OSError as e:
+        logger.warning(f"Failed to save cache: {e}")
+
+    shown = [s for s in summaries if argv.all or s.status != STATUS_PASSED]
+    if shown:
+        print_summaries(shown, Console())
+    for path, write in ((argv.csv, write_csv), (argv.report, write_json)):
+        if path:
+            try:
+                write(summaries, path)
+            except OSError as e:
+                logger.error(f"Failed to write {path}: {e}")
+
+    passed = sum(s.status == STATUS_PASSED for s in summaries)
+    cached = sum(s.cached for s in summaries)
+    message = (
+        f"{passed} of {len(summaries)} dumps passed, {cached} from cache "
+        f"({time.perf_counter() - start:.1f}s)"
+    )
+    if passed == len(summaries):
+        logger.info(message)
+    else:
+        logger.error(message)
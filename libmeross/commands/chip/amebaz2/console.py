@@ -1,8 +1,21 @@
 # this script is based on https://github.com/libretiny-eu/ltchiptool/blob/master/ltchiptool/soc/ambz2/util/ambz2tool.py
 import argparse
+import json
+import time
+
+from pathlib import Path
 
 from rich.console import Console
 
+from libmeross.commands.chip.amebaz2.script import (
+    DEFAULT_COMMAND_TIMEOUT,
+    DEFAULT_WINDOW,
+    ON_ERROR_CONTINUE,
+    ON_ERROR_STOP,
+    STATUS_OK,
+    ScriptRunner,
+    load_script,
+)
 from libmeross.commands.chip.amebaz2.util import (
     command,
     init_fallback_connection,
@@ -17,18 +30,90 @@ def install_parser(subparsers: argparse._SubParsersAction) -> None:
         "console", help="Open a serial console in fallback mode"
     )
     parser_add_serial(parser)
+    script_group = parser.add_argument_group("Script-Options")
+    script_group.add_argument(
+        "--script",
+        type=Path,
+        help="Run the commands in this file (one per line) instead of a prompt",
+        default=None,
+    )
+    script_group.add_argument(
+        "--results",
+        type=Path,
+        help="Write the results of the script as JSON to this file (default: stdout)",
+        default=None,
+    )
+    script_group.add_argument(
+        "--on-error",
+        choices=(ON_ERROR_STOP, ON_ERROR_CONTINUE),
+        help="Stop at the first failed command or run the remaining ones "
+        f"(default: {ON_ERROR_STOP})",
+        default=ON_ERROR_STOP,
+    )
+    script_group.add_argument(
+        "--window",
+        type=int,
+        help="Bytes of commands sent ahead while the chip is still answering, "
+        f"0 waits for every command (default: {DEFAULT_WINDOW})",
+        default=DEFAULT_WINDOW,
+    )
+    script_group.add_argument(
+        "--command-timeout",
+        type=float,
+        help="Seconds without output before a command has failed "
+        f"(default: {DEFAULT_COMMAND_TIMEOUT})",
+        default=DEFAULT_COMMAND_TIMEOUT,
+    )
     parser.set_defaults(func=cli)
 
 
+def _run_script(argv, ser) -> None:
+    try:
+        results = load_script(argv.script.read_text())
+    except (OSError, UnicodeDecodeError) as e:
+        logger.error(f"Failed to read script: {e}")
+        return
+
+    runner = ScriptRunner(
+        ser, window=argv.window, on_error=argv.on_error, timeout=argv.command_timeout
+    )
+    start = time.monotonic()
+    success = runner.run(results)
+    elapsed = time.monotonic() - start
+
+    report = json.dumps([result.as_dict() for result in results], indent=2)
+    if argv.results:
+        try:
+            argv.results.write_text(report)
+        except OSError as e:
+            logger.error(f"Failed to write results: {e}")
+    else:
+        print(report)
+
+    done = sum(result.status == STATUS_OK for result in results)
+    message = f"{done} of {len(results)} commands succeeded in {elapsed:.1f}s"
+    if success:
+        logger.info(message)
+    else:
+        logger.error(message)
+
+
 def cli(argv: argparse.Namespace) -> None:
     console = Console()
-    ser = open_serial(argv)
+    ser = open_serial(argv, threaded=argv.script is not None)
     if ser is None:
         return
 
     if not init_fallback_connection(ser, console):
         return
 
+    if argv.script:
+        try:
+            _run_script(argv, ser)
+        finally:
+            ser.close()
+        return
+
     try:
         # duplicate code to enable
         while True:
@@ -0,0 +1,109 @@
+import argparse
+import json
+import time
+
+from contextlib import ExitStack
+from dataclasses import asdict
+from pathlib import Path
+
+from rich.console import Console
+from rich.table import Table
+
+from libmeross.ambz2.diff import DiffResult, diff, sector_digests
+from libmeross.ambz2.image import FlashImage, FlashImageError
+from libmeross.util import logger
+from libmeross.commands.shared import parser_get_usage, require_info_level
+
+
+def install_parser(subparsers: argparse._SubParsersAction) -> None:
+    parser = subparsers.add_parser(
+        "diff",
+        help="Compare flash dumps sector by sector",
+        usage=parser_get_usage(__name__),
+        description="Chip Tool - Flash Image Diff",
+    )
+    parser.add_argument(
+        "reference",
+        type=Path,
+        help="Reference dump (its partition table defines the regions)",
+    )
+    parser.add_argument(
+        "dumps",
+        type=Path,
+        nargs="+",
+        help="Dumps to compare with the reference",
+    )
+    parser.add_argument(
+        "--ranges",
+        type=int,
+        help="Number of changed byte ranges to show per region (default: 4)",
+        default=4,
+    )
+    parser.add_argument(
+        "--report",
+        type=Path,
+        help="Save all changes as JSON",
+        default=None,
+    )
+    parser.set_defaults(func=cli)
+
+
+def print_diff(name: str, result: DiffResult, console: Console, max_ranges: int) -> None:
+    if result.identical:
+        console.print(f"{name}: [green]identical[/]")
+        return
+
+    table = Table(
+        title=f"{name}: {len(result.changed_sectors)} of {result.sectors} sectors, "
+        f"{result.changed_bytes} bytes changed"
+    )
+    table.add_column("Region", justify="left", style="bold")
+    table.add_column("Sectors", justify="right")
+    table.add_column("Bytes", justify="right")
+    table.add_column("Ranges", justify="left")
+    for region in result.by_region():
+        ranges = ", ".join(
+            f"{change.offset:#x}+{change.length:#x}" for change in region.changes[:max_ranges]
+        )
+        if len(region.changes) > max_ranges:
+            ranges += f" (+{len(region.changes) - max_ranges} more)"
+        table.add_row(region.name, str(region.sectors), str(region.bytes), ranges)
+    console.print(table)
+
+
+def cli(argv: argparse.Namespace) -> None:
+    require_info_level(argv)
+    console = Console()
+    report = {}
+    start = time.perf_counter()
+    with ExitStack() as stack:
+        try:
+            reference = stack.enter_context(FlashImage(argv.reference))
+        except (OSError, ValueError, FlashImageError) as e:
+            logger.error(f"Failed to open reference dump: {e}")
+            return
+        digests = sector_digests(reference.data)
+
+        for path in argv.dumps:
+            try:
+                with FlashImage(path) as image:
+                    result = diff(reference, image, digests_a=digests)
+            except (OSError, ValueError, FlashImageError) as e:
+                logger.error(f"Failed to open {path}: {e}")
+                continue
+            print_diff(str(path), result, console, argv.ranges)
+            report[str(path)] = {
+                "changed_sectors": result.changed_sectors,
+                "changes": [asdict(change) for change in result.changes],
+            }
+        for error in reference.errors:
+            logger.warning(error)
+
+    logger.debug(
+        f"Compared {len(argv.dumps)} dumps in {(time.perf_counter() - start) * 1000:.1f}ms"
+    )
+    if argv.report:
+        try:
+            argv.report.write_text(json.dumps(report, indent=2))
+        except OSError as e:
+            logger.error(f"Failed to write report: {e}")
@@ -0,0 +1,431 @@
+# Download mode (ROM flash loader) helpers.
+#
+# Based on https://github.com/libretiny-eu/ltchiptool/blob/master/ltchiptool/soc/ambz2/util/ambz2tool.py
+#
+# The download mode understands the fallback console commands (DB, DW, EW, ...)
+# but does not echo them and prints no prompt. It adds `ping`, `ucfg` (UART
+# configuration), `fwd` (flash download via XMODEM) and `hashq` (SHA-256 of a
+# flash region).
+import binascii
+import hashlib
+import time
+
+from typing import Callable
+
+import serial
+
+from libmeross.commands.chip.amebaz2.dump import ChunkError, read_memory
+from libmeross.commands.chip.amebaz2.util import CMD_NEWLINE, CMD_PROMPT
+from libmeross.util import logger
+
+DEFAULT_BAUDRATES = (1500000, 921600, 460800, 230400)
+
+# ROM console command table (name, handler, help), the pointer is at +4
+ROM_COMMAND_TABLE = 0x1002F050
+REG_CHIP_VERSION = 0x400001F0
+# commands that must not be overwritten when jumping to download mode
+USED_COMMANDS = {
+    "ping", "disc", "ucfg", "DW", "DB", "EW", "EB", "WDTRST", "hashq", "fwd", "fwdram"
+}  # fmt: skip
+
+# memory used to verify a new baud rate (ROM, always readable)
+LINK_TEST_ADDRESS = 0x0
+LINK_TEST_LENGTH = 0x400
+
+FLASH_BASE = 0x98000000
+FLASH_WINDOW = 0x1000000
+REG_FLASH_MODE = 0x40000038
+REG_FLASH_CTRL = 0x40002800
+FLASH_SPEED_SINGLE = 0
+# hashq throughput of the chip in bytes/s, used for timeouts
+HASH_SPEED = 1500000
+# flash bytes covered by one hash base before a new offset is set
+HASH_REBASE = 0x40000
+FLASH_SECTOR_SIZE = 0x1000
+
+XMODEM_STX = b"\x02"
+XMODEM_EOT = b"\x04"
+XMODEM_ACK = b"\x06"
+XMODEM_NAK = b"\x15"
+XMODEM_CAN = b"\x18"
+XMODEM_CRC = b"C"
+XMODEM_BLOCK_SIZE = 1024
+XMODEM_RETRIES = 10
+
+
+class DownloadModeError(Exception):
+    pass
+
+
+def register_read(ser: serial.Serial, address: int, prompt: bool = True) -> int:
+    data = read_memory(ser, address & ~3, 4, words=True, prompt=prompt)
+    return int.from_bytes(data, "little")
+
+
+def register_write(
+    ser: serial.Serial, address: int, value: int, prompt: bool = True
+) -> None:
+    ser.write(f"EW {address:X} {value:X}".encode() + CMD_NEWLINE)
+    if prompt:
+        ser.read_until(CMD_PROMPT)
+    else:
+        ser.readline()
+
+
+def enter_download_mode(ser: serial.Serial) -> None:
+    """Jump from the fallback console into the download mode.
+
+    The handler of an unused ROM console command is pointed to the download
+    mode entry, which is then started by executing that command.
+    """
+    chip_ver = (register_read(ser, REG_CHIP_VERSION) >> 4) & 0xF
+    entry = (0x0 if chip_ver > 2 else 0x1443C) | 1
+
+    table = register_read(ser, ROM_COMMAND_TABLE + 4)
+    boot_cmd = None
+    for cmd_ptr in range(table, table + 8 * 12, 12):
+        name_ptr = register_read(ser, cmd_ptr)
+        if name_ptr == 0:
+            break
+        name = read_memory(ser, name_ptr, 16).partition(b"\x00")[0]
+        if not name.isascii() or name.decode() in USED_COMMANDS:
+            continue
+        boot_cmd = cmd_ptr + 4, name.decode()
+
+    if boot_cmd is None:
+        raise DownloadModeError("No unused ROM command found")
+
+    handler_ptr, name = boot_cmd
+    logger.debug(f"Jumping to download mode ({entry:#x}) with command {name!r}")
+    register_write(ser, handler_ptr, entry)
+    ser.write(name.encode() + CMD_NEWLINE)
+    # the fallback console still echoes the command, which must not be
+    # mistaken for the answer to the first ping
+    ser.readline()
+    if not link(ser):
+        raise DownloadModeError("No response after entering download mode")
+
+
+def ping(ser: serial.Serial) -> bool:
+    ser.reset_input_buffer()
+    ser.write(b"ping" + CMD_NEWLINE)
+    if ser.read(4) != b"ping":
+        return False
+    # a fallback console would print its prompt
+    return CMD_PROMPT not in ser.read(ser.in_waiting)
+
+
+def link(ser: serial.Serial, timeout: float = 2.0) -> bool:
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if ping(ser):
+            return True
+    return False
+
+
+def _switch(ser: serial.Serial, baudrate: int) -> bool:
+    ser.reset_input_buffer()
+    ser.write(f"ucfg {baudrate} 0 0".encode() + CMD_NEWLINE)
+    ser.flush()
+    ser.baudrate = baudrate
+
+    timeout, ser.timeout = ser.timeout, 1.0
+    try:
+        response = ser.read(2)
+    finally:
+        ser.timeout = timeout
+    return response == b"OK"
+
+
+def verify_link(ser: serial.Serial) -> bool:
+    # a few pings plus a longer transfer that must read back identically
+    if not all(ping(ser) for _ in range(3)):
+        return False
+    try:
+        first = read_memory(ser, LINK_TEST_ADDRESS, LINK_TEST_LENGTH, True, False)
+        second = read_memory(ser, LINK_TEST_ADDRESS, LINK_TEST_LENGTH, True, False)
+    except ChunkError as e:
+        logger.debug(f"Link test failed: {e}")
+        return False
+    return first == second
+
+
+def change_baudrate(ser: serial.Serial, baudrate: int) -> bool:
+    """Switch chip and host to *baudrate*; restores the old rate on errors.
+
+    Raises DownloadModeError if neither rate works afterwards.
+    """
+    previous = ser.baudrate
+    if baudrate == previous:
+        return True
+
+    if _switch(ser, baudrate) and verify_link(ser):
+        return True
+
+    # the chip may or may not have switched - try both ways back
+    logger.debug(f"Link unstable at {baudrate} baud, reverting to {previous}")
+    if _switch(ser, previous) and link(ser):
+        return False
+    ser.baudrate = previous
+    if link(ser):
+        return False
+    raise DownloadModeError(f"Lost connection while switching to {baudrate} baud")
+
+
+def escalate_baudrate(
+    ser: serial.Serial, baudrates: tuple[int, ...] = DEFAULT_BAUDRATES
+) -> int:
+    """Switch to the highest of *baudrates* that passes the link test."""
+    for baudrate in sorted(baudrates, reverse=True):
+        if baudrate <= ser.baudrate:
+            break
+        if change_baudrate(ser, baudrate):
+            logger.info(f"Switched to {baudrate} baud")
+            return baudrate
+        logger.warning(f"Falling back from {baudrate} baud")
+    return ser.baudrate
+
+
+class FlashHash:
+    """On-chip SHA-256 of flash regions (`hashq`).
+
+    `hashq` hashes from an offset that can only be set by starting a flash
+    download (`fwd`) and cancelling the XMODEM transfer right away.
+    """
+
+    def __init__(self, ser: serial.Serial, speed: int = FLASH_SPEED_SINGLE) -> None:
+        self.ser = ser
+        self.speed = speed
+        self.mode: int | None = None
+        self.offset: int | None = None
+
+    def init(self) -> None:
+        if self.mode is None:
+            self.mode = (register_read(self.ser, REG_FLASH_MODE, False) >> 5) & 0b11
+            register_write(self.ser, REG_FLASH_CTRL, 0x7EFFFFFF, False)
+            logger.debug(f"Flash mode: {self.mode}")
+
+    def set_offset(self, offset: int) -> None:
+        self.init()
+        ser = self.ser
+        ser.reset_input_buffer()
+        ser.write(f"fwd {self.speed} {self.mode} {offset:x}".encode() + CMD_NEWLINE)
+        # the chip asks for the first XMODEM block about once per second
+        timeout, ser.timeout = ser.timeout, 3.0
+        try:
+            if (response := ser.read(1)) != XMODEM_NAK:
+                raise DownloadModeError(f"Expected NAK, got {response!r}")
+            ser.write(XMODEM_CAN * 2)
+            if (response := ser.read(3)) != XMODEM_CAN + b"ER":
+                raise DownloadModeError(f"Expected CAN, got {response!r}")
+        finally:
+            ser.timeout = timeout
+        if not link(ser):
+            raise DownloadModeError("No response after setting the hash offset")
+        self.offset = offset
+
+    def digest(self, length: int) -> bytes:
+        """SHA-256 of *length* bytes starting at the current offset."""
+        self.init()
+        ser = self.ser
+        ser.reset_input_buffer()
+        ser.write(f"hashq {length} {self.speed} {self.mode}".encode() + CMD_NEWLINE)
+        timeout, ser.timeout = ser.timeout, max(ser.timeout, length / HASH_SPEED + 0.5)
+        try:
+            response = ser.read(6 + 32)
+        finally:
+            ser.timeout = timeout
+        if not response.startswith(b"hashs ") or len(response) < 38:
+            raise ChunkError(f"Unexpected hashq response: {response!r}")
+        return response[6:]
+
+
+class VerifiedReader:
+    """Chunk reader for the download mode: DW dumps checked with `hashq`.
+
+    The ROM has no command that uploads memory in binary form, so data is
+    still transferred as text, but as word dumps (about 27% less output
+    than DB). Every flash chunk is compared with the on-chip SHA-256 of the
+    same range. The hash offset is moved only every HASH_REBASE bytes as
+    setting it costs about a second; in between, the running hash from the
+    offset is extended chunk by chunk.
+    """
+
+    def __init__(
+        self,
+        ser: serial.Serial,
+        rebase: int = HASH_REBASE,
+        flash_hash: FlashHash | None = None,
+    ) -> None:
+        self.hash = flash_hash or FlashHash(ser)
+        self.rebase = rebase
+        self.sha = hashlib.sha256()
+        self.hashed = 0
+
+    def __call__(
+        self,
+        ser: serial.Serial,
+        address: int,
+        length: int,
+        into: memoryview | None = None,
+    ) -> bytes | memoryview:
+        words = address % 4 == 0 and length % 4 == 0
+        data = read_memory(ser, address, length, words, prompt=False, into=into)
+        if not FLASH_BASE <= address < FLASH_BASE + FLASH_WINDOW:
+            return data
+
+        offset = address - FLASH_BASE
+        if (
+            self.hash.offset is None
+            or self.hash.offset + self.hashed != offset
+            or self.hashed >= self.rebase
+        ):
+            try:
+                self.hash.set_offset(offset)
+            except DownloadModeError as e:
+                raise ChunkError(str(e))
+            self.sha, self.hashed = hashlib.sha256(), 0
+
+        sha = self.sha.copy()
+        sha.update(data)
+        if sha.digest() != self.hash.digest(self.hashed + length):
+            raise ChunkError(f"SHA-256 mismatch at {address:#x}+{length:#x}")
+        self.sha, self.hashed = sha, self.hashed + length
+        return data
+
+
+def changed_sectors(
+    flash_hash: FlashHash,
+    offset: int,
+    image: bytes,
+    sector_size: int = FLASH_SECTOR_SIZE,
+) -> list[int]:
+    """Return the indexes of all sectors where flash and *image* differ.
+
+    Hashing single sectors would need one (slow) offset change per sector.
+    Instead the prefix hashes from one offset are compared and the first
+    differing sector is found with a binary search; the search continues
+    behind it. Identical images cost a single `hashq` of the whole range.
+    """
+    count = (len(image) + sector_size - 1) // sector_size
+    changed = []
+    pos = 0
+
+    def matches(sectors: int) -> bool:
+        start = pos * sector_size
+        data = image[start : start + sectors * sector_size]
+        return flash_hash.digest(len(data)) == hashlib.sha256(data).digest()
+
+    while pos < count:
+        flash_hash.set_offset(offset + pos * sector_size)
+        if matches(count - pos):
+            break
+        # the first 'low' sectors match, the first 'high' ones do not
+        low, high = 0, count - pos
+        while high - low > 1:
+            mid = (low + high) // 2
+            if matches(mid):
+                low = mid
+            else:
+                high = mid
+        changed.append(pos + high - 1)
+        pos += high
+    return changed
+
+
+def sector_ranges(sectors: list[int]) -> list[tuple[int, int]]:
+    # [1, 2, 3, 7] -> [(1, 3), (7, 1)] as (first sector, count)
+    ranges: list[tuple[int, int]] = []
+    for sector in sectors:
+        if ranges and ranges[-1][0] + ranges[-1][1] == sector:
+            ranges[-1] = (ranges[-1][0], ranges[-1][1] + 1)
+        else:
+            ranges.append((sector, 1))
+    return ranges
+
+
+def batch_ranges(sectors: list[int], gap: int = 0) -> list[tuple[int, int]]:
+    """Like `sector_ranges`, but joins ranges at most *gap* sectors apart.
+
+    Every `fwd` transfer costs about a second to start, rewriting a few
+    unchanged sectors in between is cheaper.
+    """
+    ranges: list[tuple[int, int]] = []
+    for first, count in sector_ranges(sectors):
+        if ranges and first - sum(ranges[-1]) <= gap:
+            ranges[-1] = (ranges[-1][0], first + count - ranges[-1][0])
+        else:
+            ranges.append((first, count))
+    return ranges
+
+
+def xmodem_send(
+    ser: serial.Serial,
+    data: bytes,
+    on_progress: Callable[[int], None] | None = None,
+) -> None:
+    """Send *data* with XMODEM-1K, padding the last block with 0xFF.
+
+    The receiver must already be waiting (NAK for checksums, 'C' for CRC).
+    """
+    start = ser.read(1)
+    if start not in (XMODEM_NAK, XMODEM_CRC):
+        raise DownloadModeError(f"Expected XMODEM start, got {start!r}")
+    crc = start == XMODEM_CRC
+
+    for index, pos in enumerate(range(0, len(data), XMODEM_BLOCK_SIZE)):
+        block = data[pos : pos + XMODEM_BLOCK_SIZE].ljust(XMODEM_BLOCK_SIZE, b"\xff")
+        seq = (index + 1) & 0xFF
+        if crc:
+            check = binascii.crc_hqx(block, 0).to_bytes(2, "big")
+        else:
+            check = bytes([sum(block) & 0xFF])
+        packet = XMODEM_STX + bytes([seq, 0xFF - seq]) + block + check
+
+        for _ in range(XMODEM_RETRIES):
+            ser.write(packet)
+            response = ser.read(1)
+            if response == XMODEM_ACK:
+                break
+            if response == XMODEM_CAN:
+                raise DownloadModeError(f"Transfer cancelled at block {index}")
+        else:
+            ser.write(XMODEM_CAN * 2)
+            raise DownloadModeError(f"Block {index} not acknowledged")
+        if on_progress:
+            on_progress(min(XMODEM_BLOCK_SIZE, len(data) - pos))
+
+    for _ in range(XMODEM_RETRIES):
+        ser.write(XMODEM_EOT)
+        if ser.read(1) == XMODEM_ACK:
+            return
+    raise DownloadModeError("End of transfer not acknowledged")
+
+
+def flash_write(
+    flash_hash: FlashHash,
+    offset: int,
+    data: bytes,
+    on_progress: Callable[[int], None] | None = None,
+) -> bool:
+    """Write *data* to flash at *offset* and check it with `hashq`.
+
+    `fwd` erases the sectors it writes to and moves the hash offset to
+    *offset*, so the check is a single `hashq` of the written range.
+    Returns False if the on-chip hash does not match.
+    """
+    flash_hash.init()
+    ser = flash_hash.ser
+    ser.reset_input_buffer()
+    ser.write(f"fwd {flash_hash.speed} {flash_hash.mode} {offset:x}".encode() + CMD_NEWLINE)
+    # the chip asks for the first block about once per second and
+    # needs time to erase a sector before acknowledging its data
+    timeout, ser.timeout = ser.timeout, 3.0
+    try:
+        xmodem_send(ser, data, on_progress)
+    finally:
+        ser.timeout = timeout
+    if not link(ser):
+        raise DownloadModeError("No response after flash download")
+    flash_hash.offset = offset
+    return flash_hash.digest(len(data)) == hashlib.sha256(data).digest()
@@ -0,0 +1,356 @@
+# Chunked memory reads over the ROM console (fallback or download mode).
+#
+# Large regions are read in chunks of `DB`/`DW` commands. Each chunk
+# is validated (line addresses, byte count) and retried on its own; the chunk
+# size shrinks after failures and grows again after a run of good chunks.
+# Progress is stored in a sidecar checkpoint next to the output file so that
+# an interrupted dump continues with the first chunk that was not written.
+#
+# File output is preallocated to the dump length and memory-mapped: every
+# line is decoded straight to its offset in the file. A chunk that keeps
+# failing is recorded as a hole and the dump continues; holes are read again
+# at the end (or when the dump is resumed).
+import binascii
+import json
+import mmap
+import os
+import re
+import time
+
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import BinaryIO, Callable
+
+import serial
+
+from libmeross.commands.chip.amebaz2.util import (
+    CMD_BUS_FAULT,
+    CMD_NEWLINE,
+    CMD_PROMPT,
+)
+from libmeross.util import logger
+
+DEFAULT_CHUNK_SIZE = 0x1000
+MIN_CHUNK_SIZE = 0x100
+MAX_CHUNK_SIZE = 0x10000
+DEFAULT_RETRIES = 3
+# consecutive good chunks before the chunk size is doubled again
+GROW_AFTER = 8
+
+CHECKPOINT_SUFFIX = ".ckpt"
+
+_DUMP_LINE = re.compile(rb"\s*([0-9A-Fa-f]{8}):")
+
+
+class ChunkError(Exception):
+    pass
+
+
+@dataclass
+class Checkpoint:
+    address: int
+    length: int
+    done: int = 0
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+    # [offset, size] of failed chunks before 'done'
+    holes: list[list[int]] = field(default_factory=list)
+
+    @staticmethod
+    def path_for(output: str | Path) -> Path:
+        return Path(f"{output}{CHECKPOINT_SUFFIX}")
+
+    @classmethod
+    def load(cls, path: Path) -> "Checkpoint | None":
+        try:
+            with open(path, "r") as fp:
+                return cls(**json.load(fp))
+        except (FileNotFoundError, json.JSONDecodeError, TypeError):
+            return None
+
+    def save(self, path: Path) -> None:
+        # write-then-rename, a torn checkpoint must never point past the data
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w") as fp:
+            json.dump(asdict(self), fp)
+        os.replace(tmp, path)
+
+
+class MappedOutput:
+    """Output file preallocated to *length* bytes and mapped into memory.
+
+    An existing file is kept (and resized), so a resumed dump only fills in
+    what is missing.
+    """
+
+    def __init__(self, path: str | Path, length: int) -> None:
+        self.file = open(path, "r+b" if os.path.exists(path) else "w+b")
+        self.file.truncate(length)
+        self.map = mmap.mmap(self.file.fileno(), length)
+        self.view = memoryview(self.map)
+
+    def flush(self, offset: int = 0, size: int | None = None) -> None:
+        # msync needs a page aligned start
+        start = offset - offset % mmap.ALLOCATIONGRANULARITY
+        end = len(self.map) if size is None else offset + size
+        self.map.flush(start, end - start)
+
+    def close(self) -> None:
+        self.view.release()
+        self.map.close()
+        self.file.close()
+
+
+def read_memory(
+    ser: serial.Serial,
+    address: int,
+    length: int,
+    words: bool = False,
+    prompt: bool = True,
+    into: memoryview | None = None,
+) -> bytes | memoryview:
+    """Read memory using DB (bytes) or DW (words) and validate every line.
+
+    The fallback console echoes the command and ends the output with a
+    prompt (*prompt*), the download mode does neither. The dump itself is
+    terminated by its byte count, so both work the same way. DW prints
+    four words per line (57 instead of 78 characters for 16 bytes) but
+    needs a word-aligned address and length.
+
+    Lines are decoded to their offset (line address - *address*) in *into*
+    if given, which is then returned instead of a new bytes object.
+    """
+    if words:
+        cmd = f"DW {address:X} {(length + 3) // 4}"
+    else:
+        cmd = f"DB {address:X} {length}"
+    width = 8 if words else 2
+    # a SerialTransport hands out all buffered lines at once
+    read_lines = getattr(ser, "read_lines", None)
+
+    data = bytearray(length) if into is None else into
+    done = 0
+    ser.write(cmd.encode() + CMD_NEWLINE)
+    while done < length:
+        # never consume more lines than data is missing, the prompt or the
+        # next response must stay in the buffer
+        limit = -(-(length - done) // 16)
+        lines = read_lines(limit) if read_lines else [ser.readline()]
+        if not lines or not lines[-1].endswith(b"\n"):
+            raise ChunkError(f"short read at {address:#x}: {done}/{length} bytes")
+
+        # validate the batch, then decode its values in one go
+        values = []
+        expected = address + done
+        for line in lines:
+            if CMD_BUS_FAULT in line:
+                raise ChunkError(f"{line.strip().decode(errors='replace')} at {address:#x}")
+            match = _DUMP_LINE.match(line)
+            if match is None:  # echo, header or empty line
+                continue
+
+            line_address = int(match.group(1), 16)
+            if line_address != expected:
+                raise ChunkError(f"expected {expected:#x}, got {line_address:#x}")
+            # a partial last line is followed by the ASCII column, only
+            # take the values that belong to the dump
+            remaining = length - (expected - address)
+            count = -(-min(16, remaining) * 2 // width)
+            items = line[match.end() :].split()[:count]
+            if len(items) < count:
+                raise ChunkError(f"truncated line {line!r}")
+            if any(len(item) != width for item in items):
+                raise ChunkError(f"invalid line {line!r}")
+            values += items
+            expected += 16
+
+        try:
+            chunk = binascii.unhexlify(b"".join(values))
+        except binascii.Error:
+            raise ChunkError(f"invalid data at {address + done:#x}")
+        if words:
+            # words are printed big-endian
+            swapped = bytearray(len(chunk))
+            for i in range(4):
+                swapped[i::4] = chunk[3 - i :: 4]
+            chunk = swapped
+        count = min(len(chunk), length - done)
+        data[done : done + count] = chunk[:count]
+        done += count
+
+    if prompt:
+        ser.read_until(CMD_PROMPT)
+    return bytes(data) if into is None else data
+
+
+def resync(ser: serial.Serial, prompt: bool = True) -> None:
+    # drop the rest of a broken response and wait for a fresh prompt
+    ser.reset_input_buffer()
+    if prompt:
+        ser.write(CMD_NEWLINE)
+        ser.read_until(CMD_PROMPT)
+    else:
+        # the download mode has no prompt, wait for the output to end
+        while ser.read(4096):
+            pass
+    ser.reset_input_buffer()
+
+
+@dataclass
+class DumpStats:
+    chunks: int = 0
+    failures: int = 0
+    bytes: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        return self.bytes / self.elapsed if self.elapsed else 0.0
+
+
+class ChunkedReader:
+    def __init__(
+        self,
+        ser: serial.Serial,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        retries: int = DEFAULT_RETRIES,
+        min_chunk_size: int = MIN_CHUNK_SIZE,
+        max_chunk_size: int = MAX_CHUNK_SIZE,
+        reader: Callable[..., bytes | memoryview] = read_memory,
+        prompt: bool = True,
+    ) -> None:
+        self.ser = ser
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.min_chunk_size = min(min_chunk_size, chunk_size)
+        self.max_chunk_size = max(max_chunk_size, chunk_size)
+        self.reader = reader
+        self.prompt = prompt
+        self.stats = DumpStats()
+        self._good = 0
+
+    def read(
+        self,
+        address: int,
+        length: int,
+        output: BinaryIO | MappedOutput,
+        checkpoint: Checkpoint | None = None,
+        checkpoint_path: Path | None = None,
+        on_progress: Callable[[int], None] | None = None,
+    ) -> bool:
+        """Read *length* bytes starting at *address* into *output*.
+
+        A stream is written sequentially and reading stops at the first chunk
+        that fails within the retry limit; everything before it has been
+        written and checkpointed. A MappedOutput is written in place: failed
+        chunks are skipped and read again at the end. Returns False if any
+        data is missing.
+        """
+        mapped = isinstance(output, MappedOutput)
+        done = checkpoint.done if checkpoint else 0
+        holes = [tuple(hole) for hole in checkpoint.holes] if checkpoint else []
+        if checkpoint:
+            self.chunk_size = checkpoint.chunk_size
+
+        def save() -> None:
+            if checkpoint and checkpoint_path:
+                if not mapped:
+                    os.fsync(output.fileno())
+                checkpoint.done = done
+                checkpoint.chunk_size = self.chunk_size
+                checkpoint.holes = [list(hole) for hole in holes]
+                checkpoint.save(checkpoint_path)
+
+        start = time.monotonic()
+        try:
+            while done < length:
+                size = min(self.chunk_size, length - done)
+                view = output.view[done : done + size] if mapped else None
+                data = self._read_chunk(address + done, size, view)
+                if data is None:
+                    if not mapped:
+                        return False
+                    # the chunk size may have shrunk while retrying
+                    size = min(size, self.chunk_size)
+                    holes.append((done, size))
+                    done += size
+                    save()
+                    continue
+
+                if mapped:
+                    output.flush(done, len(data))
+                else:
+                    output.write(data)
+                    output.flush()
+                done += len(data)
+                self.stats.bytes += len(data)
+                save()
+                if on_progress:
+                    on_progress(len(data))
+
+            for hole in list(holes):
+                if self._read_hole(address, output, *hole, on_progress):
+                    holes.remove(hole)
+                    save()
+        finally:
+            self.stats.elapsed += time.monotonic() - start
+        if holes:
+            logger.error(f"{len(holes)} regions could not be read")
+        return not holes
+
+    def _read_hole(
+        self,
+        address: int,
+        output: MappedOutput,
+        offset: int,
+        size: int,
+        on_progress: Callable[[int], None] | None,
+    ) -> bool:
+        logger.debug(f"Reading hole at {address + offset:#x}+{size:#x}")
+        end = offset + size
+        while offset < end:
+            chunk = min(self.chunk_size, end - offset)
+            data = self._read_chunk(
+                address + offset, chunk, output.view[offset : offset + chunk]
+            )
+            if data is None:
+                return False
+            output.flush(offset, len(data))
+            offset += len(data)
+            self.stats.bytes += len(data)
+            if on_progress:
+                on_progress(len(data))
+        return True
+
+    def _read_chunk(
+        self, address: int, size: int, into: memoryview | None = None
+    ) -> bytes | memoryview | None:
+        attempt = 0
+        while True:
+            try:
+                data = self.reader(self.ser, address, size, into=into)
+            except ChunkError as e:
+                self.stats.failures += 1
+                self._good = 0
+                attempt += 1
+                logger.debug(f"Chunk {address:#x}+{size:#x} failed: {e}")
+                if attempt > self.retries:
+                    if into is None:
+                        logger.error(f"Giving up at {address:#x} after {attempt} attempts: {e}")
+                    else:
+                        logger.warning(f"Skipping {address:#x} after {attempt} attempts: {e}")
+                    return None
+
+                # smaller chunks for a link that drops data
+                self.chunk_size = max(self.min_chunk_size, self.chunk_size // 2)
+                size = min(size, self.chunk_size)
+                if into is not None:
+                    into = into[:size]
+                resync(self.ser, self.prompt)
+                continue
+
+            self.stats.chunks += 1
+            self._good += 1
+            if self._good >= GROW_AFTER and self.chunk_size < self.max_chunk_size:
+                self.chunk_size = min(self.max_chunk_size, self.chunk_size * 2)
+                self._good = 0
+            return data
@@ -0,0 +1,216 @@
+# Run a chip command on several serial ports at once.
+#
+# Every port gets its own worker process (the serial transfers are mostly
+# waiting, but decoding and hashing are CPU bound). Workers report progress
+# and log records through a queue; the parent shows one progress bar per
+# port and prints a summary of all devices at the end.
+import copy
+import logging
+import logging.handlers
+import multiprocessing
+import queue
+import re
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+import serial
+
+from serial.tools.list_ports import comports
+from rich.console import Console
+from rich.markup import escape
+from rich.progress import (
+    BarColumn,
+    DownloadColumn,
+    Progress,
+    TextColumn,
+    TimeElapsedColumn,
+    TransferSpeedColumn,
+)
+from rich.table import Table
+
+from libmeross.util import logger
+
+PORTS_ALL = "all"
+
+# device identifiers in the configuration stored in flash
+_UUID = re.compile(rb'uuid"?\s*[:=]\s*"?([0-9a-fA-F]{32})')
+_MAC = re.compile(rb"(?<![0-9A-Fa-f:])((?:[0-9A-Fa-f]{2}:){5}[0-9A-Fa-f]{2})(?![0-9A-Fa-f:])")
+
+
+@dataclass
+class PortResult:
+    port: str
+    success: bool
+    bytes: int = 0
+    elapsed: float = 0.0
+    mac: str | None = None
+    uuid: str | None = None
+
+    @property
+    def rate(self) -> float:
+        return self.bytes / self.elapsed if self.elapsed else 0.0
+
+
+def resolve_ports(spec: str) -> list[str]:
+    # "all" or a comma separated list of ports
+    if spec == PORTS_ALL:
+        try:
+            return sorted(port.device for port in comports())
+        except serial.SerialException:
+            logger.error("Failed to list serial ports")
+            return []
+    return [port for port in spec.split(",") if port]
+
+
+def port_path(path: Path | None, port: str) -> Path | None:
+    """Per-port variant of an output path.
+
+    A `{port}` placeholder is replaced by the port name, otherwise the name
+    is appended to the file name (dump.bin -> dump-ttyUSB0.bin).
+    """
+    if path is None:
+        return None
+    name = Path(port).name
+    if "{port}" in path.name:
+        return path.with_name(path.name.replace("{port}", name))
+    return path.with_name(f"{path.stem}-{name}{path.suffix}")
+
+
+def device_ids(data: bytes) -> tuple[str | None, str | None]:
+    # (MAC, UUID) found in a flash image
+    uuid = _UUID.search(data)
+    mac = _MAC.search(data)
+    return (
+        mac.group(1).decode().lower() if mac else None,
+        uuid.group(1).decode().lower() if uuid else None,
+    )
+
+
+class Reporter:
+    """Progress of one port, sent to the parent process."""
+
+    def __init__(self, events: multiprocessing.Queue, port: str) -> None:
+        self.events = events
+        self.port = port
+
+    def start(self, total: int, completed: int = 0) -> None:
+        self.events.put(("start", self.port, (total, completed)))
+
+    def advance(self, count: int) -> None:
+        self.events.put(("advance", self.port, count))
+
+    def update(self, completed: int) -> None:
+        self.events.put(("update", self.port, completed))
+
+
+class _LogHandler(logging.handlers.QueueHandler):
+    def __init__(self, events: multiprocessing.Queue, port: str) -> None:
+        super().__init__(events)
+        self.port = port
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        self.queue.put(("log", self.port, record))
+
+
+def _worker(func: Callable, argv, events: multiprocessing.Queue) -> None:
+    # log records are printed by the parent, below the progress bars
+    logger.handlers = [_LogHandler(events, argv.port)]
+    logger.propagate = False
+    try:
+        result = func(argv, Reporter(events, argv.port))
+    except Exception as e:
+        logger.error(f"Worker failed: {e!r}")
+        result = None
+    events.put(("done", argv.port, result or PortResult(argv.port, False)))
+
+
+def run_ports(
+    argv,
+    func: Callable,
+    ports: list[str],
+    outputs: tuple[str, ...] = ("output",),
+) -> list[PortResult]:
+    """Run *func(argv, reporter)* for every port in its own process.
+
+    *outputs* names the path arguments that get a per-port variant.
+    """
+    events = multiprocessing.Queue()
+    processes = {}
+    for port in ports:
+        port_argv = copy.copy(argv)
+        port_argv.port, port_argv.ports = port, None
+        for name in outputs:
+            setattr(port_argv, name, port_path(getattr(argv, name), port))
+        processes[port] = multiprocessing.Process(
+            target=_worker, args=(func, port_argv, events), name=f"port-{Path(port).name}"
+        )
+
+    results: dict[str, PortResult] = {}
+    progress = Progress(
+        TextColumn("{task.description}"),
+        BarColumn(),
+        DownloadColumn(),
+        TransferSpeedColumn(),
+        TimeElapsedColumn(),
+    )
+    tasks = {port: progress.add_task(port, start=False, total=None) for port in ports}
+    with progress:
+        for process in processes.values():
+            process.start()
+        try:
+            while len(results) < len(ports):
+                try:
+                    kind, port, value = events.get(timeout=0.5)
+                except queue.Empty:
+                    # a worker that died without reporting
+                    for port, process in processes.items():
+                        if port not in results and not process.is_alive():
+                            results[port] = PortResult(port, False)
+                    continue
+
+                if kind == "log":
+                    value.msg = f"{escape(f'[{Path(port).name}]')} {value.getMessage()}"
+                    value.args = ()
+                    logger.handle(value)
+                elif kind == "start":
+                    total, completed = value
+                    progress.update(tasks[port], total=total, completed=completed)
+                    progress.start_task(tasks[port])
+                elif kind == "advance":
+                    progress.update(tasks[port], advance=value)
+                elif kind == "update":
+                    progress.update(tasks[port], completed=value)
+                elif kind == "done":
+                    results[port] = value
+        except KeyboardInterrupt:
+            for process in processes.values():
+                process.terminate()
+        for process in processes.values():
+            process.join()
+
+    ordered = [results.get(port, PortResult(port, False)) for port in ports]
+    print_summary(ordered)
+    return ordered
+
+
+def print_summary(results: list[PortResult]) -> None:
+    table = Table(title="Devices")
+    table.add_column("Port", justify="left", style="bold")
+    table.add_column("Status", justify="left")
+    table.add_column("MAC", justify="left")
+    table.add_column("UUID", justify="left")
+    table.add_column("Duration", justify="right")
+    table.add_column("Throughput", justify="right")
+    for result in results:
+        table.add_row(
+            result.port,
+            "[green]OK[/]" if result.success else "[red]FAILED[/]",
+            result.mac or "-",
+            result.uuid or "-",
+            f"{result.elapsed:.1f}s",
+            f"{result.rate / 1024:.1f} KiB/s",
+        )
+    Console().print(table)
+
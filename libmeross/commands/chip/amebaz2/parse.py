@@ -0,0 +1,106 @@
+import argparse
+import time
+
+from pathlib import Path
+
+from rich.console import Console
+from rich.table import Table
+
+from libmeross.ambz2.image import FlashImage, FlashImageError
+from libmeross.ambz2.layout import ImageType
+from libmeross.util import logger
+from libmeross.commands.shared import parser_get_usage, require_info_level
+
+
+def install_parser(subparsers: argparse._SubParsersAction) -> None:
+    parser = subparsers.add_parser(
+        "parse",
+        help="Parse the layout of a flash dump",
+        usage=parser_get_usage(__name__),
+        description="Chip Tool - Flash Image Parser",
+    )
+    parser.add_argument(
+        "dump",
+        type=Path,
+        help="Path to the flash dump (starting at 0x98000000)",
+    )
+    parser.add_argument(
+        "--split",
+        type=Path,
+        help="Directory to save all regions to",
+        default=None,
+    )
+    parser.set_defaults(func=cli)
+
+
+def _type_name(value) -> str:
+    return value.name if isinstance(value, ImageType) else f"{value:#x}"
+
+
+def print_image(image: FlashImage, console: Console) -> None:
+    status = "[green]valid[/]" if image.calibration_valid else "[red]invalid[/]"
+    console.print(f"Calibration pattern: {status}")
+    table = image.partition_table
+    if table is not None:
+        info = table.info
+        console.print(
+            f"Partition table: {info.num} records, fw1_idx={info.fw1_idx}, "
+            f"fw2_idx={info.fw2_idx}, eFWV={info.eFWV}, user data {info.user_len} bytes",
+            highlight=False,
+        )
+
+    regions = Table(title="Regions")
+    regions.add_column("Region", justify="left", style="bold")
+    regions.add_column("Address", justify="left")
+    regions.add_column("Size", justify="right")
+    regions.add_column("Image Headers", justify="left")
+    for region in image.regions:
+        headers = ", ".join(
+            f"{_type_name(h.type)} ({h.header.segment_size:#x} bytes"
+            f"{', encrypted' if h.header.encrypted else ''})"
+            for h in image.image_headers(region)
+        )
+        if region.record is not None and not headers:
+            headers = "[red]none[/]"
+        regions.add_row(
+            region.name,
+            f"{region.address:#010x}",
+            f"{region.length:#x}",
+            headers,
+        )
+    console.print(regions)
+
+
+def _split(image: FlashImage, directory: Path) -> None:
+    directory.mkdir(exist_ok=True, parents=True)
+    for region in image.regions:
+        path = directory / f"{region.address:08x}-{region.name.replace(' ', '_')}.bin"
+        logger.debug(f"Saving {region.name} to {path}")
+        view = image.view(region)
+        try:
+            with open(path, "wb") as fp:
+                fp.write(view)
+        finally:
+            view.release()
+
+
+def cli(argv: argparse.Namespace) -> None:
+    require_info_level(argv)
+    start = time.perf_counter()
+    try:
+        image = FlashImage(argv.dump)
+    except (OSError, ValueError, FlashImageError) as e:
+        logger.error(f"Failed to open dump: {e}")
+        return
+
+    with image:
+        console = Console()
+        print_image(image, console)
+        logger.debug(f"Parsed {len(image)} bytes in {(time.perf_counter() - start) * 1000:.1f}ms")
+        for error in image.errors:
+            logger.warning(error)
+        if argv.split:
+            try:
+                _split(image, argv.split)
+            except OSError as e:
+                logger.error(f"Failed to save regions: {e}")
@@ -0,0 +1,6 @@
+from libmeross.commands.chip.amebaz2.partab import build, reconstruct
+
+__submodule__ = True
+__doc__ = """\
+Partition table tools
+"""
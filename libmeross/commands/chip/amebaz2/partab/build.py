@@ -0,0 +1,122 @@
+import argparse
+import json
+
+from pathlib import Path
+
+from libmeross.ambz2.image import FlashImage, FlashImageError
+from libmeross.ambz2.partab import SpecError, build_blob, expand_matrix, load_spec, spec_from_table
+from libmeross.util import logger
+from libmeross.commands.shared import parser_get_usage, require_info_level
+from libmeross.commands.chip.amebaz2.verify import hexkey
+
+
+def install_parser(subparsers: argparse._SubParsersAction) -> None:
+    parser = subparsers.add_parser(
+        "build",
+        help="Build a signed partition table from a spec or an existing dump",
+        usage=parser_get_usage(__name__),
+        description="Chip Tool - Partition Table Builder",
+    )
+    parser.add_argument(
+        "--spec",
+        type=Path,
+        help="Partition table spec (JSON or TOML), may contain a list of 'variants'",
+        default=None,
+    )
+    parser.add_argument(
+        "--from-dump",
+        type=Path,
+        help="Take the partition table of a flash dump as base (the spec overrides single fields)",
+        default=None,
+    )
+    parser.add_argument(
+        "--key",
+        type=hexkey,
+        help="HMAC key (hex) to sign with instead of the key of the spec or the default key",
+        default=None,
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        help="Output file (calibration pattern + partition table for 0x98000000), "
+        "or output directory if the spec contains variants",
+        default=None,
+    )
+    parser.add_argument(
+        "--print-spec",
+        action="store_true",
+        help="Print the resulting spec as JSON instead of building",
+        default=False,
+    )
+    parser.set_defaults(func=cli)
+
+
+def _load(argv: argparse.Namespace) -> dict | None:
+    spec = {}
+    if argv.from_dump:
+        try:
+            with FlashImage(argv.from_dump) as image:
+                table = image.partition_table
+                if table is None:
+                    logger.error(f"No valid partition table in {argv.from_dump}")
+                    return None
+                spec = spec_from_table(table)
+        except (OSError, ValueError, FlashImageError) as e:
+            logger.error(f"Failed to open dump: {e}")
+            return None
+    if argv.spec:
+        try:
+            spec.update(load_spec(argv.spec))
+        except (OSError, SpecError) as e:
+            logger.error(f"Failed to load spec: {e}")
+            return None
+    return spec
+
+
+def cli(argv: argparse.Namespace) -> None:
+    require_info_level(argv)
+    if not argv.spec and not argv.from_dump:
+        logger.error("Either --spec or --from-dump is required")
+        return
+
+    spec = _load(argv)
+    if spec is None:
+        return
+    try:
+        tables = expand_matrix(spec)
+    except SpecError as e:
+        logger.error(f"Invalid spec: {e}")
+        return
+
+    if argv.print_spec:
+        if len(tables) == 1 and tables[0][0] is None:
+            print(json.dumps(tables[0][1], indent=2))
+        else:
+            print(json.dumps(dict(tables), indent=2))
+        return
+
+    if not argv.output:
+        logger.error("No output given (-o)")
+        return
+    matrix = tables[0][0] is not None
+
+    # build everything first, a broken variant should not leave half a matrix
+    blobs = []
+    for name, table_spec in tables:
+        path = argv.output / f"{name}.bin" if matrix else argv.output
+        try:
+            blobs.append((path, build_blob(table_spec, argv.key)))
+        except SpecError as e:
+            logger.error(f"Invalid spec{f' for {name}' if matrix else ''}: {e}")
+            return
+
+    if matrix:
+        argv.output.mkdir(parents=True, exist_ok=True)
+    for path, blob in blobs:
+        try:
+            path.write_bytes(blob)
+        except OSError as e:
+            logger.error(f"Failed to write {path}: {e}")
+            return
+        logger.info(f"Saved partition table to {path} ({len(blob)} bytes)")
@@ -0,0 +1,100 @@
+import argparse
+import json
+import time
+
+from pathlib import Path
+
+from rich.console import Console
+from rich.table import Table
+
+from libmeross.ambz2.image import FlashImage, FlashImageError
+from libmeross.ambz2.partab import SpecError, build_blob
+from libmeross.ambz2.reconstruct import FoundImage, reconstruct
+from libmeross.util import logger
+from libmeross.commands.shared import parser_get_usage, require_info_level
+from libmeross.commands.chip.amebaz2.verify import hexkey
+
+
+def install_parser(subparsers: argparse._SubParsersAction) -> None:
+    parser = subparsers.add_parser(
+        "reconstruct",
+        help="Rebuild a lost or corrupted partition table from the images in a dump",
+        usage=parser_get_usage(__name__),
+        description="Chip Tool - Partition Table Reconstruction",
+    )
+    parser.add_argument(
+        "dump",
+        type=Path,
+        help="Flash dump to scan for images",
+    )
+    parser.add_argument(
+        "--key",
+        type=hexkey,
+        help="HMAC key (hex) to sign with instead of the default key",
+        default=None,
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        help="Output file (calibration pattern + partition table for 0x98000000)",
+        default=None,
+    )
+    parser.add_argument(
+        "--print-spec",
+        action="store_true",
+        help="Print the inferred spec as JSON (input for 'partab build --spec')",
+        default=False,
+    )
+    parser.set_defaults(func=cli)
+
+
+def print_images(images: list[FoundImage], console: Console) -> None:
+    table = Table(title="Images")
+    table.add_column("Offset", justify="right", style="bold")
+    table.add_column("Type", justify="left")
+    table.add_column("Length", justify="right")
+    table.add_column("Sections", justify="left")
+    for image in images:
+        table.add_row(
+            f"{image.offset:#x}",
+            image.type.name,
+            f"{image.length:#x}",
+            ", ".join(header.type.name for header in image.headers),
+        )
+    console.print(table)
+
+
+def cli(argv: argparse.Namespace) -> None:
+    require_info_level(argv)
+    start = time.perf_counter()
+    try:
+        with FlashImage(argv.dump) as image:
+            result = reconstruct(image)
+    except (OSError, ValueError, FlashImageError) as e:
+        logger.error(f"Failed to reconstruct partition table: {e}")
+        return
+    logger.debug(f"Scanned {argv.dump} in {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    print_images(result.images, Console())
+    for note in result.notes:
+        logger.warning(note)
+
+    if argv.print_spec:
+        print(json.dumps(result.spec, indent=2))
+    if not argv.output:
+        if not argv.print_spec:
+            logger.info("No output given (-o), use --print-spec to show the inferred records")
+        return
+
+    try:
+        blob = build_blob(result.spec, argv.key)
+    except SpecError as e:
+        logger.error(f"Invalid spec: {e}")
+        return
+    try:
+        argv.output.write_bytes(blob)
+    except OSError as e:
+        logger.error(f"Failed to write {argv.output}: {e}")
+        return
+    logger.info(f"Saved partition table to {argv.output} ({len(blob)} bytes)")
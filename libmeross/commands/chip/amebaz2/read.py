@@ -1,13 +1,53 @@
 import argparse
+import functools
+import io
+import json
 import sys
+import time
+
+from pathlib import Path
+
+import serial
 
 from rich.console import Console
 from rich.progress import Progress
+from rich.table import Table
 
+from libmeross.commands.chip.amebaz2.dump import (
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_RETRIES,
+    Checkpoint,
+    ChunkError,
+    ChunkedReader,
+    MappedOutput,
+    read_memory,
+)
+from libmeross.commands.chip.amebaz2.download import (
+    DEFAULT_BAUDRATES,
+    FLASH_BASE,
+    FLASH_SECTOR_SIZE,
+    FLASH_WINDOW,
+    DownloadModeError,
+    FlashHash,
+    VerifiedReader,
+    change_baudrate,
+    changed_sectors,
+    enter_download_mode,
+    escalate_baudrate,
+    sector_ranges,
+)
+from libmeross.commands.chip.amebaz2.multi import (
+    PortResult,
+    Reporter,
+    device_ids,
+    resolve_ports,
+    run_ports,
+)
+from libmeross.commands.chip.amebaz2.transport import SerialTransport
 from libmeross.commands.chip.amebaz2.util import (
-    command,
     init_fallback_connection,
     open_serial,
+    parser_add_ports,
     parser_add_serial,
 )
 from libmeross.util import logger
@@ -22,6 +62,7 @@ def install_parser(subparsers: argparse._SubParsersAction) -> None:
         description="Chip Tool - Memory Read",
     )
     parser_add_serial(parser)
+    parser_add_ports(parser)
     parser.add_argument(
         "address",
         type=hexint,
@@ -41,56 +82,326 @@ def install_parser(subparsers: argparse._SubParsersAction) -> None:
     parser.add_argument(
         "-o",
         "--output",
-        type=argparse.FileType("wb"),
-        help="The output file to save the response to",
-        default=sys.stdout.buffer,
+        type=Path,
+        help="The output file to save the response to (default: stdout)",
+        default=None,
+    )
+    chunk_group = parser.add_argument_group("Chunk-Options")
+    chunk_group.add_argument(
+        "--chunk-size",
+        type=hexint,
+        help="The initial number of bytes per read command "
+        f"(default: {DEFAULT_CHUNK_SIZE:#x}, {BINARY_CHUNK_SIZE:#x} with --binary)",
+        default=None,
+    )
+    chunk_group.add_argument(
+        "--retries",
+        type=int,
+        help=f"Attempts per chunk before giving up (default: {DEFAULT_RETRIES})",
+        default=DEFAULT_RETRIES,
+    )
+    chunk_group.add_argument(
+        "--restart",
+        action="store_true",
+        help="Ignore an existing checkpoint and start the dump from the beginning",
+    )
+    speed_group = parser.add_argument_group("Speed-Options")
+    speed_group.add_argument(
+        "--auto-baudrate",
+        action="store_true",
+        help="Switch to download mode and the highest reliable baud rate",
+    )
+    speed_group.add_argument(
+        "--binary",
+        action="store_true",
+        help="Read in download mode with word dumps and on-chip SHA-256 checks "
+        "of every flash chunk (implies --auto-baudrate)",
+    )
+    speed_group.add_argument(
+        "--incremental",
+        type=Path,
+        metavar="BASE",
+        help="Only transfer flash sectors whose on-chip hash differs from the "
+        "base image and write the patched image (implies --binary)",
+        default=None,
+    )
+    speed_group.add_argument(
+        "--report",
+        type=Path,
+        help="Write the changed sectors of an incremental read as JSON",
+        default=None,
+    )
+    speed_group.add_argument(
+        "--baudrates",
+        type=lambda s: tuple(int(x) for x in s.split(",")),
+        help="Baud rates to try with --auto-baudrate "
+        f"(default: {','.join(map(str, DEFAULT_BAUDRATES))})",
+        default=DEFAULT_BAUDRATES,
     )
     parser.set_defaults(func=cli)
 
 
-def cli(argv: argparse.Namespace) -> None:
-    console = Console()
-    if argv.verbose and argv.output is sys.stdout.buffer:
-        logger.error("Verbose mode cannot be used with stdout output. ")
-        return
+# larger chunks amortize the hash checks
+BINARY_CHUNK_SIZE = 0x8000
 
-    ser = open_serial(argv)
-    if not ser:
-        return
 
-    if not argv.assume_download and not init_fallback_connection(ser, console):
-        return
+def _open_output(argv) -> tuple:
+    # returns (output, checkpoint, checkpoint path)
+    if argv.output is None or str(argv.output) == "-":
+        return sys.stdout.buffer, None, None
+
+    path = Checkpoint.path_for(argv.output)
+    checkpoint = None if argv.restart else Checkpoint.load(path)
+    if (
+        checkpoint is not None
+        and checkpoint.address == argv.address
+        and checkpoint.length == argv.length
+        and argv.output.exists()
+        and argv.output.stat().st_size == checkpoint.length
+    ):
+        logger.info(
+            f"Resuming dump at {argv.address + checkpoint.done:#x} "
+            f"({len(checkpoint.holes)} holes)"
+        )
+        return MappedOutput(argv.output, argv.length), checkpoint, path
+
+    checkpoint = Checkpoint(argv.address, argv.length, chunk_size=argv.chunk_size)
+    argv.output.unlink(missing_ok=True)
+    return MappedOutput(argv.output, argv.length), checkpoint, path
+
 
-    progress = Progress() if argv.verbose else None
-    if progress:
+def _read(
+    argv, ser: serial.Serial, download: bool, reporter: Reporter | None
+) -> tuple[bool, int]:
+    # returns (success, bytes read)
+    try:
+        output, checkpoint, checkpoint_path = _open_output(argv)
+    except (OSError, ValueError) as e:
+        logger.error(f"Failed to open output file: {e}")
+        return False, 0
+
+    completed = 0
+    if checkpoint:
+        completed = checkpoint.done - sum(size for _, size in checkpoint.holes)
+    progress, on_progress = None, None
+    if reporter:
+        reporter.start(argv.length, completed)
+        on_progress = reporter.advance
+    elif argv.verbose:
+        progress = Progress()
         progress.start()
-        task = progress.add_task("Reading...", total=argv.length)
+        task = progress.add_task("Reading...", total=argv.length, completed=completed)
+        on_progress = lambda n: progress.update(task, advance=n)  # noqa: E731
 
-    text = f"DB {argv.address:#x} {argv.length}"
-    end = min(argv.length, 16) + 4
-    logger.debug(f"Working command: {text!r}")
+    reader = ChunkedReader(
+        ser,
+        chunk_size=argv.chunk_size,
+        retries=argv.retries,
+        reader=(
+            VerifiedReader(ser)
+            if argv.binary
+            else functools.partial(read_memory, prompt=not download)
+        ),
+        prompt=not download,
+    )
+    try:
+        success = reader.read(
+            argv.address,
+            argv.length,
+            output,
+            checkpoint=checkpoint,
+            checkpoint_path=checkpoint_path,
+            on_progress=on_progress,
+        )
+    except KeyboardInterrupt:
+        success = False
+    finally:
+        if progress:
+            progress.stop()
+        if output is sys.stdout.buffer:
+            output.flush()
+        else:
+            output.close()
 
-    def write_line(line: str) -> None:
-        line = line.strip()
-        if line.startswith("[Addr]"):  # header
-            return
+    if checkpoint_path:  # logs would end up in a dump on stdout
+        _log_stats(reader, ser)
+    if not success:
+        if checkpoint_path:
+            logger.error("Dump incomplete - run the same command again to resume")
+        return False, reader.stats.bytes
 
+    if checkpoint_path:
+        checkpoint_path.unlink(missing_ok=True)
+    return True, reader.stats.bytes
+
+
+def _read_incremental(
+    argv, ser: serial.Serial, reporter: Reporter | None
+) -> tuple[bool, int]:
+    try:
+        base = argv.incremental.read_bytes()
+    except OSError as e:
+        logger.error(f"Failed to read base image: {e}")
+        return False, 0
+    if len(base) != argv.length:
+        logger.error(
+            f"Base image has {len(base):#x} bytes, but {argv.length:#x} were requested"
+        )
+        return False, 0
+    if (
+        not FLASH_BASE <= argv.address < FLASH_BASE + FLASH_WINDOW
+        or argv.address % FLASH_SECTOR_SIZE
+    ):
+        logger.error("Incremental reads need a sector-aligned flash address")
+        return False, 0
+
+    flash_hash = FlashHash(ser)
+    offset = argv.address - FLASH_BASE
+    start = time.monotonic()
+    try:
+        changed = changed_sectors(flash_hash, offset, base)
+    except (DownloadModeError, ChunkError) as e:
+        logger.error(f"Failed to compare sector hashes: {e}")
+        return False, 0
+    logger.info(
+        f"{len(changed)} of {-(-len(base) // FLASH_SECTOR_SIZE)} sectors changed "
+        f"(compared in {time.monotonic() - start:.1f}s)"
+    )
+
+    image = bytearray(base)
+    if reporter:
+        reporter.start(len(changed) * FLASH_SECTOR_SIZE)
+    reader = ChunkedReader(
+        ser,
+        chunk_size=argv.chunk_size,
+        retries=argv.retries,
+        reader=VerifiedReader(ser, flash_hash=flash_hash),
+        prompt=False,
+    )
+    report = []
+    for first, count in sector_ranges(changed):
+        pos = first * FLASH_SECTOR_SIZE
+        length = min(count * FLASH_SECTOR_SIZE, len(base) - pos)
+        buffer = io.BytesIO()
+        on_progress = reporter.advance if reporter else None
+        if not reader.read(argv.address + pos, length, buffer, on_progress=on_progress):
+            logger.error("Incremental dump incomplete - no output written")
+            return False, reader.stats.bytes
+        data = buffer.getvalue()
+        image[pos : pos + length] = data
+        for sector in range(first, first + count):
+            lo = sector * FLASH_SECTOR_SIZE - pos
+            old = base[pos + lo : pos + lo + FLASH_SECTOR_SIZE]
+            new = data[lo : lo + FLASH_SECTOR_SIZE]
+            report.append(
+                {
+                    "sector": sector,
+                    "address": argv.address + pos + lo,
+                    "changed_bytes": sum(a != b for a, b in zip(old, new)),
+                }
+            )
+
+    _log_stats(reader, ser)
+    try:
+        with open(argv.output, "wb") as fp:
+            fp.write(image)
+        if argv.report:
+            with open(argv.report, "w") as fp:
+                json.dump(report, fp, indent=2)
+    except OSError as e:
+        logger.error(f"Failed to write output: {e}")
+        return False, reader.stats.bytes
+
+    if report and not reporter:
+        table = Table(title="Changed Sectors")
+        table.add_column("Sector", justify="right")
+        table.add_column("Address", justify="left", style="bold")
+        table.add_column("Changed Bytes", justify="right")
+        for entry in report:
+            table.add_row(
+                str(entry["sector"]), f"{entry['address']:#010x}", str(entry["changed_bytes"])
+            )
+        Console(stderr=True).print(table)
+    return True, reader.stats.bytes
+
+
+def _log_stats(reader: ChunkedReader, ser: serial.Serial) -> None:
+    stats = reader.stats
+    logger.info(
+        f"Read {stats.bytes} bytes in {stats.elapsed:.1f}s ({stats.rate:.0f} B/s "
+        f"at {ser.baudrate} baud, {stats.failures} failed attempts)"
+    )
+    if isinstance(ser, SerialTransport):
+        logger.info(ser.stats.report())
+
+
+def _transfer(
+    argv, ser: serial.Serial, result: PortResult, reporter: Reporter | None
+) -> None:
+    download = argv.assume_download
+    if not download and not init_fallback_connection(ser, Console()):
+        return
+
+    if argv.chunk_size is None:
+        binary = argv.binary or argv.incremental
+        argv.chunk_size = BINARY_CHUNK_SIZE if binary else DEFAULT_CHUNK_SIZE
+
+    baudrate = ser.baudrate
+    if argv.auto_baudrate or argv.binary or argv.incremental:
         try:
-            values = line[10:-end].strip().replace(" ", "")
-            argv.output.write(bytes.fromhex(values))
-            argv.output.flush()
-            if progress:
-                progress.update(task, advance=len(values) // 2)
-        except Exception as e:
-            logger.error(f"Failed to write line: {e}")
-            logger.error(f"Line: {line}")
+            if not download:
+                enter_download_mode(ser)
+                download = True
+            escalate_baudrate(ser, argv.baudrates)
+        except (DownloadModeError, ChunkError) as e:
+            logger.error(f"Failed to switch baud rate: {e}")
             return
 
-    if command(ser, text, inline=write_line) is None:
-        logger.error("Connection closed due to on-chip error")
+    try:
+        if argv.incremental:
+            result.success, result.bytes = _read_incremental(argv, ser, reporter)
+        else:
+            result.success, result.bytes = _read(argv, ser, download, reporter)
+    finally:
+        if ser.baudrate != baudrate:
+            try:
+                change_baudrate(ser, baudrate)
+            except DownloadModeError:
+                logger.warning(f"Failed to restore {baudrate} baud - reset the chip")
+
+
+def _run(argv, reporter: Reporter | None = None) -> PortResult:
+    result = PortResult(argv.port, False)
+    start = time.monotonic()
+    ser = open_serial(argv, threaded=True)
+    if not ser:
+        return result
+
+    # closed on every path, several ports may be read in one process
+    try:
+        _transfer(argv, ser, result, reporter)
+    finally:
+        ser.close()
+
+    result.elapsed = time.monotonic() - start
+    if result.success and argv.output is not None:
+        result.mac, result.uuid = device_ids(argv.output.read_bytes())
+    return result
 
-    if progress:
-        progress.stop()
 
-    argv.output.close()
-    ser.close()
+def cli(argv: argparse.Namespace) -> None:
+    if argv.verbose and argv.output is None:
+        logger.error("Verbose mode cannot be used with stdout output. ")
+        return
+    if (argv.incremental or argv.ports) and argv.output is None:
+        logger.error("Incremental and multi-port reads need an output file (-o)")
+        return
+
+    if argv.ports:
+        ports = resolve_ports(argv.ports)
+        if not ports:
+            logger.error("No serial ports found")
+            return
+        run_ports(argv, _run, ports, outputs=("output", "report"))
+        return
+    _run(argv)
@@ -0,0 +1,211 @@
+# Command scripts for the fallback console.
+#
+# A script is a text file with one console command per line (`#` starts a
+# comment). Memory commands (DB, DW, EB, EW) are pipelined: the next commands
+# are sent while the chip is still answering, as long as the unanswered
+# command bytes fit into the UART receive FIFO of the chip (*window*). Every
+# other command (WDTRST, CPU, ...) is sent on its own, once all previous
+# commands have been answered.
+#
+# Responses are split at the console prompt: the fallback console echoes
+# every command and ends its output with `$8710c>`, which is directly followed
+# by the echo of the next pipelined command. After an `S-Domain Fault` the
+# chip hangs, so the commands behind it never run.
+import re
+import time
+
+from dataclasses import asdict, dataclass, field
+
+import serial
+
+from libmeross.commands.chip.amebaz2.util import (
+    CMD_BUS_FAULT,
+    CMD_NEWLINE,
+    CMD_PROMPT,
+)
+from libmeross.util import logger
+
+# size of the receive FIFO of the RTL8710C UART
+DEFAULT_WINDOW = 64
+DEFAULT_COMMAND_TIMEOUT = 2.0
+
+ON_ERROR_STOP = "stop"
+ON_ERROR_CONTINUE = "continue"
+
+STATUS_OK = "ok"
+STATUS_ERROR = "error"
+STATUS_INVALID = "invalid"
+STATUS_FAULT = "fault"
+STATUS_TIMEOUT = "timeout"
+STATUS_SKIPPED = "skipped"
+
+PIPELINED = ("DB", "DW", "EB", "EW")
+CMD_NOT_FOUND = b"Command NOT found."
+
+_HEX = re.compile(r"(0x)?[0-9A-Fa-f]+")
+_DEC = re.compile(r"[0-9]+")
+_DB_LINE = re.compile(r"\s*([0-9A-Fa-f]{8}):((?: [0-9a-fA-F]{2}){1,16})")
+_DW_LINE = re.compile(r"\s*([0-9A-Fa-f]{8}):\s+((?:[0-9A-Fa-f]{8} ?){1,4})")
+
+
+@dataclass
+class ScriptResult:
+    line: int
+    command: str
+    status: str = STATUS_SKIPPED
+    output: list[str] = field(default_factory=list)
+    # hex string of the memory read by DB/DW
+    data: str | None = None
+    elapsed: float = 0.0
+
+    def as_dict(self) -> dict:
+        result = asdict(self)
+        if self.data is None:
+            del result["data"]
+        return result
+
+
+def load_script(text: str) -> list[ScriptResult]:
+    """Parse a script into results (status 'skipped' until it has run)."""
+    results = []
+    for lineno, line in enumerate(text.splitlines(), 1):
+        line = line.partition("#")[0].strip()
+        if line:
+            results.append(ScriptResult(lineno, " ".join(line.split())))
+    return results
+
+
+def validate(command: str) -> str | None:
+    # reason why a memory command would be rejected by the console
+    name, *args = command.split()
+    if name not in PIPELINED:
+        return None
+    if not args or not _HEX.fullmatch(args[0]):
+        return "expected a hex address"
+    if name in ("DB", "DW"):
+        if len(args) != 2 or not _DEC.fullmatch(args[1]):
+            return "expected a decimal count"
+    elif len(args) < 2 or not all(_HEX.fullmatch(value) for value in args[1:]):
+        return "expected hex values"
+    return None
+
+
+def _decode(command: str, output: list[str]) -> str | None:
+    name = command.split()[0]
+    if name == "DB":
+        lines = (_DB_LINE.match(line) for line in output)
+        return "".join(m.group(2).replace(" ", "") for m in lines if m)
+    if name == "DW":
+        data = bytearray()
+        for m in filter(None, (_DW_LINE.match(line) for line in output)):
+            for word in m.group(2).split():
+                data += int(word, 16).to_bytes(4, "little")
+        return data.hex()
+    return None
+
+
+class ScriptRunner:
+    """Run a list of commands on a fallback console (already initialised)."""
+
+    def __init__(
+        self,
+        ser: serial.Serial,
+        window: int = DEFAULT_WINDOW,
+        on_error: str = ON_ERROR_STOP,
+        timeout: float = DEFAULT_COMMAND_TIMEOUT,
+    ) -> None:
+        self.ser = ser
+        self.window = window
+        self.on_error = on_error
+        self.timeout = timeout
+
+    def run(self, results: list[ScriptResult]) -> bool:
+        """Run all commands, filling in *results*. True if all succeeded."""
+        invalid = False
+        for result in results:
+            if reason := validate(result.command):
+                result.status = STATUS_INVALID
+                result.output = [reason]
+                logger.error(f"Line {result.line}: {result.command!r}: {reason}")
+                invalid = True
+        if invalid and self.on_error == ON_ERROR_STOP:
+            # nothing has been sent yet
+            return False
+
+        pending = [r for r in results if r.status != STATUS_INVALID]
+        sent: list[ScriptResult] = []  # unanswered, in order
+        in_flight = 0
+        stop = False
+        pos = 0
+        while pos < len(pending) or sent:
+            # keep the window filled
+            while pos < len(pending) and not stop:
+                result = pending[pos]
+                size = len(result.command) + len(CMD_NEWLINE)
+                if sent and (
+                    not self._pipelined(result)
+                    or not self._pipelined(sent[-1])
+                    or in_flight + size > self.window
+                ):
+                    break
+                self.ser.write(result.command.encode() + CMD_NEWLINE)
+                result.elapsed = time.monotonic()
+                sent.append(result)
+                in_flight += size
+                pos += 1
+            if not sent:
+                break
+
+            result = sent.pop(0)
+            in_flight -= len(result.command) + len(CMD_NEWLINE)
+            self._receive(result)
+            result.elapsed = time.monotonic() - result.elapsed
+            logger.debug(f"{result.command}: {result.status} ({result.elapsed:.3f}s)")
+
+            if result.status in (STATUS_FAULT, STATUS_TIMEOUT):
+                # the chip hangs, the remaining commands never ran
+                logger.error(f"Line {result.line}: {result.command!r} failed - reset the chip")
+                for other in sent:
+                    other.elapsed = 0.0
+                sent.clear()
+                break
+            if result.status != STATUS_OK:
+                logger.error(f"Line {result.line}: {result.command!r} failed")
+                if self.on_error == ON_ERROR_STOP:
+                    # commands that are already in flight still run
+                    stop = True
+
+        return all(r.status == STATUS_OK for r in results)
+
+    @staticmethod
+    def _pipelined(result: ScriptResult) -> bool:
+        return result.command.split()[0] in PIPELINED
+
+    def _receive(self, result: ScriptResult) -> None:
+        # the echo, the output and the prompt of one command
+        data = b""
+        deadline = time.monotonic() + self.timeout
+        while not data.endswith(CMD_PROMPT):
+            chunk = self.ser.read_until(CMD_PROMPT)
+            if chunk:
+                data += chunk
+                deadline = time.monotonic() + self.timeout
+            elif time.monotonic() > deadline:
+                result.status = STATUS_FAULT if CMD_BUS_FAULT in data else STATUS_TIMEOUT
+                break
+
+        lines = data.removesuffix(CMD_PROMPT).split(CMD_NEWLINE)
+        # skip the echo
+        output = [line.decode(errors="replace").rstrip() for line in lines[1:]]
+        while output and not output[0]:
+            output.pop(0)
+        while output and not output[-1]:
+            output.pop()
+        result.output = output
+        if result.status != STATUS_SKIPPED:
+            return
+        if any(line.startswith(CMD_NOT_FOUND.decode()) for line in output):
+            result.status = STATUS_ERROR
+        else:
+            result.status = STATUS_OK
+            result.data = _decode(result.command, output)
@@ -0,0 +1,186 @@
+import argparse
+import select
+import socket
+
+from pathlib import Path
+
+import serial
+
+from libmeross.commands.chip.amebaz2.download import (
+    DownloadModeError,
+    change_baudrate,
+    ping,
+)
+from libmeross.commands.chip.amebaz2.session import (
+    DEFAULT_SESSION,
+    SESSIONS_SUPPORTED,
+    SESSIONS_UNSUPPORTED,
+    FRAME_BAUDRATE,
+    FRAME_CLEAR,
+    FRAME_READ,
+    FRAME_STATE,
+    FRAME_WRITE,
+    STATE_DOWNLOAD,
+    STATE_FALLBACK,
+    STATE_LOST,
+    pack_frame,
+    remove_stale_socket,
+    unpack_frames,
+)
+from libmeross.commands.chip.amebaz2.util import (
+    CMD_NEWLINE,
+    CMD_PROMPT,
+    CMD_START_FALLBACK_MODE,
+    open_serial,
+)
+from libmeross.util import logger
+from libmeross.commands.shared import parser_get_usage
+
+# seconds between two attempts to get a lost chip back
+RETRY_INTERVAL = 2.0
+
+
+def install_parser(subparsers: argparse._SubParsersAction) -> None:
+    parser = subparsers.add_parser(
+        "serve",
+        help="Keep a serial session open for other commands (--session, POSIX only)",
+        usage=parser_get_usage(__name__),
+        description="Chip Tool - Session Daemon",
+    )
+    parser.add_argument(
+        "--port",
+        type=str,
+        help="The serial port to use",
+        default=None,
+    )
+    parser.add_argument(
+        "--baudrate",
+        type=int,
+        help="The baudrate to use (default: 115200)",
+        default=115200,
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        help="The timeout to use (default: 0.2)",
+        default=0.2,
+    )
+    parser.add_argument(
+        "--socket",
+        type=Path,
+        help=f"The Unix socket to listen on (default: {DEFAULT_SESSION})",
+        default=DEFAULT_SESSION,
+    )
+    parser.add_argument(
+        "--assume-download",
+        action="store_true",
+        help="Assume the device is in download mode",
+    )
+    parser.set_defaults(func=cli)
+
+
+def _probe(ser: serial.Serial) -> str:
+    # state of the chip, without changing it if possible
+    ser.reset_input_buffer()
+    ser.write(CMD_NEWLINE)
+    if CMD_PROMPT in ser.read_until(CMD_PROMPT):
+        return STATE_FALLBACK
+    if ping(ser):
+        return STATE_DOWNLOAD
+    # rebooted (or just powered on): enter the fallback mode again
+    ser.reset_input_buffer()
+    ser.write(CMD_START_FALLBACK_MODE + CMD_NEWLINE)
+    if CMD_PROMPT in ser.read_until(CMD_PROMPT):
+        return STATE_FALLBACK
+    return STATE_LOST
+
+
+def _resync(ser: serial.Serial, baudrate: int) -> str:
+    if ser.baudrate != baudrate:
+        # the client did not switch back
+        try:
+            change_baudrate(ser, baudrate)
+        except DownloadModeError:
+            ser.baudrate = baudrate
+    state = _probe(ser)
+    logger.debug(f"Chip state: {state}")
+    return state
+
+
+def _serve_client(conn: socket.socket, ser: serial.Serial, state: str) -> None:
+    conn.sendall(pack_frame(FRAME_STATE, f"{state} {ser.baudrate}".encode()))
+    received = bytearray()
+    fd = ser.fileno()
+    while True:
+        readable, _, _ = select.select([conn, fd], [], [])
+        if fd in readable:
+            data = ser.read(ser.in_waiting or 1)
+            if data:
+                conn.sendall(pack_frame(FRAME_READ, data))
+        if conn in readable:
+            data = conn.recv(65536)
+            if not data:
+                return
+            received += data
+            for kind, payload in unpack_frames(received):
+                if kind == FRAME_WRITE:
+                    ser.write(payload)
+                elif kind == FRAME_BAUDRATE:
+                    ser.flush()
+                    ser.baudrate = int(payload)
+                elif kind == FRAME_CLEAR:
+                    ser.reset_input_buffer()
+                    conn.sendall(pack_frame(FRAME_CLEAR))
+
+
+def cli(argv: argparse.Namespace) -> None:
+    if not SESSIONS_SUPPORTED:
+        logger.error(SESSIONS_UNSUPPORTED)
+        return
+    if not remove_stale_socket(argv.socket):
+        logger.error(f"Another session is already listening on {argv.socket}")
+        return
+
+    ser = open_serial(argv)
+    if ser is None:
+        return
+    baudrate = ser.baudrate
+    state = STATE_DOWNLOAD if argv.assume_download else _resync(ser, baudrate)
+    if state == STATE_LOST:
+        logger.error("The chip does not respond")
+        ser.close()
+        return
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(argv.socket))
+    server.listen()
+    logger.info(f"Session on {argv.port} ({state} mode) at {argv.socket} (Ctrl+C to stop)")
+    try:
+        while True:
+            readable, _, _ = select.select([server], [], [], RETRY_INTERVAL)
+            if not readable:
+                if state == STATE_LOST and (state := _resync(ser, baudrate)) != STATE_LOST:
+                    logger.info(f"Chip is back in {state} mode")
+                continue
+
+            conn, _ = server.accept()
+            if state == STATE_LOST:
+                state = _resync(ser, baudrate)
+            with conn:
+                logger.debug("Client connected")
+                try:
+                    _serve_client(conn, ser, state)
+                except OSError as e:
+                    logger.warning(f"Client connection failed: {e}")
+            if state == STATE_LOST:
+                continue
+            # the client may have left a fault, download mode or another baud rate
+            state = _resync(ser, baudrate)
+            if state == STATE_LOST:
+                logger.warning("Lost the chip - waiting for a reset")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        argv.socket.unlink(missing_ok=True)
+        ser.close()
@@ -0,0 +1,217 @@
+# Serial sessions shared over a Unix socket (`chip amebaz2 serve`).
+#
+# The daemon owns the serial port and keeps the chip in fallback (or
+# download) mode. A client connection is an exclusive lease on the port:
+# the daemon accepts one client at a time, tells it the current state of the
+# chip and then forwards bytes in both directions until the client closes the
+# connection. Further clients wait in the listen backlog.
+#
+# Both directions use small frames: one type byte, a 4 byte length and the
+# payload.
+#
+#   daemon -> client  S  state and baud rate ("fallback 115200"), first frame
+#                     R  bytes received from the chip
+#                     C  the input buffer has been cleared
+#   client -> daemon  W  bytes to send to the chip
+#                     B  switch the port to another baud rate
+#                     C  clear the input buffer
+#
+# Unix sockets are not available everywhere (e.g. Windows), sessions are
+# therefore POSIX-only (see SESSIONS_SUPPORTED).
+import collections
+import os
+import select
+import socket
+import struct
+import tempfile
+import threading
+import time
+
+from pathlib import Path
+
+import serial
+
+from libmeross.util import logger
+
+SESSIONS_SUPPORTED = hasattr(socket, "AF_UNIX")
+SESSIONS_UNSUPPORTED = "Sessions need Unix sockets, which are not available on this platform"
+
+DEFAULT_SESSION = Path(tempfile.gettempdir()) / "mrs-amebaz2.sock"
+# how long a client waits for another client to release the port
+LEASE_TIMEOUT = 60.0
+
+STATE_FALLBACK = "fallback"
+STATE_DOWNLOAD = "download"
+STATE_LOST = "lost"
+
+FRAME_STATE = b"S"
+FRAME_READ = b"R"
+FRAME_WRITE = b"W"
+FRAME_BAUDRATE = b"B"
+FRAME_CLEAR = b"C"
+
+_HEADER = struct.Struct(">cI")
+
+
+class SessionError(serial.SerialException):
+    pass
+
+
+def pack_frame(kind: bytes, payload: bytes = b"") -> bytes:
+    return _HEADER.pack(kind, len(payload)) + payload
+
+
+def unpack_frames(buffer: bytearray) -> list[tuple[bytes, bytes]]:
+    """Remove all complete frames from *buffer*."""
+    frames, pos = [], 0
+    while len(buffer) - pos >= _HEADER.size:
+        kind, length = _HEADER.unpack_from(buffer, pos)
+        end = pos + _HEADER.size + length
+        if len(buffer) < end:
+            break
+        frames.append((kind, bytes(buffer[pos + _HEADER.size : end])))
+        pos = end
+    del buffer[:pos]
+    return frames
+
+
+class SessionPort:
+    """Client side of a session, the subset of serial.Serial used by
+    SerialTransport."""
+
+    def __init__(self, path: str | Path, timeout: float | None = None) -> None:
+        if not SESSIONS_SUPPORTED:
+            raise SessionError(SESSIONS_UNSUPPORTED)
+        self.path = str(path)
+        self.timeout = timeout
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.sock.connect(self.path)
+        except OSError as e:
+            self.sock.close()
+            raise SessionError(f"Failed to connect to {self.path}: {e}")
+
+        self._received = bytearray()
+        self._frames: collections.deque[tuple[bytes, bytes]] = collections.deque()
+        self._buffer = bytearray()
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        # data that arrives before the answer to a clear request is stale
+        self._clearing = 0
+        self._open = True
+
+        # the daemon answers once the previous client is gone
+        ready, _, _ = select.select([self.sock], [], [], 0.5)
+        if not ready:
+            logger.info(f"Waiting for the session at {self.path} ...")
+        frame = self._next_frame(LEASE_TIMEOUT)
+        if frame is None or frame[0] != FRAME_STATE:
+            self.sock.close()
+            raise SessionError(f"No answer from the session at {self.path}")
+        state, _, baudrate = frame[1].decode().partition(" ")
+        self.state = state
+        self._baudrate = int(baudrate or 0)
+        if state == STATE_LOST:
+            self.sock.close()
+            raise SessionError("The session lost the chip - reset it and try again")
+
+    # --- pyserial compatible API ---
+    @property
+    def port(self) -> str:
+        return self.path
+
+    @property
+    def is_open(self) -> bool:
+        return self._open
+
+    @property
+    def baudrate(self) -> int:
+        return self._baudrate
+
+    @baudrate.setter
+    def baudrate(self, value: int) -> None:
+        self._send(FRAME_BAUDRATE, str(value).encode())
+        self._baudrate = value
+
+    @property
+    def in_waiting(self) -> int:
+        with self._lock:
+            return len(self._buffer)
+
+    def write(self, data: bytes) -> int:
+        self._send(FRAME_WRITE, bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        # the daemon drains the port before it changes the baud rate
+        pass
+
+    def reset_input_buffer(self) -> None:
+        with self._lock:
+            self._buffer.clear()
+            self._clearing += 1
+        self._send(FRAME_CLEAR)
+
+    def read(self, size: int = 1) -> bytes:
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while True:
+            with self._lock:
+                if self._buffer:
+                    data = bytes(self._buffer[:size])
+                    del self._buffer[:size]
+                    return data
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return b""
+            frame = self._next_frame(remaining)
+            if frame is None:
+                continue
+            kind, payload = frame
+            with self._lock:
+                if kind == FRAME_CLEAR:
+                    self._clearing -= 1
+                elif kind == FRAME_READ and not self._clearing:
+                    self._buffer += payload
+
+    def close(self) -> None:
+        self._open = False
+        self.sock.close()
+
+    # --- framing ---
+    def _send(self, kind: bytes, payload: bytes = b"") -> None:
+        with self._send_lock:
+            try:
+                self.sock.sendall(pack_frame(kind, payload))
+            except OSError as e:
+                raise SessionError(f"Session closed: {e}")
+
+    def _next_frame(self, timeout: float | None) -> tuple[bytes, bytes] | None:
+        # one frame, or None if none arrived within *timeout*
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._frames:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            ready, _, _ = select.select([self.sock], [], [], remaining)
+            if not ready:
+                return None
+            data = self.sock.recv(65536)
+            if not data:
+                self._open = False
+                raise SessionError("Session closed by the daemon")
+            self._received += data
+            self._frames.extend(unpack_frames(self._received))
+        return self._frames.popleft()
+
+
+def remove_stale_socket(path: Path) -> bool:
+    """Remove a socket file nobody listens on. False if a daemon is running."""
+    if not path.exists():
+        return True
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(str(path))
+        return False
+    except OSError:
+        os.unlink(path)
+        return True
+    finally:
+        probe.close()
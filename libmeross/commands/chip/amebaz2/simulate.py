@@ -0,0 +1,114 @@
+import argparse
+import time
+
+from pathlib import Path
+
+from libmeross.util import logger
+from libmeross.commands.shared import hexint, parser_get_usage
+
+
+def fault_range(value: str) -> tuple[int, int]:
+    # START:END (hex)
+    try:
+        start, end = value.split(":")
+        return hexint(start), hexint(end)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid range: {value!r} (expected START:END)")
+
+
+def install_parser(subparsers: argparse._SubParsersAction) -> None:
+    parser = subparsers.add_parser(
+        "simulate",
+        help="Simulate a chip console on a pseudo-terminal (for testing, POSIX only)",
+        usage=parser_get_usage(__name__),
+        description="Chip Tool - Console Simulator",
+    )
+    parser.add_argument(
+        "--image",
+        type=Path,
+        help="Flash image backing the simulated flash (default: erased flash)",
+        default=None,
+    )
+    parser.add_argument(
+        "--flash-size",
+        type=hexint,
+        help="Size of the erased flash without --image (default: 0x200000)",
+        default=0x200000,
+    )
+    parser.add_argument(
+        "--save",
+        action="store_true",
+        help="Write the flash contents back to --image on exit",
+    )
+    link_group = parser.add_argument_group("Link-Options")
+    link_group.add_argument(
+        "--baudrate",
+        type=int,
+        help="The initial baud rate (default: 115200)",
+        default=115200,
+    )
+    link_group.add_argument(
+        "--max-baudrate",
+        type=int,
+        help="Baud rates above this value lose the link (default: 1500000)",
+        default=1500000,
+    )
+    link_group.add_argument(
+        "--no-throttle",
+        action="store_true",
+        help="Send as fast as possible instead of at the baud rate",
+    )
+    link_group.add_argument(
+        "--corrupt-rate",
+        type=float,
+        help="Probability that a dump line is corrupted (default: 0)",
+        default=0.0,
+    )
+    link_group.add_argument(
+        "--fault",
+        type=fault_range,
+        action="append",
+        metavar="START:END",
+        help="Address range that raises an S-Domain Fault (can be repeated)",
+        default=[],
+    )
+    parser.set_defaults(func=cli)
+
+
+def cli(argv: argparse.Namespace) -> None:
+    # pseudo-terminals need termios, which is not available on Windows
+    try:
+        from libmeross.commands.chip.amebaz2.simulator import ChipSimulator
+    except ImportError as e:
+        logger.error(f"The chip simulator is not supported on this platform: {e}")
+        return
+
+    flash = None
+    if argv.image:
+        try:
+            flash = argv.image.read_bytes()
+        except OSError as e:
+            logger.error(f"Failed to read flash image: {e}")
+            return
+
+    simulator = ChipSimulator(
+        flash,
+        flash_size=argv.flash_size,
+        baudrate=argv.baudrate,
+        throttle=not argv.no_throttle,
+        max_baudrate=argv.max_baudrate,
+        faults=argv.fault,
+        corrupt_rate=argv.corrupt_rate,
+    )
+    with simulator:
+        logger.info(f"Simulated chip listening on {simulator.port} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+    logger.info(f"Sent {simulator.bytes_sent} bytes")
+    if argv.save and argv.image:
+        argv.image.write_bytes(simulator.flash)
+        logger.info(f"Saved flash contents to {argv.image}")
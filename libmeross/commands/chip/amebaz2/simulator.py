@@ -0,0 +1,432 @@
+# RTL8710C console simulator on a pseudo-terminal.
+#
+# The simulator speaks the ROM console protocol closely enough to run the chip
+# tools without hardware:
+#
+#   - boot: everything is ignored until `Rtk8710C` is received
+#   - fallback mode: commands are echoed and answered with a `$8710c>` prompt
+#     (DB, DW, EB, EW, WDTRST, ?)
+#   - download mode: no echo and no prompt (ping, ucfg, DB, DW, EB, EW, fwd
+#     with XMODEM-1K, hashq, disc)
+#   - fault: after an `S-Domain Fault` the chip hangs until `reset()`
+#
+# Download mode is entered the same way as on the real chip: the handler of
+# a ROM console command (table pointer at 0x1002F054) is pointed to the
+# download mode entry and that command is executed.
+#
+# Memory: ROM (0x0), SRAM (0x10000000), peripheral registers (0x40000000)
+# and the flash image (0x98000000). Every other address, as well as the
+# configured fault ranges, answers with an `S-Domain Fault`.
+#
+# Output is paced to the current baud rate (10 bits per byte) unless
+# throttling is disabled, and baud rates above *max_baudrate* lose the link
+# after `ucfg`, as a real UART adapter would.
+import hashlib
+import os
+import random
+import select
+import threading
+import time
+import tty
+
+from libmeross.commands.chip.amebaz2.util import (
+    CMD_BUS_FAULT,
+    CMD_PROMPT,
+    CMD_START_FALLBACK_MODE,
+)
+
+ROM_BASE, ROM_SIZE = 0x00000000, 0x60000
+SRAM_BASE, SRAM_SIZE = 0x10000000, 0x40000
+REG_BASE, REG_SIZE = 0x40000000, 0x10000000
+FLASH_BASE = 0x98000000
+FLASH_SECTOR_SIZE = 0x1000
+
+REG_CHIP_VERSION = 0x400001F0
+REG_FLASH_MODE = 0x40000038
+ROM_COMMAND_TABLE = 0x1002F050
+COMMAND_TABLE = 0x1002F100
+COMMAND_NAMES = 0x1002F400
+# names in the ROM console command table
+COMMANDS = ("?", "DB", "DW", "EB", "EW", "WDTRST", "CPU", "fwd")
+
+BANNER = b"\r\n== Rtl8710c IoT Platform ==\r\nChip VID: 5, Ver: 1\r\nROM Version: v2.1\r\n"
+DB_HEADER = b"\r\n [Addr]   .0 .1 .2 .3 .4 .5 .6 .7 .8 .9 .A .B .C .D .E .F\r\n"
+
+XMODEM_STX = 0x02
+XMODEM_EOT = 0x04
+XMODEM_ACK = b"\x06"
+XMODEM_NAK = b"\x15"
+XMODEM_CAN = 0x18
+XMODEM_PACKET_SIZE = 1 + 2 + 1024 + 1
+# the ROM repeats its NAK about once per second while waiting
+XMODEM_NAK_INTERVAL = 1.0
+
+
+class _Fault(Exception):
+    pass
+
+
+class ChipSimulator:
+    """Simulated RTL8710C serial console on a pty.
+
+    Use as a context manager or call `start`/`stop`; `port` is the device
+    path to open with pyserial.
+    """
+
+    def __init__(
+        self,
+        flash: bytes | bytearray | None = None,
+        flash_size: int = 0x200000,
+        baudrate: int = 115200,
+        throttle: bool = True,
+        max_baudrate: int = 1500000,
+        faults: list[tuple[int, int]] | None = None,
+        corrupt_rate: float = 0.0,
+        chip_version: int = 1,
+        flash_mode: int = 0,
+        seed: int | None = None,
+    ) -> None:
+        self.flash = bytearray(flash if flash is not None else b"\xff" * flash_size)
+        self.rom = bytearray(ROM_SIZE)
+        self.sram = bytearray(SRAM_SIZE)
+        self.registers: dict[int, int] = {
+            REG_CHIP_VERSION: chip_version << 4,
+            REG_FLASH_MODE: flash_mode << 5,
+        }
+        self.baudrate = baudrate
+        self.throttle = throttle
+        self.max_baudrate = max_baudrate
+        self.faults = list(faults or [])
+        self.corrupt_rate = corrupt_rate
+        self.random = random.Random(seed)
+
+        self.state = "boot"
+        self.entry = (0x0 if chip_version > 2 else 0x1443C) | 1
+        self.hash_offset = 0
+        self.bytes_sent = 0
+        self._build_command_table()
+
+        self._xmodem: dict | None = None
+        self._buffer = b""
+        self._next_send = 0.0
+        self._master = self._slave = -1
+        self._thread: threading.Thread | None = None
+        self._running = False
+        self.port: str | None = None
+
+    # --- lifecycle ---
+    def start(self) -> str:
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        return self.port
+
+    def stop(self) -> None:
+        self._running = False
+        if self._thread:
+            self._thread.join()
+        for fd in (self._master, self._slave):
+            if fd >= 0:
+                os.close(fd)
+        self._master = self._slave = -1
+
+    def reset(self) -> None:
+        # like a power cycle: back to the boot state, memory is kept
+        self._xmodem = None
+        self._buffer = b""
+        self.state = "boot"
+        self._send(BANNER)
+
+    def __enter__(self) -> "ChipSimulator":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    # --- memory ---
+    def _build_command_table(self) -> None:
+        self._write_word(ROM_COMMAND_TABLE + 4, COMMAND_TABLE)
+        name_ptr = COMMAND_NAMES
+        for idx, name in enumerate(COMMANDS):
+            entry = COMMAND_TABLE + idx * 12
+            self._write_word(entry, name_ptr)
+            self._write_word(entry + 4, (0x1000 + idx * 0x10) | 1)
+            self._write_word(entry + 8, 0)
+            self.write(name_ptr, name.encode() + b"\x00")
+            name_ptr += 16
+
+    def _region(self, address: int) -> tuple[bytearray | None, int]:
+        # (backing buffer, offset) - None for registers
+        for start, end in self.faults:
+            if start <= address < end:
+                raise _Fault(address)
+        if ROM_BASE <= address < ROM_BASE + ROM_SIZE:
+            return self.rom, address - ROM_BASE
+        if SRAM_BASE <= address < SRAM_BASE + SRAM_SIZE:
+            return self.sram, address - SRAM_BASE
+        if REG_BASE <= address < REG_BASE + REG_SIZE:
+            return None, address
+        if FLASH_BASE <= address < FLASH_BASE + len(self.flash):
+            return self.flash, address - FLASH_BASE
+        raise _Fault(address)
+
+    def read(self, address: int, length: int) -> bytes:
+        buffer, offset = self._region(address)
+        if (
+            buffer is not None
+            and offset + length <= len(buffer)
+            and not any(s < address + length and address < e for s, e in self.faults)
+        ):
+            return bytes(buffer[offset : offset + length])
+
+        data = bytearray()
+        for addr in range(address, address + length):
+            buffer, offset = self._region(addr)
+            if buffer is None:
+                word = self.registers.get(offset & ~3, 0)
+                data.append((word >> (8 * (offset & 3))) & 0xFF)
+            else:
+                data.append(buffer[offset])
+        return bytes(data)
+
+    def write(self, address: int, data: bytes) -> None:
+        for idx, value in enumerate(data):
+            buffer, offset = self._region(address + idx)
+            if buffer is None:
+                shift = 8 * (offset & 3)
+                word = self.registers.get(offset & ~3, 0) & ~(0xFF << shift)
+                self.registers[offset & ~3] = word | (value << shift)
+            elif buffer is self.flash:
+                # NOR flash: writes can only clear bits
+                buffer[offset] &= value
+            else:
+                buffer[offset] = value
+
+    def _write_word(self, address: int, value: int) -> None:
+        self.write(address, value.to_bytes(4, "little"))
+
+    def _read_word(self, address: int) -> int:
+        return int.from_bytes(self.read(address, 4), "little")
+
+    # --- output ---
+    def _send(self, data: bytes) -> None:
+        self.bytes_sent += len(data)
+        if not self.throttle:
+            self._write(data)
+            return
+        # pace the output to the UART rate
+        rate = self.baudrate / 10
+        for pos in range(0, len(data), 256):
+            piece = data[pos : pos + 256]
+            now = time.monotonic()
+            self._next_send = max(self._next_send, now) + len(piece) / rate
+            self._write(piece)
+            delay = self._next_send - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+    def _write(self, data: bytes) -> None:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(self._master, view) :]
+
+    def _corrupt(self, line: bytes) -> bytes:
+        if self.corrupt_rate and self.random.random() < self.corrupt_rate:
+            pos = self.random.randrange(10, len(line) - 2)
+            line = line[:pos] + b"g" + line[pos + 1 :]
+        return line
+
+    # --- main loop ---
+    def _loop(self) -> None:
+        while self._running:
+            readable, _, _ = select.select([self._master], [], [], 0.05)
+            if readable:
+                try:
+                    self._buffer += os.read(self._master, 65536)
+                except OSError:
+                    break
+            if self._xmodem is not None:
+                self._receive_xmodem()
+            else:
+                self._process_lines()
+
+    def _process_lines(self) -> None:
+        while self._xmodem is None and b"\n" in self._buffer:
+            line, self._buffer = self._buffer.split(b"\n", 1)
+            line = line.strip()
+            if self.state == "boot":
+                if line == CMD_START_FALLBACK_MODE:
+                    self.state = "fallback"
+                    self._send(BANNER + b"\r\n" + CMD_PROMPT)
+            elif self.state == "fallback":
+                self._send(line + b"\r\n")
+                self._fallback_command(line.decode(errors="replace").split())
+                if self.state == "fallback":
+                    self._send(b"\r\n" + CMD_PROMPT)
+            elif self.state == "download":
+                self._download_command(line.decode(errors="replace").split())
+            # "deaf": wrong baud rate, only a working ucfg brings it back
+            elif self.state == "deaf" and line.startswith(b"ucfg"):
+                self._download_command(line.decode(errors="replace").split())
+
+    def _fallback_command(self, args: list[str]) -> None:
+        if not args:
+            return
+        name = args[0]
+        handler = self._handler(name)
+        if handler == self.entry:
+            self.state = "download"
+            return
+        try:
+            if name in ("DB", "DW", "EB", "EW"):
+                self._memory_command(name, args[1:])
+            elif name == "WDTRST":
+                self._send(BANNER)
+            elif name in ("?", "help"):
+                self._send(b"\r\n".join(c.encode() for c in COMMANDS) + b"\r\n")
+            else:
+                self._send(b"Command NOT found.\r\n")
+        except (ValueError, IndexError):
+            self._send(b"Invalid arguments\r\n")
+
+    def _handler(self, name: str) -> int | None:
+        for idx in range(len(COMMANDS)):
+            entry = COMMAND_TABLE + idx * 12
+            name_ptr = self._read_word(entry)
+            raw = self.read(name_ptr, 16).partition(b"\x00")[0]
+            if raw.decode(errors="replace") == name:
+                return self._read_word(entry + 4)
+        return None
+
+    def _download_command(self, args: list[str]) -> None:
+        if not args:
+            return
+        name = args[0]
+        try:
+            if name == "ucfg":
+                baudrate = int(args[1])
+                self.baudrate = baudrate
+                if baudrate > self.max_baudrate:
+                    self.state = "deaf"
+                    return
+                self.state = "download"
+                # the answer is sent at the new rate
+                self._send(b"OK")
+            elif self.state != "download":
+                return
+            elif name == "ping":
+                self._send(b"ping")
+            elif name in ("DB", "DW", "EB", "EW"):
+                self._memory_command(name, args[1:])
+            elif name == "hashq":
+                length = int(args[1])
+                data = self.flash[self.hash_offset : self.hash_offset + length]
+                self._send(b"hashs " + hashlib.sha256(data).digest())
+            elif name == "fwd":
+                offset = int(args[-1], 16)
+                self.hash_offset = offset
+                self._xmodem = {"offset": offset, "block": 1, "erased": set(), "nak": 0.0}
+            elif name in ("disc", "WDTRST"):
+                self.state = "boot"
+                self._send(BANNER)
+        except (ValueError, IndexError):
+            pass
+
+    def _memory_command(self, name: str, args: list[str]) -> None:
+        address = int(args[0], 16)
+        try:
+            if name == "DB":
+                self._dump_bytes(address, int(args[1]))
+            elif name == "DW":
+                self._dump_words(address, int(args[1]))
+            else:
+                size = 1 if name == "EB" else 4
+                for idx, value in enumerate(args[1:]):
+                    addr = address + idx * size
+                    self.write(addr, int(value, 16).to_bytes(size, "little"))
+                    self._send(f"0x{addr:08X} = 0x{int(value, 16):0{size * 2}X}\r\n".encode())
+        except _Fault as e:
+            message = f" Handler: bus error at 0x{e.args[0]:08X}\r\n"
+            self._send(b"\r\n" + CMD_BUS_FAULT + message.encode())
+            self.state = "fault"
+
+    def _dump_bytes(self, address: int, length: int) -> None:
+        if self.state == "fallback":
+            self._send(DB_HEADER)
+        for offset in range(0, length, 16):
+            data = self.read(address + offset, min(16, length - offset))
+            text = bytes(c if 0x20 <= c < 0x7F else 0x2E for c in data)
+            line = b"%08X: %s     %s\r\n" % (
+                address + offset,
+                b" ".join(b"%02x" % c for c in data),
+                text,
+            )
+            self._send(self._corrupt(line))
+
+    def _dump_words(self, address: int, count: int) -> None:
+        for offset in range(0, count * 4, 16):
+            words = min(4, count - offset // 4)
+            data = self.read(address + offset, words * 4)
+            values = b" ".join(
+                b"%08X" % int.from_bytes(data[i : i + 4], "little")
+                for i in range(0, len(data), 4)
+            )
+            self._send(self._corrupt(b"%08X:    %s\r\n" % (address + offset, values)))
+
+    # --- XMODEM receiver (fwd) ---
+    def _receive_xmodem(self) -> None:
+        state = self._xmodem
+        buffer = self._buffer
+        if not buffer:
+            now = time.monotonic()
+            if state["block"] == 1 and now >= state["nak"]:
+                state["nak"] = now + XMODEM_NAK_INTERVAL
+                self._send(XMODEM_NAK)
+            return
+
+        if buffer[0] == XMODEM_CAN:
+            if len(buffer) < 2:
+                return
+            self._buffer = buffer[2:]
+            self._xmodem = None
+            self._send(bytes([XMODEM_CAN]) + b"ER")
+        elif buffer[0] == XMODEM_EOT:
+            self._buffer = buffer[1:]
+            self._xmodem = None
+            self._send(XMODEM_ACK)
+        elif buffer[0] == XMODEM_STX:
+            if len(buffer) < XMODEM_PACKET_SIZE:
+                return
+            packet, self._buffer = (
+                buffer[:XMODEM_PACKET_SIZE],
+                buffer[XMODEM_PACKET_SIZE:],
+            )
+            seq, block = packet[1], packet[3:-1]
+            if seq != 0xFF - packet[2] or sum(block) & 0xFF != packet[-1]:
+                self._send(XMODEM_NAK)
+                return
+            if seq == (state["block"] - 1) & 0xFF:  # repeated block
+                self._send(XMODEM_ACK)
+                return
+            if seq != state["block"] & 0xFF:
+                self._send(XMODEM_NAK)
+                return
+
+            offset = state["offset"] + (state["block"] - 1) * len(block)
+            first = offset // FLASH_SECTOR_SIZE
+            last = -(-(offset + len(block)) // FLASH_SECTOR_SIZE)
+            for sector in range(first, last):
+                if sector not in state["erased"]:
+                    state["erased"].add(sector)
+                    start = sector * FLASH_SECTOR_SIZE
+                    self.flash[start : start + FLASH_SECTOR_SIZE] = b"\xff" * FLASH_SECTOR_SIZE
+            self.flash[offset : offset + len(block)] = block
+            state["block"] += 1
+            self._send(XMODEM_ACK)
+        else:
+            # line noise
+            self._buffer = buffer[1:]
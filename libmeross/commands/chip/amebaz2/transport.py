@@ -0,0 +1,268 @@
+# Threaded serial transport.
+#
+# A dedicated thread drains the serial port into a ring buffer as fast as
+# data arrives, so the OS/UART buffers never fill up while the consumer is
+# busy decoding or writing. The consumer side offers the subset of the
+# pyserial API used by the chip tools (read, readline, read_until, ...) and
+# `read_lines`, which hands out all buffered lines at once for batch decoding.
+#
+# If the consumer falls behind by more than the ring capacity, new data is
+# dropped and counted as an overflow event. Dumps detect the gap through their
+# line addresses and read the affected chunk again.
+import threading
+import time
+
+from dataclasses import dataclass, field
+
+import serial
+
+from libmeross.util import logger
+
+DEFAULT_CAPACITY = 1 << 22  # 4 MiB
+# poll interval of the reader thread, bounds the delay of close()
+READ_INTERVAL = 0.05
+
+
+class RingBuffer:
+    """Fixed-size byte FIFO. Not thread-safe on its own."""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY) -> None:
+        self.buffer = bytearray(capacity)
+        self.capacity = capacity
+        self.start = 0
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def clear(self) -> None:
+        self.start = self.size = 0
+
+    def put(self, data: bytes) -> int:
+        """Append as much of *data* as fits; returns the number of dropped bytes."""
+        count = min(len(data), self.capacity - self.size)
+        pos = (self.start + self.size) % self.capacity
+        first = min(count, self.capacity - pos)
+        self.buffer[pos : pos + first] = data[:first]
+        self.buffer[: count - first] = data[first:count]
+        self.size += count
+        return len(data) - count
+
+    def get(self, count: int) -> bytes:
+        count = min(count, self.size)
+        end = self.start + count
+        if end <= self.capacity:
+            data = bytes(self.buffer[self.start : end])
+        else:
+            data = bytes(self.buffer[self.start :]) + bytes(
+                self.buffer[: end - self.capacity]
+            )
+        self.start = end % self.capacity
+        self.size -= count
+        return data
+
+    def find(self, sub: bytes, start: int = 0) -> int:
+        """Index of *sub* relative to the read position or -1."""
+        end = self.start + self.size
+        if end <= self.capacity:
+            pos = self.buffer.find(sub, self.start + start, end)
+            return pos - self.start if pos >= 0 else -1
+
+        # the data wraps around: [start:capacity] + [0:end - capacity]
+        first = self.capacity - self.start
+        if start < first:
+            pos = self.buffer.find(sub, self.start + start)
+            if pos >= 0:
+                return pos - self.start
+            if len(sub) > 1:
+                # a match across the end of the buffer
+                lo = max(self.start + start, self.capacity - len(sub) + 1)
+                window = self.buffer[lo:] + self.buffer[: len(sub) - 1]
+                pos = window.find(sub)
+                if pos >= 0 and lo + pos + len(sub) <= end:
+                    return lo + pos - self.start
+            start = first
+        pos = self.buffer.find(sub, start - first, end - self.capacity)
+        return pos + first if pos >= 0 else -1
+
+
+@dataclass
+class TransportStats:
+    bytes: int = 0
+    overflows: int = 0
+    dropped: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def rate(self) -> float:
+        elapsed = time.monotonic() - self.started
+        return self.bytes / elapsed if elapsed > 0 else 0.0
+
+    def report(self) -> str:
+        return (
+            f"Serial: {self.bytes} bytes received ({self.rate:.0f} B/s), "
+            f"{self.overflows} overflows ({self.dropped} bytes dropped)"
+        )
+
+
+class SerialTransport:
+    """Drop-in replacement for serial.Serial with a background reader."""
+
+    def __init__(self, ser: serial.Serial, capacity: int = DEFAULT_CAPACITY) -> None:
+        self.ser = ser
+        self.timeout = ser.timeout
+        self.stats = TransportStats()
+        self.ring = RingBuffer(capacity)
+        self.cond = threading.Condition()
+        self.error: Exception | None = None
+        self._running = True
+        # resets are done by the reader thread between two reads, so nothing
+        # it took from the port before the reset ends up in the ring
+        self._resets_requested = 0
+        self._resets_done = 0
+
+        ser.timeout = READ_INTERVAL
+        self.thread = threading.Thread(target=self._read_loop, daemon=True)
+        self.thread.start()
+
+    # --- pyserial compatible API ---
+    @property
+    def baudrate(self) -> int:
+        return self.ser.baudrate
+
+    @baudrate.setter
+    def baudrate(self, value: int) -> None:
+        self.ser.baudrate = value
+
+    @property
+    def port(self) -> str | None:
+        return self.ser.port
+
+    @property
+    def is_open(self) -> bool:
+        return self.ser.is_open
+
+    @property
+    def in_waiting(self) -> int:
+        with self.cond:
+            return len(self.ring)
+
+    def write(self, data: bytes) -> int | None:
+        return self.ser.write(data)
+
+    def flush(self) -> None:
+        self.ser.flush()
+
+    def reset_input_buffer(self) -> None:
+        with self.cond:
+            self._resets_requested += 1
+            requested = self._resets_requested
+            # wake the reader thread if it waits for data (pyserial only)
+            cancel_read = getattr(self.ser, "cancel_read", None)
+            if cancel_read is not None:
+                cancel_read()
+            self.cond.wait_for(lambda: self._resets_done >= requested or not self._running)
+            if self._resets_done < requested:
+                # the reader thread is gone
+                self.ser.reset_input_buffer()
+                self.ring.clear()
+                self._resets_done = requested
+
+    def read(self, size: int = 1) -> bytes:
+        with self.cond:
+            self._wait(lambda: len(self.ring) >= size)
+            return self.ring.get(size)
+
+    def read_until(self, expected: bytes = b"\n", size: int | None = None) -> bytes:
+        with self.cond:
+            pos = self._wait_for(expected, size)
+            if pos >= 0:
+                return self.ring.get(pos + len(expected))
+            return self.ring.get(size if size is not None else len(self.ring))
+
+    def readline(self) -> bytes:
+        return self.read_until(b"\n")
+
+    def read_lines(self, limit: int | None = None) -> list[bytes]:
+        """Wait for one line, then return up to *limit* buffered lines.
+
+        On a timeout the partial line (or nothing) is returned.
+        """
+        with self.cond:
+            pos = self._wait_for(b"\n")
+            if pos < 0:
+                return [self.ring.get(len(self.ring))] if len(self.ring) else []
+            lines = [self.ring.get(pos + 1)]
+            while limit is None or len(lines) < limit:
+                pos = self.ring.find(b"\n")
+                if pos < 0:
+                    break
+                lines.append(self.ring.get(pos + 1))
+            return lines
+
+    def close(self) -> None:
+        self._running = False
+        self.thread.join()
+        self.ser.close()
+        logger.debug(self.stats.report())
+
+    # --- internals ---
+    def _wait(self, predicate) -> bool:
+        # called with the condition held
+        if self.timeout is None:
+            self.cond.wait_for(lambda: predicate() or not self._running)
+            return predicate()
+        return self.cond.wait_for(predicate, self.timeout)
+
+    def _wait_for(self, expected: bytes, size: int | None = None) -> int:
+        # position of *expected* in the ring, or -1 after a timeout
+        pos, scanned = -1, 0
+
+        def found() -> bool:
+            nonlocal pos, scanned
+            pos = self.ring.find(expected, scanned)
+            if pos < 0:
+                # continue behind what has been searched already
+                scanned = max(0, len(self.ring) - len(expected) + 1)
+            return pos >= 0 or (size is not None and len(self.ring) >= size)
+
+        self._wait(found)
+        if size is not None and pos + len(expected) > size:
+            return -1
+        return pos
+
+    def _read_loop(self) -> None:
+        ser = self.ser
+        while self._running:
+            try:
+                data = ser.read(max(1, ser.in_waiting))
+            except (serial.SerialException, OSError) as e:
+                self.error = e
+                logger.debug(f"Serial reader stopped: {e}")
+                break
+            with self.cond:
+                if self._resets_done < self._resets_requested:
+                    # *data* was read before the reset
+                    self._reset(ser)
+                    continue
+                if not data:
+                    continue
+                dropped = self.ring.put(data)
+                self.stats.bytes += len(data)
+                if dropped:
+                    self.stats.overflows += 1
+                    self.stats.dropped += dropped
+                self.cond.notify_all()
+        with self.cond:
+            self._running = False
+            self.cond.notify_all()
+
+    def _reset(self, ser: serial.Serial) -> None:
+        # called by the reader thread with the condition held
+        try:
+            ser.reset_input_buffer()
+        except (serial.SerialException, OSError) as e:
+            logger.debug(f"Failed to reset the input buffer: {e}")
+        self.ring.clear()
+        self._resets_done = self._resets_requested
+        self.cond.notify_all()
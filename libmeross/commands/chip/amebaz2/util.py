@@ -1,11 +1,20 @@
 import argparse
 
+from pathlib import Path
+
 import serial
 
 from serial.tools.list_ports import comports
 from typing import Callable
 from rich.console import Console
 
+from libmeross.commands.chip.amebaz2.session import (
+    DEFAULT_SESSION,
+    STATE_FALLBACK,
+    SessionError,
+    SessionPort,
+)
+from libmeross.commands.chip.amebaz2.transport import SerialTransport
 from libmeross.util import logger
 
 CMD_START_FALLBACK_MODE = b"Rtk8710C"
@@ -16,6 +25,16 @@ CMD_BUS_FAULT = b"S-Domain Fault"
 
 
 def init_fallback_connection(ser: serial.Serial, console: Console):
+    # a session daemon keeps the chip at the prompt
+    session = getattr(ser, "ser", ser)
+    if isinstance(session, SessionPort):
+        if session.state == STATE_FALLBACK:
+            return True
+        logger.error(
+            f"The session is in {session.state} mode - use --assume-download if supported"
+        )
+        return False
+
     # try to enter fallback mode
     ser.write(CMD_START_FALLBACK_MODE + CMD_NEWLINE)
     try:
@@ -87,9 +106,44 @@ def parser_add_serial(parser: argparse.ArgumentParser) -> None:
         help="The timeout to use (default: 1.0)",
         default=0.2,
     )
+    parser.add_argument(
+        "--session",
+        type=Path,
+        nargs="?",
+        const=DEFAULT_SESSION,
+        help="Use the serial session of `chip amebaz2 serve` instead of opening "
+        f"the port (default socket: {DEFAULT_SESSION}, POSIX only)",
+        default=None,
+    )
+
+
+def parser_add_ports(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--ports",
+        type=str,
+        help="Run on several serial ports in parallel: 'all' or a comma separated "
+        "list (output files get the port name appended)",
+        default=None,
+    )
 
 
-def open_serial(argv) -> serial.Serial | None:
+def open_serial(argv, threaded: bool = False) -> serial.Serial | None:
+    """Open the serial port of *argv*.
+
+    With *threaded*, the port is wrapped in a SerialTransport that reads in
+    the background (recommended for long transfers). With a session, the
+    port is always threaded.
+    """
+    if getattr(argv, "session", None):
+        logger.debug(f"Connecting to the session at {argv.session}")
+        try:
+            session = SessionPort(argv.session, timeout=argv.timeout)
+        except SessionError as e:
+            logger.error(str(e))
+            return None
+        argv.port = session.port
+        return SerialTransport(session)
+
     if argv.port is None:
         logger.warn("No serial port specified - searching available ports")
         try:
@@ -103,17 +157,17 @@ def open_serial(argv) -> serial.Serial | None:
             return
 
         for device in devices:
-            logger.info(f" | {device.device_path}")
+            logger.info(f" | {device.device}")
 
         logger.info("Using default serial port")
-        argv.port = devices[0].device_path
+        argv.port = devices[0].device
 
     logger.debug(f"Opening serial port {argv.port} at {argv.baudrate} baud")
     try:
         ser = serial.Serial(argv.port, argv.baudrate, timeout=argv.timeout)
         if ser.is_open:
             logger.debug("Serial port opened")
-            return ser
+            return SerialTransport(ser) if threaded else ser
     except serial.SerialException:
         pass
     logger.error(f"Failed to open serial port at {argv.port}")
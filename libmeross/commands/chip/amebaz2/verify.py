@@ -0,0 +1,98 @@
+import argparse
+import json
+
+from dataclasses import asdict
+from pathlib import Path
+
+from rich.console import Console
+from rich.table import Table
+
+from libmeross.ambz2.image import FlashImage, FlashImageError
+from libmeross.ambz2.verify import Check, verify
+from libmeross.util import logger
+from libmeross.commands.shared import parser_get_usage, require_info_level
+
+
+def hexkey(value: str) -> bytes:
+    try:
+        key = bytes.fromhex(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid hex key: {value!r}")
+    if len(key) != 32:
+        raise argparse.ArgumentTypeError("Keys must be 32 bytes long")
+    return key
+
+
+def install_parser(subparsers: argparse._SubParsersAction) -> None:
+    parser = subparsers.add_parser(
+        "verify",
+        help="Verify the partition table and image hashes of a flash dump",
+        usage=parser_get_usage(__name__),
+        description="Chip Tool - Flash Image Verification",
+    )
+    parser.add_argument(
+        "dump",
+        type=Path,
+        help="Path to the flash dump (starting at 0x98000000)",
+    )
+    parser.add_argument(
+        "--key",
+        type=hexkey,
+        action="append",
+        help="Additional HMAC key (hex) to try besides the default key (can be repeated)",
+        default=[],
+    )
+    parser.add_argument(
+        "--report",
+        type=Path,
+        help="Save the results as JSON",
+        default=None,
+    )
+    parser.set_defaults(func=cli)
+
+
+def print_checks(checks: list[Check], console: Console) -> None:
+    table = Table(title="Verification")
+    table.add_column("Region", justify="left", style="bold")
+    table.add_column("Check", justify="left")
+    table.add_column("Range", justify="left")
+    table.add_column("Result", justify="left")
+    styles = {"passed": "green", "failed": "red", "skipped": "yellow"}
+    for check in checks:
+        result = f"[{styles[check.status]}]{check.status}[/]"
+        if check.method:
+            result += f" ({check.method})"
+        table.add_row(
+            check.region,
+            check.name,
+            f"{check.offset:#x}+{check.length:#x}",
+            result,
+        )
+    console.print(table)
+
+
+def cli(argv: argparse.Namespace) -> None:
+    require_info_level(argv)
+    try:
+        image = FlashImage(argv.dump)
+    except (OSError, ValueError, FlashImageError) as e:
+        logger.error(f"Failed to open dump: {e}")
+        return
+
+    with image:
+        checks = verify(image, argv.key)
+    print_checks(checks, Console())
+
+    if argv.report:
+        report = [asdict(check) | {"status": check.status} for check in checks]
+        try:
+            argv.report.write_text(json.dumps(report, indent=2))
+        except OSError as e:
+            logger.error(f"Failed to write report: {e}")
+
+    failed = sum(check.passed is False for check in checks)
+    if failed:
+        logger.error(f"{failed} of {len(checks)} checks failed")
+    else:
+        skipped = sum(check.passed is None for check in checks)
+        logger.info(f"{len(checks) - skipped} checks passed ({skipped} skipped)")
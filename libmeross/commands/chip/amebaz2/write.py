@@ -0,0 +1,313 @@
+import argparse
+import io
+import time
+
+from pathlib import Path
+
+import serial
+
+from rich.console import Console
+from rich.progress import Progress
+from rich.table import Table
+
+from libmeross.commands.chip.amebaz2.dump import ChunkError, ChunkedReader
+from libmeross.commands.chip.amebaz2.download import (
+    DEFAULT_BAUDRATES,
+    FLASH_BASE,
+    FLASH_SECTOR_SIZE,
+    FLASH_WINDOW,
+    DownloadModeError,
+    FlashHash,
+    VerifiedReader,
+    batch_ranges,
+    change_baudrate,
+    changed_sectors,
+    enter_download_mode,
+    escalate_baudrate,
+    flash_write,
+)
+from libmeross.commands.chip.amebaz2.multi import (
+    PortResult,
+    Reporter,
+    device_ids,
+    resolve_ports,
+    run_ports,
+)
+from libmeross.commands.chip.amebaz2.util import (
+    init_fallback_connection,
+    open_serial,
+    parser_add_ports,
+    parser_add_serial,
+)
+from libmeross.util import logger
+from libmeross.commands.shared import confirm, hexint, parser_get_usage
+
+# unchanged sectors between two changed ones that are rewritten instead
+# of starting a new transfer
+DEFAULT_GAP = 4
+DEFAULT_WRITE_RETRIES = 2
+
+
+def install_parser(subparsers: argparse._SubParsersAction) -> None:
+    parser = subparsers.add_parser(
+        "write",
+        help="Write an image to flash (only changed sectors)",
+        usage=parser_get_usage(__name__),
+        description="Chip Tool - Flash Write",
+    )
+    parser_add_serial(parser)
+    parser_add_ports(parser)
+    parser.add_argument(
+        "image",
+        type=Path,
+        help="The image file to write",
+    )
+    parser.add_argument(
+        "--address",
+        type=hexint,
+        help=f"The flash address to write to (default: {FLASH_BASE:#x})",
+        default=FLASH_BASE,
+    )
+    parser.add_argument(
+        "--assume-download",
+        action="store_true",
+        help="Assume the device is in download mode",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only show the sectors that would be written",
+    )
+    parser.add_argument(
+        "-y",
+        "--yes",
+        action="store_true",
+        help="Don't ask for confirmation before writing",
+    )
+    write_group = parser.add_argument_group("Write-Options")
+    write_group.add_argument(
+        "--gap",
+        type=int,
+        help="Unchanged sectors between two changed ones that are written in "
+        f"the same transfer (default: {DEFAULT_GAP})",
+        default=DEFAULT_GAP,
+    )
+    write_group.add_argument(
+        "--retries",
+        type=int,
+        help="Attempts per transfer whose hash does not match "
+        f"(default: {DEFAULT_WRITE_RETRIES})",
+        default=DEFAULT_WRITE_RETRIES,
+    )
+    write_group.add_argument(
+        "--auto-baudrate",
+        action="store_true",
+        help="Switch to the highest reliable baud rate before writing",
+    )
+    write_group.add_argument(
+        "--baudrates",
+        type=lambda s: tuple(int(x) for x in s.split(",")),
+        help="Baud rates to try with --auto-baudrate "
+        f"(default: {','.join(map(str, DEFAULT_BAUDRATES))})",
+        default=DEFAULT_BAUDRATES,
+    )
+    parser.set_defaults(func=cli)
+
+
+def _align_image(
+    ser: serial.Serial, flash_hash: FlashHash, offset: int, image: bytes
+) -> tuple[int, bytes]:
+    # fwd always erases whole sectors: complete partial head and tail
+    # sectors with the current flash contents
+    start = offset - offset % FLASH_SECTOR_SIZE
+    end = -(-(offset + len(image)) // FLASH_SECTOR_SIZE) * FLASH_SECTOR_SIZE
+    reader = ChunkedReader(
+        ser, reader=VerifiedReader(ser, flash_hash=flash_hash), prompt=False
+    )
+
+    def read(pos: int, length: int) -> bytes:
+        buffer = io.BytesIO()
+        if length and not reader.read(FLASH_BASE + pos, length, buffer):
+            raise ChunkError(f"Failed to read flash at {FLASH_BASE + pos:#x}")
+        return buffer.getvalue()
+
+    tail = offset + len(image)
+    return start, read(start, offset - start) + image + read(tail, end - tail)
+
+
+def _write(
+    argv, ser: serial.Serial, image: bytes, console: Console, reporter: Reporter | None
+) -> tuple[bool, int]:
+    # returns (success, bytes written)
+
+    flash_hash = FlashHash(ser)
+    try:
+        start, data = _align_image(ser, flash_hash, argv.address - FLASH_BASE, image)
+        begin = time.monotonic()
+        changed = changed_sectors(flash_hash, start, data)
+    except (DownloadModeError, ChunkError) as e:
+        logger.error(f"Failed to compare sector hashes: {e}")
+        return False, 0
+    logger.info(
+        f"{len(changed)} of {len(data) // FLASH_SECTOR_SIZE} sectors differ "
+        f"(compared in {time.monotonic() - begin:.1f}s)"
+    )
+    if not changed:
+        return True, 0
+
+    ranges = batch_ranges(changed, argv.gap)
+    table = Table(title="Flash Write")
+    table.add_column("Address", justify="left", style="bold")
+    table.add_column("Sectors", justify="right")
+    table.add_column("Changed", justify="right")
+    for first, count in ranges:
+        table.add_row(
+            f"{FLASH_BASE + start + first * FLASH_SECTOR_SIZE:#010x}",
+            str(count),
+            str(sum(first <= s < first + count for s in changed)),
+        )
+    console.print(table)
+    if argv.dry_run:
+        return True, 0
+    if not argv.yes and not confirm(console, "Write to flash?"):
+        return False, 0
+
+    total = sum(count for _, count in ranges) * FLASH_SECTOR_SIZE
+    begin, written = time.monotonic(), 0
+    # worker processes report to the progress display of the parent
+    with Progress(console=console, disable=reporter is not None) as progress:
+        task = progress.add_task("Writing...", total=total)
+        if reporter:
+            reporter.start(total)
+
+        def advance(n: int) -> None:
+            progress.update(task, advance=n)
+            if reporter:
+                reporter.advance(n)
+
+        for first, count in ranges:
+            pos = first * FLASH_SECTOR_SIZE
+            chunk = data[pos : pos + count * FLASH_SECTOR_SIZE]
+            address = FLASH_BASE + start + pos
+            for _ in range(argv.retries + 1):
+                try:
+                    if flash_write(
+                        flash_hash,
+                        start + pos,
+                        chunk,
+                        on_progress=advance,
+                    ):
+                        written += len(chunk)
+                        break
+                    logger.warning(f"Hash mismatch after writing {address:#x}")
+                except (DownloadModeError, ChunkError) as e:
+                    logger.warning(f"Failed to write {address:#x}: {e}")
+                progress.update(task, completed=written)
+                if reporter:
+                    reporter.update(written)
+            else:
+                logger.error(f"Giving up at {address:#x} - flash contents are incomplete")
+                return False, written
+
+    # every written sector has been checked; make sure nothing else changed
+    try:
+        remaining = changed_sectors(flash_hash, start, data)
+    except (DownloadModeError, ChunkError) as e:
+        logger.error(f"Failed to verify sector hashes: {e}")
+        return False, written
+    if remaining:
+        logger.error(f"{len(remaining)} sectors still differ after writing")
+        return False, written
+    logger.info(
+        f"Wrote {total} bytes in {time.monotonic() - begin:.1f}s "
+        f"at {ser.baudrate} baud, all sectors verified"
+    )
+    return True, written
+
+
+def _read_image(argv) -> bytes | None:
+    try:
+        image = argv.image.read_bytes()
+    except OSError as e:
+        logger.error(f"Failed to read image: {e}")
+        return None
+    if not (
+        FLASH_BASE <= argv.address
+        and argv.address + len(image) <= FLASH_BASE + FLASH_WINDOW
+    ):
+        logger.error(f"Image does not fit into flash at {argv.address:#x}")
+        return None
+    return image
+
+
+def _transfer(
+    argv,
+    ser: serial.Serial,
+    image: bytes,
+    console: Console,
+    result: PortResult,
+    reporter: Reporter | None,
+) -> None:
+    if not argv.assume_download and not init_fallback_connection(ser, console):
+        return
+
+    baudrate = ser.baudrate
+    try:
+        if not argv.assume_download:
+            enter_download_mode(ser)
+        if argv.auto_baudrate:
+            escalate_baudrate(ser, argv.baudrates)
+    except (DownloadModeError, ChunkError) as e:
+        logger.error(f"Failed to enter download mode: {e}")
+        return
+
+    try:
+        result.success, result.bytes = _write(argv, ser, image, console, reporter)
+    finally:
+        if ser.baudrate != baudrate:
+            try:
+                change_baudrate(ser, baudrate)
+            except DownloadModeError:
+                logger.warning(f"Failed to restore {baudrate} baud - reset the chip")
+
+
+def _run(argv, reporter: Reporter | None = None) -> PortResult:
+    result = PortResult(argv.port, False)
+    start = time.monotonic()
+    image = _read_image(argv)
+    if image is None:
+        return result
+    result.mac, result.uuid = device_ids(image)
+
+    # tables and prompts are only shown for a single port
+    console = Console(quiet=reporter is not None)
+    ser = open_serial(argv, threaded=True)
+    if not ser:
+        return result
+
+    # closed on every path, several ports may be written in one process
+    try:
+        _transfer(argv, ser, image, console, result, reporter)
+    finally:
+        ser.close()
+    result.elapsed = time.monotonic() - start
+    return result
+
+
+def cli(argv: argparse.Namespace) -> None:
+    if not argv.ports:
+        _run(argv)
+        return
+
+    ports = resolve_ports(argv.ports)
+    if not ports:
+        logger.error("No serial ports found")
+        return
+    if _read_image(argv) is None:
+        return
+    if not (argv.yes or argv.dry_run) and not confirm(
+        Console(), f"Write {argv.image} to {len(ports)} devices ({', '.join(ports)})?"
+    ):
+        return
+    argv.yes = True
+    run_ports(argv, _run, ports, outputs=())
@@ -1,6 +1,5 @@
 # pyright: reportUnusedCallResult=false, reportUnknownMemberType=false
 import argparse
-import lzma
 from pathlib import Path
 
 from rich.console import Console
@@ -9,7 +8,8 @@ from caterpillar.py import unpack
 
 from libmeross.util import logger
 from libmeross.commands.shared import parser_get_usage, require_info_level
-from libmeross.mtk.image import fota_bin_info_t, fota_bin_t, fota_header_info_t
+from libmeross.mtk.image import fota_bin_info_t, fota_header_info_t
+from libmeross.mtk.ota import extract_bin
 
 
 def install_parser(subparsers) -> None:
@@ -51,23 +51,23 @@ def cli(argv: argparse.Namespace):
                 end="",
             )
 
+            path: Path | None = None
+            if argv.split:
+                argv.split.mkdir(exist_ok=True, parents=True)
+                path = argv.split / f"{bin_num}.bin"
+                logger.debug(f"({bin_num}) Saving contents to {path}")
             try:
-                argv.file.seek(bin_info.bin_offset)
-                bin_part = unpack(fota_bin_t, argv.file, length=bin_info.bin_length)
-                if bin_info.is_compressed:
-                    bin_data = lzma.decompress(bin_part.bin_data)
+                # streamed in chunks, the partition is never held in memory
+                if path:
+                    with open(path, "wb") as out:
+                        length = extract_bin(argv.file, bin_info, out)
                 else:
-                    bin_data: bytes = bin_part.bin_data
+                    length = extract_bin(argv.file, bin_info)
             except Exception as e:
                 console.print("[red]Fail[/]")
                 logger.error(f"Failed to parse partition {bin_num}: {e}")
+                if path:
+                    path.unlink(missing_ok=True)
                 continue
 
-            console.print(
-                f"[green]Ok[/] ({len(bin_data)} actual bytes)", highlight=False
-            )
-            if argv.split:
-                argv.split.mkdir(exist_ok=True, parents=True)
-                path: Path = argv.split / f"{bin_num}.bin"
-                logger.debug(f"({bin_num}) Saving contents to {path}")
-                path.write_bytes(bin_data)
+            console.print(f"[green]Ok[/] ({length} actual bytes)", highlight=False)
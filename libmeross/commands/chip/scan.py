@@ -0,0 +1,91 @@
+import argparse
+import json
+import time
+
+from dataclasses import asdict
+from pathlib import Path
+
+from rich.console import Console
+from rich.table import Table
+
+from libmeross.scan import Finding, scan_paths
+from libmeross.util import logger
+from libmeross.commands.shared import parser_get_usage, require_info_level
+
+
+def install_parser(subparsers: argparse._SubParsersAction) -> None:
+    parser = subparsers.add_parser(
+        "scan",
+        help="Search flash dumps and firmware partitions for secrets",
+        usage=parser_get_usage(__name__),
+        description="Chip Tool - Secret Scanner",
+    )
+    parser.add_argument(
+        "paths",
+        type=Path,
+        nargs="+",
+        help="Files or directories (scanned recursively): AmebaZ2 flash dumps, "
+        "extracted MTK partitions or any other binary",
+    )
+    parser.add_argument(
+        "--kind",
+        action="append",
+        help="Only report findings of this kind, e.g. key, password, host (can be repeated)",
+        default=[],
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Number of worker processes (default: one per CPU)",
+        default=None,
+    )
+    parser.add_argument(
+        "--report",
+        type=Path,
+        help="Save all findings as JSON",
+        default=None,
+    )
+    parser.set_defaults(func=cli)
+
+
+def print_findings(findings: list[Finding], console: Console) -> None:
+    table = Table(title="Findings")
+    table.add_column("File", justify="left", style="bold")
+    table.add_column("Offset", justify="right")
+    table.add_column("Region", justify="left")
+    table.add_column("Kind", justify="left")
+    table.add_column("Value", justify="left", overflow="fold")
+    for finding in findings:
+        table.add_row(
+            finding.path,
+            f"{finding.offset:#x}",
+            finding.region or "",
+            finding.kind,
+            finding.value,
+        )
+    console.print(table)
+
+
+def cli(argv: argparse.Namespace) -> None:
+    require_info_level(argv)
+    start = time.perf_counter()
+    findings, files, failed = [], 0, 0
+    for path, result in scan_paths(argv.paths, argv.workers):
+        files += 1
+        if isinstance(result, str):
+            failed += 1
+            logger.error(f"Failed to scan {path}: {result}")
+            continue
+        findings += [f for f in result if not argv.kind or f.kind in argv.kind]
+
+    if findings:
+        print_findings(findings, Console())
+    logger.info(
+        f"{len(findings)} findings in {files - failed} files "
+        f"({time.perf_counter() - start:.1f}s)"
+    )
+    if argv.report:
+        try:
+            argv.report.write_text(json.dumps([asdict(f) for f in findings], indent=2))
+        except OSError as e:
+            logger.error(f"Failed to write report: {e}")
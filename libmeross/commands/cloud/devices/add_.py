@@ -1,9 +1,16 @@
 import argparse
 import json
 import ssl
+import threading
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
 
 import paho.mqtt.client as mqtt
-from pydantic import ValidationError
+from pydantic import BaseModel, ValidationError
+from rich.console import Console
+from rich.progress import Progress
+from rich.table import Table
 from pydantic_extra_types.mac_address import MacAddress
 
 from libmeross.commands.shared import (
@@ -85,6 +92,29 @@ def install_parser(subparsers: argparse._SubParsersAction) -> None:
         help="Disable privacy mode",
     )
 
+    bulk_options = parser.add_argument_group("Bulk-Options")
+    bulk_options.add_argument(
+        "--bulk",
+        type=argparse.FileType("r"),
+        help=(
+            "Path to a JSON (list) or JSON-lines file with device records "
+            "(uuid, mac, deviceIp, localConfig)"
+        ),
+        default=None,
+    )
+    bulk_options.add_argument(
+        "--concurrency",
+        type=int,
+        help="Maximum number of concurrent MQTT sessions and API requests (default: 8)",
+        default=8,
+    )
+    bulk_options.add_argument(
+        "--report",
+        type=argparse.FileType("w"),
+        help="Save the per-device status report as JSON to the given file",
+        default=None,
+    )
+
     parser.set_defaults(func=cli)
 
 
@@ -104,9 +134,76 @@ def _send_local_message(url, path, target, key, item):
         return None
 
 
+def _create_client(argv, uuid: str, mac: str, user_id: str) -> mqtt.Client:
+    client = mqtt.Client(
+        client_id=generate_device_client_id(uuid),
+        protocol=mqtt.MQTTv5,
+    )
+    client.username_pw_set(mac, generate_password(user_id, mac, argv.key))
+    client.tls_set(
+        tls_version=ssl.PROTOCOL_TLSv1_2,
+        cert_reqs=ssl.CERT_NONE,
+        ca_certs=None,
+    )
+    client.tls_insecure_set(True)
+    return client
+
+
+def _apply_privacy(argv, firmware: Firmware) -> None:
+    firmware.innerIp = "10.10.10.1"  # fake IP for MQTT
+    firmware.server = argv.mqtt_domain  # fake server for MQTT
+    firmware.port = 443  # fake port for MQTT
+    firmware.wifiMac = MacAddress("00:00:00:00:00:00")  # fake MAC for MQTT
+
+
+def _new_bind_message(
+    argv, uuid: str, hardware: Hardware, firmware: Firmware
+) -> tuple[str, bytes]:
+    publish_topic = f"/appliance/{uuid}/publish"
+    message = LocalMessage.new("PUSH", "Appliance.Control.Bind", shared_key=argv.key)
+    bind_request = BindRequest(
+        bindTime=message.header.timestamp,
+        time=Time(timestamp=message.header.timestamp),
+        hardware=hardware,
+        firmware=firmware,
+    )
+
+    message.payload = {"bind": bind_request.model_dump()}
+    message.header.from_ = publish_topic
+    logger.debug(f"Publishing message: {message}")
+    return publish_topic, message.model_dump_json().encode()
+
+
+def _request_device_info(argv, uuid: str) -> tuple[OriginDevice | None, str]:
+    api_bind_request = CloudMessage.new({"uuid": uuid})
+    headers = get_additional_headers(argv)
+    headers["Authorization"] = f"Bearer {argv.token}"
+    response = send_message(
+        f"https://{argv.host}/v1/Device/devInfo",
+        api_bind_request,
+        target=CloudResponse,
+        headers=headers,
+        timeout=argv.timeout,
+    )
+    if not response:
+        return None, "No response from Cloud API"
+
+    if response.apiStatus != 0:
+        return None, f"API status {response.apiStatus}: {response.info}"
+
+    try:
+        return OriginDevice.model_validate(response.data), ""
+    except ValidationError as e:
+        return None, f"Failed to validate response: {e}"
+
+
 def cli(argv):
     require_info_level(argv)
 
+    if argv.bulk:
+        cli_bulk(argv)
+        return
+
     if not argv.device_ip and not argv.local_config:
         logger.error("Missing device IP or local config")
         return
@@ -154,31 +251,15 @@ def cli(argv):
     logger.info("=" * 50)
     if not argv.no_privacy:
         logger.debug("Privacy mode is enabled - device details will be modified")
-        firmware.innerIp = "10.10.10.1"  # fake IP for MQTT
-        firmware.server = argv.mqtt_domain  # fake server for MQTT
-        firmware.port = 443  # fake port for MQTT
-        firmware.wifiMac = MacAddress("00:00:00:00:00:00")  # fake MAC for MQTT
+        _apply_privacy(argv, firmware)
 
     logger.info("MQTT Configuration")
     logger.info("-" * 50)
-    client = mqtt.Client(
-        client_id=generate_device_client_id(argv.uuid),
-        protocol=mqtt.MQTTv5,
-    )
+    client = _create_client(argv, argv.uuid, argv.mac, argv.user_id)
     logger.info(f" - Client-Id: {client._client_id}")
     logger.info(f" - Username: {argv.mac}")
     logger.info("-" * 50)
-    client.username_pw_set(
-        argv.mac, generate_password(argv.user_id, argv.mac, argv.key)
-    )
-    client.tls_set(
-        tls_version=ssl.PROTOCOL_TLSv1_2,
-        cert_reqs=ssl.CERT_NONE,
-        ca_certs=None,
-    )
-    client.tls_insecure_set(True)
 
-    publish_topic = f"/appliance/{argv.uuid}/publish"
     subscribe_topic = f"/appliance/{argv.uuid}/subscribe"
 
     def on_connect(client: mqtt.Client, userdata, flags, rc, p):
@@ -193,50 +274,18 @@ def cli(argv):
 
         # publish bind message
         logger.info("Publishing bind message...")
-        message = LocalMessage.new(
-            "PUSH", "Appliance.Control.Bind", shared_key=argv.key
-        )
-        bind_request = BindRequest(
-            bindTime=message.header.timestamp,
-            time=Time(timestamp=message.header.timestamp),
-            hardware=hardware,
-            firmware=firmware,
-        )
-
-        message.payload = {"bind": bind_request.model_dump()}
-        message.header.from_ = publish_topic
-        logger.debug(f"Publishing message: {message}")
-        client.publish(
-            publish_topic,
-            message.model_dump_json().encode(),
-        )
+        client.publish(*_new_bind_message(argv, argv.uuid, hardware, firmware))
 
         logger.info("Binding device to account using Cloud API...")
-        api_bind_request = CloudMessage.new({"uuid": argv.uuid})
-        headers = get_additional_headers(argv)
-        headers["Authorization"] = f"Bearer {argv.token}"
-        response = send_message(
-            f"https://{argv.host}/v1/Device/devInfo",
-            api_bind_request,
-            target=CloudResponse,
-            headers=headers,
-            timeout=argv.timeout,
-        )
-        if response:
-            if response.apiStatus != 0:
-                logger.error(f"Failed to bind device: {response}")
-            else:
-                try:
-                    origin_device = OriginDevice.model_validate(response.data)
-                except ValidationError as e:
-                    logger.error(f"Failed to validate response: {e}")
-                    return
-
-                logger.info("Successfully bound device to account:")
-                logger.info(
-                    f" - {origin_device.deviceType.upper()}-{origin_device.subType.upper()} "
-                    rf"\[{origin_device.devName}]"
-                )
+        origin_device, error = _request_device_info(argv, argv.uuid)
+        if origin_device is None:
+            logger.error(f"Failed to bind device: {error}")
+        else:
+            logger.info("Successfully bound device to account:")
+            logger.info(
+                f" - {origin_device.deviceType.upper()}-{origin_device.subType.upper()} "
+                rf"\[{origin_device.devName}]"
+            )
         client.disconnect()
 
     def on_message(client: mqtt.Client, userdata, msg):
@@ -249,3 +298,226 @@ def cli(argv):
     logger.info(f"Connecting to MQTT broker at {argv.mqtt_domain}")
     client.connect(argv.mqtt_domain, 443, 60)
     client.loop_forever()
+
+
+# --- bulk mode ---
+class BulkRecord(BaseModel):
+    uuid: str | None = None
+    mac: str | None = None
+    deviceIp: str | None = None
+    # either a path to the JSON file or the parsed config itself
+    localConfig: str | dict | None = None
+
+
+class BindReport(BaseModel):
+    uuid: str = ""
+    mac: str = ""
+    published: bool = False
+    bound: bool = False
+    device: str = ""
+    error: str = ""
+
+
+class _BindJob:
+    def __init__(self, record: BulkRecord) -> None:
+        self.record = record
+        self.firmware: Firmware | None = None
+        self.hardware: Hardware | None = None
+        self.user_id: str = ""
+        self.report = BindReport(uuid=record.uuid or "", mac=record.mac or "")
+
+
+def _load_bulk_records(fp) -> list[BulkRecord] | None:
+    text = fp.read()
+    try:
+        if text.lstrip().startswith("["):
+            items = json.loads(text)
+        else:
+            items = [json.loads(line) for line in text.splitlines() if line.strip()]
+        return [BulkRecord.model_validate(item) for item in items]
+    except (json.JSONDecodeError, ValidationError) as e:
+        logger.error(f"Failed to parse bulk records: {e}")
+        return None
+
+
+def _resolve_job(argv, job: _BindJob, base: Path) -> None:
+    record, report = job.record, job.report
+    try:
+        if record.localConfig is not None:
+            config = record.localConfig
+            if isinstance(config, str):
+                config = json.loads((base / config).read_text())
+            job.firmware = Firmware(**config["firmware"])
+            job.hardware = Hardware(**config["hardware"])
+        elif record.deviceIp:
+            device_url = f"http://{record.deviceIp}/config"
+            job.firmware = _send_local_message(
+                device_url, "Appliance.System.Firmware", Firmware, argv.key, "firmware"
+            )
+            if job.firmware:
+                job.hardware = _send_local_message(
+                    device_url, "Appliance.System.Hardware", Hardware, argv.key, "hardware"
+                )
+        else:
+            report.error = "Missing device IP or local config"
+            return
+    except (OSError, KeyError, json.JSONDecodeError, ValidationError) as e:
+        report.error = f"Invalid local config: {e}"
+        return
+
+    if not job.firmware or not job.hardware:
+        report.error = "Could not query device details"
+        return
+
+    report.uuid = record.uuid or str(job.hardware.uuid)
+    report.mac = record.mac or str(job.hardware.macAddress)
+    job.user_id = argv.user_id or str(job.firmware.userId)
+    if not argv.no_privacy:
+        _apply_privacy(argv, job.firmware)
+
+
+def _confirm_job(argv, job: _BindJob) -> None:
+    origin_device, error = _request_device_info(argv, job.report.uuid)
+    if origin_device is None:
+        job.report.error = error
+        return
+
+    job.report.bound = True
+    job.report.device = (
+        f"{origin_device.deviceType.upper()}-{origin_device.subType.upper()} "
+        f"({origin_device.devName})"
+    )
+
+
+def _bind_group(
+    argv,
+    jobs: list[_BindJob],
+    api_pool: ThreadPoolExecutor,
+    confirmations: list[Future],
+    progress: Progress,
+    task,
+) -> None:
+    # All records in a group share the same credentials (MAC and user id), so
+    # a single broker session is enough to publish all of their bind messages.
+    first = jobs[0]
+    client = _create_client(argv, first.report.uuid, first.report.mac, first.user_id)
+    connected = threading.Event()
+    result: list[int] = []
+
+    def on_connect(client: mqtt.Client, userdata, flags, rc, p=None):
+        result.append(rc)
+        connected.set()
+
+    def fail(error: str) -> None:
+        for job in jobs:
+            job.report.error = error
+            progress.advance(task)
+
+    client.on_connect = on_connect
+    try:
+        client.connect(argv.mqtt_domain, 443, 60)
+    except OSError as e:
+        fail(f"MQTT connection failed: {e}")
+        return
+
+    client.loop_start()
+    try:
+        if not connected.wait(argv.timeout * 5) or result[0] != 0:
+            fail(f"MQTT connection refused: {result[0] if result else 'timeout'}")
+            return
+
+        # pipeline: publish everything first, then collect the acknowledgements
+        pending = []
+        for job in jobs:
+            topic, payload = _new_bind_message(
+                argv, job.report.uuid, job.hardware, job.firmware
+            )
+            pending.append((job, client.publish(topic, payload, qos=1)))
+
+        for job, info in pending:
+            try:
+                info.wait_for_publish(argv.timeout * 5)
+            except (RuntimeError, ValueError) as e:
+                logger.debug(f"({job.report.uuid}) Publish failed: {e}")
+
+            if not info.is_published():
+                job.report.error = "Bind message was not acknowledged"
+                progress.advance(task)
+                continue
+
+            job.report.published = True
+            future = api_pool.submit(_confirm_job, argv, job)
+            future.add_done_callback(lambda _: progress.advance(task))
+            confirmations.append(future)
+    finally:
+        client.disconnect()
+        client.loop_stop()
+
+
+def _print_report(jobs: list[_BindJob]) -> None:
+    table = Table(title="Bulk Binding")
+    table.add_column("UUID", justify="left", style="bold")
+    table.add_column("MAC", justify="left")
+    table.add_column("MQTT", justify="center")
+    table.add_column("Cloud", justify="center")
+    table.add_column("Device / Error", justify="left", overflow="fold")
+    for job in jobs:
+        report = job.report
+        table.add_row(
+            report.uuid or "-",
+            report.mac or "-",
+            "[green]Ok[/]" if report.published else "[red]Fail[/]",
+            "[green]Ok[/]" if report.bound else "[red]Fail[/]",
+            report.device if report.bound else f"[red]{report.error}[/]",
+        )
+    Console().print(table)
+
+
+def cli_bulk(argv) -> None:
+    if argv.token is None:
+        logger.error("Token is required")
+        return
+
+    records = _load_bulk_records(argv.bulk)
+    if not records:
+        logger.error("No device records found")
+        return
+
+    concurrency = max(1, argv.concurrency)
+    base = Path(argv.bulk.name).parent
+    jobs = [_BindJob(record) for record in records]
+    logger.info(f"Binding {len(jobs)} devices (concurrency: {concurrency})")
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(lambda job: _resolve_job(argv, job, base), jobs))
+
+    groups: dict[tuple[str, str], list[_BindJob]] = {}
+    for job in jobs:
+        if not job.report.error:
+            key = (job.report.mac.lower(), job.user_id)
+            groups.setdefault(key, []).append(job)
+
+    ready = sum(len(group) for group in groups.values())
+    confirmations: list[Future] = []
+    with Progress() as progress:
+        task = progress.add_task("Binding...", total=ready)
+        with (
+            ThreadPoolExecutor(concurrency) as mqtt_pool,
+            ThreadPoolExecutor(concurrency) as api_pool,
+        ):
+            for future in [
+                mqtt_pool.submit(
+                    _bind_group, argv, group, api_pool, confirmations, progress, task
+                )
+                for group in groups.values()
+            ]:
+                future.result()
+            for future in list(confirmations):
+                future.result()
+
+    _print_report(jobs)
+    bound = sum(job.report.bound for job in jobs)
+    logger.info(f"Bound {bound}/{len(jobs)} devices")
+    if argv.report:
+        json.dump([job.report.model_dump() for job in jobs], argv.report, indent=2)
+        argv.report.close()
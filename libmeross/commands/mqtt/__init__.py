@@ -0,0 +1,5 @@
+from libmeross.commands.mqtt import serve
+
+__doc__ = """\
+Self-hosted MQTT broker for Meross devices
+"""
@@ -0,0 +1,129 @@
+import argparse
+import asyncio
+import ssl
+
+from libmeross.broker import Broker, create_ssl_context
+from libmeross.config import settings
+from libmeross.util import logger
+from libmeross.commands.shared import (
+    parser_add_key,
+    parser_get_usage,
+    require_info_level,
+)
+
+
+def install_parser(subparsers: argparse._SubParsersAction) -> None:
+    parser = subparsers.add_parser(
+        "serve",
+        help="Run a minimal MQTT broker for self-hosted devices",
+        usage=parser_get_usage(__name__),
+        description="MQTT Broker - devices can be pointed to it with 'device bind --mqtt-host'",
+    )
+    parser.add_argument(
+        "--bind",
+        type=str,
+        help="The address to listen on (default: 0.0.0.0)",
+        default="0.0.0.0",
+    )
+    parser.add_argument(
+        "-p",
+        "--port",
+        type=int,
+        help="The port to listen on (default: 8883)",
+        default=8883,
+    )
+    tls_group = parser.add_argument_group("TLS-Options")
+    tls_group.add_argument(
+        "--cert",
+        type=str,
+        help="Path to the PEM certificate (chain) of the broker",
+        default=None,
+    )
+    tls_group.add_argument(
+        "--cert-key",
+        type=str,
+        help="Path to the private key of the certificate (if not included in --cert)",
+        default=None,
+    )
+
+    auth_group = parser.add_argument_group("Auth-Options")
+    parser_add_key(auth_group)
+    auth_group.add_argument(
+        "-U",
+        "--user-id",
+        type=str,
+        help="Only accept devices bound to this user id (default: any)",
+        default=settings.account.userId or None,
+    )
+    auth_group.add_argument(
+        "--allow-anonymous",
+        action="store_true",
+        help="Accept all clients without checking their credentials",
+    )
+    parser.add_argument(
+        "--stats-interval",
+        type=float,
+        help="Log broker statistics every N seconds (0 disables, default: 60)",
+        default=60,
+    )
+    parser.set_defaults(func=cli)
+
+
+async def _log_stats(broker: Broker, interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        stats = broker.stats
+        logger.info(
+            f"Clients: {stats.connections} | Received: {stats.received} | "
+            f"Delivered: {stats.delivered} | Rejected: {stats.rejected} | "
+            f"Dropped: {stats.dropped}"
+        )
+
+
+async def _serve(argv: argparse.Namespace, context: ssl.SSLContext | None) -> None:
+    broker = Broker(
+        shared_key=argv.key,
+        user_id=argv.user_id,
+        allow_anonymous=argv.allow_anonymous,
+    )
+    server = await broker.serve(argv.bind, argv.port, ssl_context=context)
+    logger.info(f"Listening on {argv.bind}:{argv.port} ({'TLS' if context else 'TCP'})")
+    if argv.stats_interval > 0:
+        asyncio.get_running_loop().create_task(_log_stats(broker, argv.stats_interval))
+
+    async with server:
+        await server.serve_forever()
+
+
+def cli(argv: argparse.Namespace) -> None:
+    require_info_level(argv)
+
+    context = None
+    if argv.cert:
+        try:
+            context = create_ssl_context(argv.cert, argv.cert_key)
+        except (OSError, ssl.SSLError) as e:
+            logger.error(f"Failed to load certificate: {e}")
+            return
+    else:
+        for row in (
+            "No certificate given - the broker will accept plain TCP connections ",
+            "only. Devices always connect using TLS.",
+        ):
+            logger.warning(row)
+
+    if not argv.allow_anonymous:
+        if not argv.key:
+            if not argv.user_id:
+                logger.error(
+                    "No shared key provided - an empty key is only accepted together "
+                    "with a user id (-U), or use --allow-anonymous"
+                )
+                return
+            logger.warning("No shared key provided - devices must use an empty key")
+        logger.debug(f"Accepting user id: {argv.user_id or '<any>'}")
+
+    try:
+        asyncio.run(_serve(argv, context))
+    except OSError as e:
+        logger.error(f"Failed to start broker: {e}")
@@ -0,0 +1,5 @@
+from libmeross.commands.telemetry import record, query
+
+__doc__ = """\
+Record and query device telemetry (PUSH messages, polled state)
+"""
@@ -0,0 +1,111 @@
+import argparse
+import datetime
+import json
+import sys
+
+from pathlib import Path
+
+from rich.console import Console
+from rich.table import Table
+
+from libmeross import telemetry
+from libmeross.util import logger
+from libmeross.commands.shared import parser_get_usage
+
+
+def timestamp(value: str) -> int:
+    # epoch seconds or an ISO 8601 date/time, returned in milliseconds
+    try:
+        return int(float(value) * 1000)
+    except ValueError:
+        pass
+    try:
+        return int(datetime.datetime.fromisoformat(value).timestamp() * 1000)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid time: {value!r}")
+
+
+def install_parser(subparsers: argparse._SubParsersAction) -> None:
+    parser = subparsers.add_parser(
+        "query",
+        help="Query recorded telemetry by UUID, namespace and time range",
+        usage=parser_get_usage(__name__),
+        description="Telemetry Query",
+    )
+    parser.add_argument(
+        "directory",
+        type=Path,
+        help="The directory storing the telemetry segments",
+    )
+    parser.add_argument("--uuid", type=str, help="Only messages of this device")
+    parser.add_argument("--namespace", type=str, help="Only messages of this namespace")
+    parser.add_argument(
+        "--since",
+        type=timestamp,
+        help="Start of the time range (epoch seconds or ISO date)",
+    )
+    parser.add_argument(
+        "--until",
+        type=timestamp,
+        help="End of the time range (epoch seconds or ISO date)",
+    )
+    parser.add_argument(
+        "-n", "--limit", type=int, default=None, help="Maximum number of results"
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Print one JSON object per line instead of a table",
+    )
+    parser.set_defaults(func=cli)
+
+
+def cli(argv: argparse.Namespace) -> None:
+    if not argv.directory.is_dir():
+        logger.error(f"Not a telemetry directory: {argv.directory}")
+        return
+
+    results = telemetry.query(
+        argv.directory,
+        uuid=argv.uuid,
+        namespace=argv.namespace,
+        since=argv.since,
+        until=argv.until,
+    )
+
+    table = None
+    if not argv.json:
+        table = Table(title="Telemetry")
+        table.add_column("Time", justify="left")
+        table.add_column("UUID", justify="left", style="bold")
+        table.add_column("Namespace", justify="left")
+        table.add_column("Method", justify="left")
+        table.add_column("Payload", justify="left", overflow="fold")
+
+    count = 0
+    try:
+        for record in results:
+            if argv.limit is not None and count >= argv.limit:
+                break
+            count += 1
+            if table is None:
+                sys.stdout.write(json.dumps(record.__dict__) + "\n")
+                continue
+
+            time = datetime.datetime.fromtimestamp(record.timestamp / 1000)
+            table.add_row(
+                time.isoformat(sep=" ", timespec="milliseconds"),
+                record.uuid,
+                record.namespace,
+                record.method,
+                json.dumps(record.payload),
+            )
+    except telemetry.TelemetryError as e:
+        logger.error(str(e))
+        return
+
+    if table is not None:
+        if count == 0:
+            logger.info("No records found")
+        else:
+            Console().print(table)
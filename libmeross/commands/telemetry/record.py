@@ -0,0 +1,348 @@
+import argparse
+import functools
+import ssl
+import threading
+import time
+
+from pathlib import Path
+from typing import Callable
+
+import paho.mqtt.client as mqtt
+from pydantic import ValidationError
+
+from libmeross import telemetry
+from libmeross.pipeline import (
+    DEFAULT_MAX_AGE,
+    InboundPipeline,
+    InboundResult,
+    ShardedPipeline,
+    Verdict,
+)
+from libmeross.config import settings
+from libmeross.mqtt import generate_app_password
+from libmeross.protocol import LocalMessage
+from libmeross.util import logger, generate_random
+from libmeross.commands.shared import (
+    parser_add_key,
+    parser_get_usage,
+    require_info_level,
+    send_message,
+)
+
+
+def install_parser(subparsers: argparse._SubParsersAction) -> None:
+    parser = subparsers.add_parser(
+        "record",
+        help="Record device messages into an append-only telemetry store",
+        usage=parser_get_usage(__name__),
+        description="Telemetry Recorder",
+    )
+    parser.add_argument(
+        "directory",
+        type=Path,
+        help="The directory storing the telemetry segments",
+    )
+
+    mqtt_group = parser.add_argument_group("MQTT-Options")
+    mqtt_group.add_argument(
+        "--mqtt-host",
+        type=str,
+        action="append",
+        default=[],
+        help="Record messages from the given MQTT broker (<host>:<port>), can be "
+        "specified twice to mirror both gateways of a device",
+    )
+    mqtt_group.add_argument(
+        "--topic",
+        type=str,
+        action="append",
+        default=[],
+        help="The topic(s) to subscribe to (default: /appliance/+/publish)",
+    )
+    mqtt_group.add_argument(
+        "--no-tls",
+        action="store_true",
+        help="Connect to the broker without TLS",
+    )
+    mqtt_group.add_argument(
+        "-U",
+        "--user-id",
+        type=str,
+        help="The user id used to log in as app client (will be taken from config if not set)",
+        default=settings.account.userId or None,
+    )
+    parser_add_key(mqtt_group)
+    mqtt_group.add_argument(
+        "--no-verify",
+        action="store_true",
+        help="Do not verify message signatures",
+    )
+    mqtt_group.add_argument(
+        "--max-age",
+        type=float,
+        default=DEFAULT_MAX_AGE,
+        help="Reject messages with timestamps older than N seconds (0 disables, default: 300)",
+    )
+    mqtt_group.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Verify and validate messages in N worker processes, sharded by "
+        "device (default: 0, in-process)",
+    )
+    mqtt_group.add_argument(
+        "--stats-interval",
+        type=float,
+        default=60,
+        help="Log pipeline statistics every N seconds (0 disables, default: 60)",
+    )
+
+    poll_group = parser.add_argument_group("Poll-Options")
+    poll_group.add_argument(
+        "--poll",
+        type=str,
+        action="append",
+        default=[],
+        help="Poll the device at the given host (can be specified multiple times)",
+    )
+    poll_group.add_argument(
+        "--namespace",
+        type=str,
+        action="append",
+        default=[],
+        help="The namespace(s) to poll (default: Appliance.System.All)",
+    )
+    poll_group.add_argument(
+        "--uuid",
+        type=str,
+        help="The UUID stored alongside polled messages (default: from config)",
+        default=settings.device.uuid or None,
+    )
+    poll_group.add_argument(
+        "--interval",
+        type=float,
+        help="The polling interval in seconds (default: 10)",
+        default=10,
+    )
+
+    storage_group = parser.add_argument_group("Storage-Options")
+    storage_group.add_argument(
+        "--compression",
+        choices=list(telemetry.COMPRESSION),
+        default="zlib",
+        help="The block compression (default: zlib)",
+    )
+    storage_group.add_argument(
+        "--block-records",
+        type=int,
+        default=telemetry.DEFAULT_BLOCK_RECORDS,
+        help=f"Records per block (default: {telemetry.DEFAULT_BLOCK_RECORDS})",
+    )
+    storage_group.add_argument(
+        "--flush-interval",
+        type=float,
+        default=telemetry.DEFAULT_FLUSH_INTERVAL,
+        help="Write partially filled blocks after N seconds (default: 5)",
+    )
+    storage_group.add_argument(
+        "--segment-size",
+        type=int,
+        default=telemetry.DEFAULT_SEGMENT_SIZE // (1024 * 1024),
+        help="Rotate segments after N MiB (default: 64)",
+    )
+    storage_group.add_argument(
+        "--segment-age",
+        type=float,
+        default=telemetry.DEFAULT_SEGMENT_AGE,
+        help="Rotate segments after N seconds (default: 86400)",
+    )
+    storage_group.add_argument(
+        "--retention",
+        type=float,
+        default=None,
+        help="Delete segments older than N seconds",
+    )
+    storage_group.add_argument(
+        "--max-segments",
+        type=int,
+        default=None,
+        help="Keep at most N segments",
+    )
+    parser.set_defaults(func=cli)
+
+
+def _start_mqtt(
+    argv, mqtt_host: str, on_payload: Callable[[str, bytes], None]
+) -> mqtt.Client | None:
+    host, _, port = mqtt_host.partition(":")
+    topics = argv.topic or ["/appliance/+/publish"]
+
+    client = mqtt.Client(
+        client_id=f"app:{argv.user_id or 0}-{generate_random(16)}",
+        protocol=mqtt.MQTTv311,
+    )
+    if argv.user_id:
+        client.username_pw_set(
+            argv.user_id, generate_app_password(argv.user_id, argv.key)
+        )
+    if not argv.no_tls:
+        client.tls_set(cert_reqs=ssl.CERT_NONE, tls_version=ssl.PROTOCOL_TLSv1_2)
+        client.tls_insecure_set(True)
+
+    def on_connect(client: mqtt.Client, userdata, flags, rc, p=None):
+        if rc != 0:
+            logger.error(f"Failed to connect to MQTT broker {mqtt_host}: {rc}")
+            return
+        for topic in topics:
+            logger.debug(f"Subscribing to {topic} on {mqtt_host}")
+            client.subscribe(topic)
+
+    def on_message(client: mqtt.Client, userdata, msg):
+        on_payload(msg.topic, msg.payload)
+
+    client.on_connect = on_connect
+    client.on_message = on_message
+    try:
+        client.connect(host, int(port or 8883), 60)
+    except (OSError, ValueError) as e:
+        logger.error(f"Failed to connect to MQTT broker at {mqtt_host}: {e}")
+        return None
+
+    client.loop_start()
+    logger.info(f"Recording {', '.join(topics)} from {mqtt_host}")
+    return client
+
+
+def _accept(
+    pipeline: InboundPipeline,
+    lock: threading.Lock,
+    writer: telemetry.TelemetryWriter,
+    topic: str,
+    payload: bytes,
+) -> None:
+    try:
+        message = LocalMessage.model_validate_json(payload)
+    except ValidationError as e:
+        logger.debug(f"Skipping invalid message on {topic}: {e}")
+        return
+    # each broker has its own network thread
+    with lock:
+        verdict = pipeline.check(message)
+    if verdict is Verdict.ACCEPTED:
+        writer.append_message(telemetry.uuid_from_topic(topic) or topic, message)
+    else:
+        logger.debug(f"Dropped message {message.header.messageId} on {topic}: {verdict.value}")
+
+
+def _submit(pipeline: ShardedPipeline, topic: str, payload: bytes) -> None:
+    pipeline.submit(telemetry.uuid_from_topic(topic) or topic, payload)
+
+
+def _on_result(writer: telemetry.TelemetryWriter, result: InboundResult) -> None:
+    if result.verdict is not Verdict.ACCEPTED:
+        reason = result.verdict.value
+        if result.error:
+            reason += f" ({result.error})"
+        logger.debug(f"({result.uuid}) Dropped message: {reason}")
+        return
+    if result.error:
+        # recorded anyway, the raw payload is kept
+        logger.debug(f"({result.uuid}) Payload of {result.namespace} is invalid: {result.error}")
+    writer.append(
+        result.uuid,
+        result.namespace,
+        result.method,
+        result.payload,
+        timestamp=result.timestamp,
+    )
+
+
+def _stop_mqtt(clients: list[mqtt.Client]) -> None:
+    for client in clients:
+        client.disconnect()
+        client.loop_stop()
+
+
+def _poll(argv, writer: telemetry.TelemetryWriter) -> None:
+    namespaces = argv.namespace or ["Appliance.System.All"]
+    for host in argv.poll:
+        for namespace in namespaces:
+            message = LocalMessage.new("GET", namespace, shared_key=argv.key)
+            response = send_message(f"http://{host}/config", message)
+            if response is not None:
+                writer.append_message(argv.uuid or host, response)
+
+
+def _record(
+    argv,
+    writer: telemetry.TelemetryWriter,
+    pipeline: InboundPipeline | ShardedPipeline,
+    stats: bool,
+) -> None:
+    if argv.poll:
+        logger.info(f"Polling {len(argv.poll)} device(s) every {argv.interval}s")
+
+    next_poll = 0.0
+    next_stats = time.monotonic() + argv.stats_interval
+    try:
+        while True:
+            if argv.poll and time.monotonic() >= next_poll:
+                next_poll = time.monotonic() + argv.interval
+                _poll(argv, writer)
+            if stats and argv.stats_interval > 0 and time.monotonic() >= next_stats:
+                next_stats = time.monotonic() + argv.stats_interval
+                logger.info(pipeline.stats.report())
+            if isinstance(pipeline, ShardedPipeline):
+                pipeline.flush()
+            writer.tick()
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+
+
+def cli(argv: argparse.Namespace) -> None:
+    require_info_level(argv)
+    if not argv.mqtt_host and not argv.poll:
+        logger.error("Either --mqtt-host or --poll is required")
+        return
+
+    writer = telemetry.TelemetryWriter(
+        argv.directory,
+        compression=argv.compression,
+        block_records=argv.block_records,
+        flush_interval=argv.flush_interval,
+        segment_size=argv.segment_size * 1024 * 1024,
+        segment_age=argv.segment_age,
+        retention=argv.retention,
+        max_segments=argv.max_segments,
+    )
+
+    if argv.workers:
+        pipeline = ShardedPipeline(
+            functools.partial(_on_result, writer),
+            workers=argv.workers,
+            shared_key=argv.key,
+            verify=not argv.no_verify,
+            max_age=argv.max_age,
+        )
+        on_payload = functools.partial(_submit, pipeline)
+    else:
+        pipeline = InboundPipeline(
+            shared_key=argv.key, verify=not argv.no_verify, max_age=argv.max_age
+        )
+        on_payload = functools.partial(_accept, pipeline, threading.Lock(), writer)
+
+    clients = []
+    for mqtt_host in argv.mqtt_host:
+        client = _start_mqtt(argv, mqtt_host, on_payload)
+        if client is None:
+            break
+        clients.append(client)
+    else:
+        _record(argv, writer, pipeline, bool(clients))
+
+    _stop_mqtt(clients)
+    if isinstance(pipeline, ShardedPipeline):
+        pipeline.close()
+    writer.close()
+    logger.info(f"Recorded {writer.records_written} messages to {argv.directory}")
@@ -1,3 +1,5 @@
+import hmac
+
 from libmeross import util
 
 
@@ -8,3 +10,33 @@ def generate_device_client_id(uuid: str, shared_nonce: str | None = None) -> str
 def generate_password(user_id: int, mac: str, shared_key: str | None = None) -> str:
     pwd_hash = util.hash_password(f"{mac}{shared_key or ''}")
     return f"{user_id}_{pwd_hash}"
+
+
+def generate_app_password(user_id: int | str, shared_key: str | None = None) -> str:
+    # the app logs in with its user id as username
+    return util.hash_password(f"{user_id}{shared_key or ''}")
+
+
+def verify_password(
+    username: str,
+    password: str,
+    shared_key: str | None = None,
+    user_id: str | None = None,
+) -> bool:
+    # Without a key the password is just md5 of the username and anyone can
+    # compute it: accept empty keys only together with a fixed user id.
+    if not shared_key and user_id is None:
+        return False
+
+    # device credentials: <mac> / <userId>_md5(<mac><key>)
+    pwd_user_id, sep, _ = password.rpartition("_")
+    if sep and (user_id is None or pwd_user_id == user_id):
+        expected = generate_password(pwd_user_id, username, shared_key)
+        if hmac.compare_digest(expected, password):
+            return True
+
+    # app credentials: <userId> / md5(<userId><key>)
+    if user_id is None or username == user_id:
+        expected = generate_app_password(username, shared_key)
+        return hmac.compare_digest(expected, password)
+    return False
@@ -0,0 +1,94 @@
+# Streaming extraction of the partitions of an OTA image.
+#
+# Each partition is stored as fota_bin_t: bin_length bytes of (optionally
+# LZMA compressed) data followed by the SHA-1 of that data. Instead of
+# unpacking the whole struct and decompressing it at once, the data is read in
+# fixed-size chunks that are hashed and fed to an incremental decompressor
+# whose output is written straight to the target file. Memory use is bounded
+# by the chunk size, independent of the size of a partition.
+import hashlib
+import lzma
+from typing import BinaryIO
+
+from libmeross.mtk.image import FOTA_SIGNATURE_SIZE, fota_bin_info_t
+
+CHUNK_SIZE = 0x10000
+
+
+class SignatureError(ValueError):
+    pass
+
+
+class _Decompressor:
+    # Same semantics as lzma.decompress(): concatenated streams are decoded
+    # one after the other, trailing garbage after the first stream is ignored.
+    def __init__(self) -> None:
+        self.decompressor = lzma.LZMADecompressor()
+        self.streams = 1
+        self.trailing = False
+
+    def feed(self, data: bytes, max_length: int):
+        """Yield the output for *data* in pieces of at most *max_length*."""
+        while not self.trailing:
+            if self.decompressor.eof:
+                data = self.decompressor.unused_data + data
+                if not data:
+                    return
+                self.decompressor = lzma.LZMADecompressor()
+                self.streams += 1
+            try:
+                out = self.decompressor.decompress(data, max_length)
+            except lzma.LZMAError:
+                if self.streams == 1:
+                    raise
+                self.trailing = True
+                return
+            data = b""
+            if out:
+                yield out
+            if self.decompressor.needs_input and not self.decompressor.eof:
+                return
+
+    def finish(self) -> None:
+        if not self.decompressor.eof and not self.trailing:
+            raise lzma.LZMAError("Compressed data ended before the end-of-stream marker")
+
+
+def extract_bin(
+    fp: BinaryIO,
+    bin_info: fota_bin_info_t,
+    out: BinaryIO | None = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> int:
+    """Verify and copy (decompressed) partition data from *fp* to *out*.
+
+    Returns the number of data bytes; with *out* set to None the data is only
+    verified. Raises SignatureError if the SHA-1 does not match - the data has
+    been written at that point already.
+    """
+    fp.seek(bin_info.bin_offset)
+    sha1 = hashlib.sha1()
+    decompressor = _Decompressor() if bin_info.is_compressed else None
+    remaining, length = bin_info.bin_length, 0
+    while remaining:
+        chunk = fp.read(min(chunk_size, remaining))
+        if not chunk:
+            raise EOFError(f"Partition data truncated ({remaining} bytes missing)")
+        remaining -= len(chunk)
+        sha1.update(chunk)
+        pieces = decompressor.feed(chunk, chunk_size) if decompressor else (chunk,)
+        for piece in pieces:
+            length += len(piece)
+            if out is not None:
+                out.write(piece)
+    if decompressor:
+        decompressor.finish()
+
+    signature = fp.read(FOTA_SIGNATURE_SIZE)
+    if len(signature) != FOTA_SIGNATURE_SIZE:
+        raise EOFError("Partition signature truncated")
+    if signature != sha1.digest():
+        raise SignatureError(
+            f"Signature mismatch: expected {signature.hex()}, got {sha1.hexdigest()}"
+        )
+    return length
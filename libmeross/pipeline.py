@@ -0,0 +1,353 @@
+# Inbound message stage for mirrored device traffic.
+#
+# Devices publish every message to both gateways configured in their
+# bind.Gateway (host/secondHost), so a mirror subscribed to both brokers sees
+# each messageId twice. The stage below drops those duplicates and rejects
+# stale or forged messages before they reach any consumer:
+#
+#   1. stale timestamps (cheap, no hashing)
+#   2. duplicate messageIds (lookup in a bounded LRU / time-window set)
+#   3. signature check (MD5 over messageId + key + timestamp)
+#
+# Duplicates are checked before the signature so that the second copy of a
+# message never costs an MD5. Only messages that passed the signature check
+# are remembered, which means forged messages cannot evict or poison entries.
+#
+# For high-volume streams ShardedPipeline moves parsing, verification and
+# payload validation into worker processes. Messages are sharded by device
+# UUID, so all messages of one device are handled by the same worker in the
+# order they were received (and its duplicates always meet the same
+# ReplayFilter). Messages and results travel through pipes in pickled batches.
+import hmac
+import multiprocessing
+import multiprocessing.connection
+import pickle
+import signal
+import threading
+import time
+import zlib
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Callable, NamedTuple
+
+from pydantic import BaseModel, ValidationError
+
+from libmeross import util
+from libmeross.model import BindRequest, Firmware, Hardware, Online, Time, WifiList
+from libmeross.protocol import LocalMessage
+
+DEFAULT_CAPACITY = 65536
+DEFAULT_WINDOW = 600.0
+DEFAULT_MAX_AGE = 300.0
+
+
+class Verdict(str, Enum):
+    ACCEPTED = "accepted"
+    DUPLICATE = "duplicate"
+    STALE = "stale"
+    INVALID_SIGNATURE = "invalid-signature"
+    MALFORMED = "malformed"
+
+
+class ReplayFilter:
+    """Bounded set of recently seen message ids.
+
+    Entries expire after *window* seconds; if more than *capacity* ids are
+    live, the oldest one is evicted.
+    """
+
+    def __init__(
+        self, capacity: int = DEFAULT_CAPACITY, window: float = DEFAULT_WINDOW
+    ) -> None:
+        self.capacity = capacity
+        self.window = window
+        self.entries: OrderedDict[str, float] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, message_id: str) -> bool:
+        self.expire()
+        return message_id in self.entries
+
+    def add(self, message_id: str, now: float | None = None) -> None:
+        self.entries.pop(message_id, None)
+        self.entries[message_id] = time.monotonic() if now is None else now
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def expire(self, now: float | None = None) -> None:
+        limit = (time.monotonic() if now is None else now) - self.window
+        entries = self.entries
+        # insertion order == time order as entries are always appended
+        while entries:
+            message_id, seen = next(iter(entries.items()))
+            if seen >= limit:
+                break
+            del entries[message_id]
+
+
+@dataclass
+class PipelineStats:
+    received: int = 0
+    accepted: int = 0
+    duplicates: int = 0
+    stale: int = 0
+    invalid: int = 0
+    malformed: int = 0
+    _last_time: float = field(default_factory=time.monotonic, repr=False)
+    _last_received: int = field(default=0, repr=False)
+
+    def count(self, verdict: Verdict) -> None:
+        self.received += 1
+        if verdict is Verdict.ACCEPTED:
+            self.accepted += 1
+        elif verdict is Verdict.DUPLICATE:
+            self.duplicates += 1
+        elif verdict is Verdict.STALE:
+            self.stale += 1
+        elif verdict is Verdict.MALFORMED:
+            self.malformed += 1
+        else:
+            self.invalid += 1
+
+    def rate(self) -> float:
+        # messages processed per second since the last call
+        now = time.monotonic()
+        elapsed = now - self._last_time
+        processed = self.received - self._last_received
+        self._last_time, self._last_received = now, self.received
+        return processed / elapsed if elapsed > 0 else 0.0
+
+    def report(self) -> str:
+        return (
+            f"Verified: {self.rate():.0f} msg/s | Accepted: {self.accepted} | "
+            f"Duplicates: {self.duplicates} | Stale: {self.stale} | "
+            f"Invalid: {self.invalid} | Malformed: {self.malformed}"
+        )
+
+
+class InboundPipeline:
+    """Verify, de-duplicate and age-check inbound LocalMessages.
+
+    Not thread-safe: feed it from a single thread (e.g. the paho network
+    loop) or guard it with a lock.
+    """
+
+    def __init__(
+        self,
+        shared_key: str | None = None,
+        verify: bool = True,
+        max_age: float | None = DEFAULT_MAX_AGE,
+        capacity: int = DEFAULT_CAPACITY,
+        window: float = DEFAULT_WINDOW,
+    ) -> None:
+        self.shared_key = shared_key or ""
+        self.verify = verify
+        self.max_age = max_age
+        self.seen = ReplayFilter(capacity, window)
+        self.stats = PipelineStats()
+
+    def check(self, message: LocalMessage) -> Verdict:
+        header = message.header
+        if self.max_age and abs(time.time() - header.timestamp) > self.max_age:
+            verdict = Verdict.STALE
+        elif header.messageId in self.seen:
+            verdict = Verdict.DUPLICATE
+        elif self.verify and not self._verify_sign(message):
+            verdict = Verdict.INVALID_SIGNATURE
+        else:
+            self.seen.add(header.messageId)
+            verdict = Verdict.ACCEPTED
+
+        self.stats.count(verdict)
+        return verdict
+
+    def accept(self, message: LocalMessage) -> bool:
+        return self.check(message) is Verdict.ACCEPTED
+
+    def _verify_sign(self, message: LocalMessage) -> bool:
+        header = message.header
+        sign = util.hash_password(
+            f"{header.messageId}{self.shared_key}{header.timestamp}"
+        )
+        return hmac.compare_digest(sign, header.sign)
+
+
+# --- sharded processing ---
+# namespace -> (payload item, model) validated by the workers
+PAYLOAD_MODELS: dict[str, tuple[str | None, type[BaseModel]]] = {
+    "Appliance.Control.Bind": ("bind", BindRequest),
+    "Appliance.System.Firmware": ("firmware", Firmware),
+    "Appliance.System.Hardware": ("hardware", Hardware),
+    "Appliance.System.Online": ("online", Online),
+    "Appliance.System.Time": ("time", Time),
+    "Appliance.Config.WifiList": (None, WifiList),
+}
+
+DEFAULT_BATCH_SIZE = 256
+
+
+class InboundResult(NamedTuple):
+    uuid: str
+    timestamp: int  # receive time (ms)
+    verdict: Verdict
+    # only set for accepted messages
+    namespace: str | None = None
+    method: str | None = None
+    payload: dict | None = None
+    error: str | None = None
+
+
+def process_message(
+    pipeline: InboundPipeline, uuid: str, timestamp: int, payload: bytes
+) -> InboundResult:
+    # Payloads of known namespaces are validated against their model; the
+    # result only carries the raw payload and the validation error (if any),
+    # as pickling pydantic models is an order of magnitude slower than
+    # pickling plain dicts.
+    try:
+        message = LocalMessage.model_validate_json(payload)
+    except ValidationError as e:
+        return InboundResult(uuid, timestamp, Verdict.MALFORMED, error=str(e))
+
+    verdict = pipeline.check(message)
+    if verdict is not Verdict.ACCEPTED:
+        return InboundResult(uuid, timestamp, verdict)
+
+    header, error = message.header, None
+    spec = PAYLOAD_MODELS.get(header.namespace)
+    if spec is not None:
+        item, model = spec
+        try:
+            message.get_payload(model, item)
+        except (ValidationError, KeyError, TypeError) as e:
+            error = str(e)
+    return InboundResult(
+        uuid,
+        timestamp,
+        verdict,
+        header.namespace,
+        header.method,
+        message.payload,
+        error,
+    )
+
+
+def _shard_worker(
+    inbox: multiprocessing.connection.Connection,
+    outbox: multiprocessing.connection.Connection,
+    shared_key: str | None,
+    verify: bool,
+    max_age: float | None,
+) -> None:
+    # Ctrl+C is handled by the parent, which drains and stops the workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    pipeline = InboundPipeline(shared_key, verify=verify, max_age=max_age)
+    while True:
+        try:
+            data = inbox.recv_bytes()
+        except EOFError:
+            break
+        if not data:  # shutdown
+            break
+        results = [process_message(pipeline, *item) for item in pickle.loads(data)]
+        outbox.send_bytes(pickle.dumps(results, pickle.HIGHEST_PROTOCOL))
+    outbox.close()
+
+
+class ShardedPipeline:
+    """Process inbound messages in *workers* processes, sharded by UUID.
+
+    `submit` may be called from several threads (e.g. one paho network
+    thread per broker). Results are passed to *callback* on a collector
+    thread, in receive order per device. Partially filled batches are sent
+    on `flush`, which should be called periodically.
+    """
+
+    def __init__(
+        self,
+        callback: Callable[[InboundResult], None],
+        workers: int | None = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        shared_key: str | None = None,
+        verify: bool = True,
+        max_age: float | None = DEFAULT_MAX_AGE,
+    ) -> None:
+        workers = workers or multiprocessing.cpu_count()
+        self.callback = callback
+        self.batch_size = batch_size
+        self.stats = PipelineStats()
+        self.lock = threading.Lock()
+        self.pending: list[list[tuple]] = [[] for _ in range(workers)]
+        self.inboxes: list[multiprocessing.connection.Connection] = []
+        self.outboxes: list[multiprocessing.connection.Connection] = []
+        self.processes: list[multiprocessing.Process] = []
+
+        for idx in range(workers):
+            inbox_r, inbox_w = multiprocessing.Pipe(duplex=False)
+            outbox_r, outbox_w = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(
+                target=_shard_worker,
+                args=(inbox_r, outbox_w, shared_key, verify, max_age),
+                name=f"shard-{idx}",
+                daemon=True,
+            )
+            process.start()
+            inbox_r.close()
+            outbox_w.close()
+            self.inboxes.append(inbox_w)
+            self.outboxes.append(outbox_r)
+            self.processes.append(process)
+
+        self.collector = threading.Thread(target=self._collect, daemon=True)
+        self.collector.start()
+
+    def shard(self, uuid: str) -> int:
+        return zlib.crc32(uuid.encode()) % len(self.inboxes)
+
+    def submit(self, uuid: str, payload: bytes, timestamp: int | None = None) -> None:
+        if timestamp is None:
+            timestamp = int(time.time() * 1000)
+
+        shard = self.shard(uuid)
+        with self.lock:
+            pending = self.pending[shard]
+            pending.append((uuid, timestamp, payload))
+            if len(pending) >= self.batch_size:
+                self._send(shard)
+
+    def flush(self) -> None:
+        with self.lock:
+            for shard, pending in enumerate(self.pending):
+                if pending:
+                    self._send(shard)
+
+    def close(self, timeout: float | None = None) -> None:
+        self.flush()
+        with self.lock:
+            for inbox in self.inboxes:
+                inbox.send_bytes(b"")
+                inbox.close()
+        self.collector.join(timeout)
+        for process in self.processes:
+            process.join(timeout)
+
+    def _send(self, shard: int) -> None:
+        batch, self.pending[shard] = self.pending[shard], []
+        self.inboxes[shard].send_bytes(pickle.dumps(batch, pickle.HIGHEST_PROTOCOL))
+
+    def _collect(self) -> None:
+        outboxes = list(self.outboxes)
+        while outboxes:
+            for conn in multiprocessing.connection.wait(outboxes):
+                try:
+                    data = conn.recv_bytes()
+                except EOFError:
+                    outboxes.remove(conn)
+                    continue
+                for result in pickle.loads(data):
+                    self.stats.count(result.verdict)
+                    self.callback(result)
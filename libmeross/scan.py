@@ -0,0 +1,351 @@
+# Secret scanner for flash dumps and firmware partitions.
+#
+# Meross firmware stores its configuration unencrypted: Wi-Fi credentials,
+# the device key and user id, MQTT hosts, UUID and MAC address can all be
+# read from a flash dump or an extracted (decompressed) MTK partition.
+#
+# Files are memory-mapped and searched in two stages:
+#
+#   1. One regex made of the literal anchors of all patterns ('"key"',
+#      'uuid', '://', ...) runs over the whole file. Python's re compiles the
+#      alternation of literals into a single automaton, so every byte is
+#      looked at once regardless of the number of patterns.
+#   2. At each anchor the full pattern(s) of that anchor are matched.
+#
+# Anchors inside JSON objects are handed to the record decoders, which parse
+# the enclosing object and report its fields decoded (base64 Wi-Fi
+# credentials, gateway host:port). Findings of AmebaZ2 dumps carry the name of
+# the layout region (see libmeross.ambz2.image.FlashImage) they were found in.
+#
+# scan_paths() spreads files over a process pool.
+import base64
+import binascii
+import json
+import mmap
+import os
+import re
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterator
+
+from libmeross.ambz2.image import FlashImage, FlashImageError
+
+# how far a record decoder looks back for the start of a JSON object
+RECORD_LOOKBEHIND = 0x400
+RECORD_MAX_SIZE = 0x2000
+# values are cut in findings
+MAX_VALUE = 0x200
+
+SOURCE_PATTERN = "pattern"
+SOURCE_RECORD = "record"
+
+_STRING = rb'"(?P<value>[^"\x00-\x1f]{1,253})"'
+
+
+@dataclass(frozen=True)
+class Pattern:
+    kind: str
+    anchor: bytes
+    # matched at the anchor (minus offset), the group 'value' is reported
+    regex: re.Pattern
+    offset: int = 0
+    json: bool = False  # anchor is a JSON key, try the record decoders
+
+
+def _key(kind: str, *names: str, value: bytes = _STRING) -> list[Pattern]:
+    return [
+        Pattern(
+            kind,
+            f'"{name}"'.encode(),
+            re.compile(rf'"{name}"\s*:\s*'.encode() + value),
+            json=True,
+        )
+        for name in names
+    ]
+
+
+PATTERNS: list[Pattern] = [
+    *_key("key", "key"),
+    *_key("user id", "userId", value=rb'"?(?P<value>\d{1,20})'),
+    *_key("host", "host", "secondHost", "domain", "mqttDomain", "server"),
+    *_key("ssid", "ssid", "wifiSsid"),
+    *_key("password", "password", "passwd", "psk", "wifiPass"),
+    *_key("uuid", "uuid", value=rb'"(?P<value>[0-9a-fA-F]{32})"'),
+    *_key("mac", "mac", value=rb'"(?P<value>(?:[0-9A-Fa-f]{2}:){5}[0-9A-Fa-f]{2})"'),
+    # outside of JSON (key=value, C strings)
+    Pattern(
+        "uuid",
+        b"uuid",
+        re.compile(rb"uuid\s*[:=]\s*(?P<value>[0-9a-fA-F]{32})(?![0-9a-fA-F])"),
+    ),
+    # anchored at the first colon
+    Pattern(
+        "mac",
+        b":",
+        re.compile(
+            rb"(?<![0-9A-Fa-f:])(?P<value>(?:[0-9A-Fa-f]{2}:){5}[0-9A-Fa-f]{2})(?![0-9A-Fa-f:])"
+        ),
+        offset=2,
+    ),
+    # printable, without quotes, spaces and <>
+    *[
+        Pattern(
+            "url",
+            scheme,
+            re.compile(
+                rb"(?P<value>" + scheme + rb"s?://[\x21\x23-\x26\x28-\x3b\x3d\x3f-\x7e]{4,253})"
+            ),
+        )
+        for scheme in (b"mqtt", b"http", b"ws")
+    ],
+    Pattern(
+        "private key",
+        b"-----BEGIN ",
+        re.compile(rb"(?P<value>-----BEGIN (?:[A-Z]+ )?PRIVATE KEY-----)"),
+    ),
+    Pattern("certificate", b"-----BEGIN ", re.compile(rb"(?P<value>-----BEGIN CERTIFICATE-----)")),
+]
+
+
+@dataclass
+class Finding:
+    path: str
+    offset: int
+    length: int
+    kind: str
+    value: str
+    region: str | None = None
+    source: str = SOURCE_PATTERN
+
+
+class Scanner:
+    """Scanner for a fixed set of patterns; reusable for many files."""
+
+    def __init__(self, patterns: list[Pattern] = PATTERNS) -> None:
+        self.anchors: dict[bytes, list[Pattern]] = {}
+        for pattern in patterns:
+            self.anchors.setdefault(pattern.anchor, []).append(pattern)
+        # longest first, so that no anchor hides behind a shorter prefix
+        literals = sorted(self.anchors, key=len, reverse=True)
+        self.automaton = re.compile(b"|".join(re.escape(literal) for literal in literals))
+
+    def scan(
+        self,
+        data,
+        path: str = "",
+        region: Callable[[int], str | None] | None = None,
+    ) -> list[Finding]:
+        findings: dict[tuple[str, int], Finding] = {}
+        records: dict[int, int] = {}  # start -> end of decoded JSON objects
+        for anchor in self.automaton.finditer(data):
+            pos = anchor.start()
+            for pattern in self.anchors[anchor.group()]:
+                match = pattern.regex.match(data, pos - pattern.offset)
+                if match is None:
+                    continue
+                start = match.start("value")
+                if (pattern.kind, start) not in findings:
+                    findings[(pattern.kind, start)] = Finding(
+                        path,
+                        start,
+                        match.end("value") - start,
+                        pattern.kind,
+                        _text(match["value"]),
+                    )
+                if pattern.json and not any(s <= pos < e for s, e in records.items()):
+                    for finding in decode_record(data, pos, records):
+                        finding.path = path
+                        # decoded values replace the raw ones
+                        findings[(finding.kind, finding.offset)] = finding
+
+        result = sorted(findings.values(), key=lambda f: (f.offset, f.kind))
+        if region is not None:
+            for finding in result:
+                finding.region = region(finding.offset)
+        return result
+
+    def scan_file(self, path: str | Path) -> list[Finding]:
+        path = Path(path)
+        if path.stat().st_size == 0:
+            return []
+        try:
+            image = FlashImage(path)
+        except FlashImageError:
+            image = None
+        if image is not None:
+            with image:
+                # only a dump with a layout has regions
+                if image.calibration_valid and image.partition_table is not None:
+                    return self.scan(image.data, str(path), _region_name(image))
+                return self.scan(image.data, str(path))
+
+        with open(path, "rb") as fp:
+            with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return self.scan(data, str(path))
+
+
+def _region_name(image: FlashImage) -> Callable[[int], str | None]:
+    def name(offset: int) -> str | None:
+        region = image.region_at(offset)
+        return region.name if region else None
+
+    return name
+
+
+def _text(value: bytes) -> str:
+    text = bytes(value[:MAX_VALUE]).decode("utf-8", errors="backslashreplace")
+    return text if len(value) <= MAX_VALUE else text + "..."
+
+
+# --- record decoders ---
+def _b64(value: str) -> str | None:
+    try:
+        decoded = base64.b64decode(value, validate=True).decode()
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    return decoded if decoded.isprintable() else None
+
+
+# A decoder returns (kind, raw JSON value, decoded value) for every field.
+def _key_record(obj: dict) -> list[tuple[str, object, object]]:
+    # Appliance.Config.Key: {"key": ..., "userId": ..., "gateway": {...}}
+    fields = [("key", obj.get("key"), obj.get("key"))]
+    fields.append(("user id", obj.get("userId"), obj.get("userId")))
+    gateway = obj.get("gateway")
+    if isinstance(gateway, dict):
+        for host, port in (("host", "port"), ("secondHost", "secondPort")):
+            if gateway.get(host):
+                value = f"{gateway[host]}:{gateway[port]}" if port in gateway else gateway[host]
+                fields.append(("host", gateway[host], value))
+    return fields
+
+
+def _wifi_record(obj: dict) -> list[tuple[str, object, object]]:
+    # Appliance.Config.Wifi: ssid and password are base64 encoded
+    fields = []
+    for kind in ("ssid", "password"):
+        value = obj.get(kind)
+        if isinstance(value, str):
+            fields.append((kind, value, _b64(value) or value))
+    return fields
+
+
+def _device_record(obj: dict) -> list[tuple[str, object, object]]:
+    return [(kind, obj.get(kind), obj.get(kind)) for kind in ("uuid", "mac")]
+
+
+# (required keys, decoder) - the first match decodes an object
+RECORD_DECODERS: list[tuple[set[str], Callable[[dict], list]]] = [
+    ({"key", "userId"}, _key_record),
+    ({"key", "gateway"}, _key_record),
+    ({"ssid", "password"}, _wifi_record),
+    ({"uuid"}, _device_record),
+    ({"mac"}, _device_record),
+]
+
+
+def _objects(obj: dict) -> Iterator[dict]:
+    yield obj
+    for value in obj.values():
+        if isinstance(value, dict):
+            yield from _objects(value)
+
+
+def decode_record(data, pos: int, records: dict[int, int]) -> list[Finding]:
+    """Decode the outermost JSON object around *pos* with RECORD_DECODERS.
+
+    Decoded objects are added to *records* (start -> end).
+    """
+    low = max(0, pos - RECORD_LOOKBEHIND)
+    window = bytes(data[low : pos + RECORD_MAX_SIZE])
+    # latin-1 keeps byte offsets, strings are re-decoded below
+    text = window.decode("latin-1")
+    decoder = json.JSONDecoder()
+    found, idx = None, pos - low
+    while (idx := text.rfind("{", 0, idx)) != -1:
+        try:
+            obj, end = decoder.raw_decode(text, idx)
+        except ValueError:
+            continue
+        if isinstance(obj, dict) and end > pos - low:
+            found = (idx, end, obj)
+    if found is None:
+        return []
+
+    start, end, obj = found
+    records[low + start] = low + end
+    findings = []
+    for item in _objects(obj):
+        for keys, decode in RECORD_DECODERS:
+            if keys <= item.keys():
+                for kind, raw, value in decode(item):
+                    if value in (None, "") or isinstance(value, (dict, list)):
+                        continue
+                    findings.append(_record_finding(window, low, start, end, kind, raw, value))
+                break
+    return findings
+
+
+def _record_finding(
+    window: bytes, low: int, start: int, end: int, kind: str, raw, value
+) -> Finding:
+    # position of the raw value within the object
+    raw = json.dumps(raw, ensure_ascii=False).encode("latin-1", errors="replace")
+    offset = window.find(raw, start, end)
+    if offset == -1:
+        offset, length = start, end - start
+    else:
+        quoted = raw.startswith(b'"')
+        offset, length = offset + quoted, len(raw) - 2 * quoted
+    return Finding("", low + offset, length, kind, _utf8(str(value)), source=SOURCE_RECORD)
+
+
+def _utf8(value: str) -> str:
+    try:
+        return value.encode("latin-1").decode("utf-8")
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return value
+
+
+# --- files ---
+def collect_files(paths: list[Path]) -> list[Path]:
+    files = []
+    for path in paths:
+        if path.is_dir():
+            files += sorted(p for p in path.rglob("*") if p.is_file())
+        else:
+            files.append(path)
+    return files
+
+
+_scanner: Scanner | None = None
+
+
+def _scan_worker(path: Path) -> tuple[Path, list[Finding] | str]:
+    global _scanner
+    if _scanner is None:
+        _scanner = Scanner()
+    try:
+        return path, _scanner.scan_file(path)
+    except (OSError, ValueError) as e:
+        return path, str(e)
+
+
+def scan_paths(
+    paths: list[Path], workers: int | None = None
+) -> Iterator[tuple[Path, list[Finding] | str]]:
+    """(file, findings or error message) for every file, in order.
+
+    Directories are scanned recursively; with more than one worker the files
+    are spread over a process pool.
+    """
+    files = collect_files(paths)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(files) < 2:
+        yield from map(_scan_worker, files)
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(files))) as executor:
+        chunksize = max(1, len(files) // (workers * 4))
+        yield from executor.map(_scan_worker, files, chunksize=chunksize)
@@ -0,0 +1,411 @@
+# Append-only storage for device telemetry (PUSH messages, polled state).
+#
+# A telemetry directory contains segments, each made of two append-only files:
+#
+#   <first-ts>.seg   SegmentHeader + Block*
+#   <first-ts>.idx   one JSON line per block (offset, time range, uuids, namespaces)
+#
+# A block stores up to N records in a compressed body. Inside a block all
+# strings that repeat (device UUIDs, namespaces, methods and payload keys) are
+# dictionary-encoded, which keeps the body small even before compression. The
+# index file is the time index of the segment: queries only decompress blocks
+# whose time range, UUIDs and namespaces match. If the index is missing (e.g.
+# after a crash) it is rebuilt from the block headers.
+import json
+import lzma
+import struct
+import threading
+import time
+import zlib
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterator
+
+from libmeross.util import logger
+
+SEGMENT_MAGIC = b"MTLS"
+SEGMENT_VERSION = 1
+BLOCK_MAGIC = b"MTLB"
+
+COMPRESSION_ZLIB = 0
+COMPRESSION_LZMA = 1
+COMPRESSION = {"zlib": COMPRESSION_ZLIB, "lzma": COMPRESSION_LZMA}
+
+# magic, version, compression, reserved, created (ms)
+SegmentHeader = struct.Struct("<4sBBHq")
+# magic, compressed size, raw size, record count, first ts, last ts, crc32
+BlockHeader = struct.Struct("<4sIIIqqI")
+
+DEFAULT_BLOCK_RECORDS = 1024
+DEFAULT_FLUSH_INTERVAL = 5.0
+DEFAULT_SEGMENT_SIZE = 64 * 1024 * 1024
+DEFAULT_SEGMENT_AGE = 24 * 60 * 60
+
+
+class TelemetryError(Exception):
+    pass
+
+
+@dataclass
+class Record:
+    timestamp: int  # milliseconds
+    uuid: str
+    namespace: str
+    method: str
+    payload: Any
+
+
+@dataclass
+class BlockIndex:
+    offset: int
+    first: int
+    last: int
+    count: int
+    uuids: list[str]
+    namespaces: list[str]
+
+
+# --- dictionary encoding ---
+class _Dictionary:
+    def __init__(self) -> None:
+        self.values: list[str] = []
+        self.ids: dict[str, int] = {}
+
+    def id(self, value: str) -> int:
+        idx = self.ids.get(value)
+        if idx is None:
+            idx = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return idx
+
+
+def _encode_value(value: Any, table: _Dictionary) -> Any:
+    if isinstance(value, dict):
+        return {str(table.id(k)): _encode_value(v, table) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_encode_value(v, table) for v in value]
+    return value
+
+
+def _decode_value(value: Any, table: list[str]) -> Any:
+    if isinstance(value, dict):
+        return {table[int(k)]: _decode_value(v, table) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decode_value(v, table) for v in value]
+    return value
+
+
+def _compress(data: bytes, compression: int) -> bytes:
+    if compression == COMPRESSION_LZMA:
+        return lzma.compress(data, preset=6)
+    return zlib.compress(data, 6)
+
+
+def _decompress(data: bytes, compression: int) -> bytes:
+    if compression == COMPRESSION_LZMA:
+        return lzma.decompress(data)
+    return zlib.decompress(data)
+
+
+def encode_block(records: list[Record], compression: int) -> tuple[bytes, BlockIndex]:
+    table = _Dictionary()
+    base = records[0].timestamp
+    rows = [
+        [
+            record.timestamp - base,
+            table.id(record.uuid),
+            table.id(record.namespace),
+            table.id(record.method),
+            _encode_value(record.payload, table),
+        ]
+        for record in records
+    ]
+    raw = json.dumps({"d": table.values, "b": base, "r": rows}, separators=(",", ":"))
+    raw = raw.encode()
+    body = _compress(raw, compression)
+    first = min(record.timestamp for record in records)
+    last = max(record.timestamp for record in records)
+    header = BlockHeader.pack(
+        BLOCK_MAGIC, len(body), len(raw), len(records), first, last, zlib.crc32(body)
+    )
+    index = BlockIndex(
+        offset=0,
+        first=first,
+        last=last,
+        count=len(records),
+        uuids=sorted({record.uuid for record in records}),
+        namespaces=sorted({record.namespace for record in records}),
+    )
+    return header + body, index
+
+
+def decode_block(body: bytes, compression: int) -> Iterator[Record]:
+    data = json.loads(_decompress(body, compression))
+    table, base = data["d"], data["b"]
+    for delta, uuid, namespace, method, payload in data["r"]:
+        yield Record(
+            timestamp=base + delta,
+            uuid=table[uuid],
+            namespace=table[namespace],
+            method=table[method],
+            payload=_decode_value(payload, table),
+        )
+
+
+# --- writer ---
+class TelemetryWriter:
+    def __init__(
+        self,
+        directory: str | Path,
+        compression: str = "zlib",
+        block_records: int = DEFAULT_BLOCK_RECORDS,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        segment_size: int = DEFAULT_SEGMENT_SIZE,
+        segment_age: float = DEFAULT_SEGMENT_AGE,
+        retention: float | None = None,
+        max_segments: int | None = None,
+    ) -> None:
+        if compression not in COMPRESSION:
+            raise TelemetryError(f"Unknown compression: {compression}")
+
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.compression = COMPRESSION[compression]
+        self.block_records = block_records
+        self.flush_interval = flush_interval
+        self.segment_size = segment_size
+        self.segment_age = segment_age
+        self.retention = retention
+        self.max_segments = max_segments
+
+        self.lock = threading.Lock()
+        self.pending: list[Record] = []
+        self.pending_since = 0.0
+        self.segment = None
+        self.index = None
+        self.segment_created = 0.0
+        self.records_written = 0
+
+    def append(
+        self,
+        uuid: str,
+        namespace: str,
+        method: str,
+        payload: Any,
+        timestamp: int | None = None,
+    ) -> None:
+        if timestamp is None:
+            timestamp = int(time.time() * 1000)
+
+        with self.lock:
+            if not self.pending:
+                self.pending_since = time.monotonic()
+            self.pending.append(Record(timestamp, uuid, namespace, method, payload))
+            if len(self.pending) >= self.block_records:
+                self._flush()
+
+    def append_message(self, uuid: str, message) -> None:
+        # message is a protocol.LocalMessage; the header timestamp has
+        # second precision only, so the local receive time is used instead
+        header = message.header
+        self.append(uuid, header.namespace, header.method, message.payload)
+
+    def tick(self) -> None:
+        # called periodically to flush partially filled blocks
+        with self.lock:
+            if self.pending and time.monotonic() - self.pending_since >= self.flush_interval:
+                self._flush()
+
+    def flush(self) -> None:
+        with self.lock:
+            self._flush()
+
+    def close(self) -> None:
+        with self.lock:
+            self._flush()
+            self._close_segment()
+
+    # --- internal ---
+    def _flush(self) -> None:
+        if not self.pending:
+            return
+
+        records, self.pending = self.pending, []
+        if self.segment is None or self._should_rotate():
+            self._rotate(records[0].timestamp)
+
+        data, index = encode_block(records, self.compression)
+        index.offset = self.segment.tell()
+        self.segment.write(data)
+        self.segment.flush()
+        self.index.write(json.dumps(index.__dict__, separators=(",", ":")) + "\n")
+        self.index.flush()
+        self.records_written += len(records)
+
+    def _should_rotate(self) -> bool:
+        return (
+            self.segment.tell() >= self.segment_size
+            or time.monotonic() - self.segment_created >= self.segment_age
+        )
+
+    def _rotate(self, timestamp: int) -> None:
+        self._close_segment()
+        name = f"{timestamp:013d}"
+        path = self.directory / f"{name}.seg"
+        # two segments started within the same millisecond
+        while path.exists():
+            timestamp += 1
+            name = f"{timestamp:013d}"
+            path = self.directory / f"{name}.seg"
+
+        logger.debug(f"Starting new telemetry segment {path}")
+        self.segment = open(path, "ab")
+        self.segment.write(
+            SegmentHeader.pack(
+                SEGMENT_MAGIC, SEGMENT_VERSION, self.compression, 0, timestamp
+            )
+        )
+        self.index = open(self.directory / f"{name}.idx", "a")
+        self.segment_created = time.monotonic()
+        self._apply_retention()
+
+    def _close_segment(self) -> None:
+        if self.segment is not None:
+            self.segment.close()
+            self.index.close()
+            self.segment = self.index = None
+
+    def _apply_retention(self) -> None:
+        segments = list_segments(self.directory)
+        # never delete the active segment; it is not necessarily the last one
+        # by name (the clock may step back, timestamps may be given explicitly)
+        active = Path(self.segment.name) if self.segment is not None else None
+        candidates = [path for path in segments if path != active]
+        expired = []
+        if self.max_segments is not None and len(segments) > self.max_segments:
+            expired += candidates[: len(segments) - self.max_segments]
+        if self.retention is not None:
+            limit = int((time.time() - self.retention) * 1000)
+            for path in candidates:
+                last = _segment_last_timestamp(path)
+                if last is not None and last < limit and path not in expired:
+                    expired.append(path)
+
+        for path in expired:
+            logger.debug(f"Removing expired telemetry segment {path}")
+            for suffix in (".seg", ".idx"):
+                try:
+                    path.with_suffix(suffix).unlink()
+                except FileNotFoundError:
+                    pass
+
+
+# --- reader ---
+def list_segments(directory: str | Path) -> list[Path]:
+    return sorted(Path(directory).glob("*.seg"))
+
+
+def _segment_last_timestamp(path: Path) -> int | None:
+    blocks = read_index(path)
+    return max((block.last for block in blocks), default=None)
+
+
+def read_index(path: Path) -> list[BlockIndex]:
+    index_path = path.with_suffix(".idx")
+    blocks = []
+    try:
+        with open(index_path, "r") as fp:
+            for line in fp:
+                try:
+                    blocks.append(BlockIndex(**json.loads(line)))
+                except (json.JSONDecodeError, TypeError):
+                    # torn write at the end of the index
+                    break
+    except FileNotFoundError:
+        return rebuild_index(path)
+    return blocks
+
+
+def rebuild_index(path: Path) -> list[BlockIndex]:
+    blocks = []
+    with open(path, "rb") as fp:
+        compression = _read_segment_header(fp, path)
+        while header := fp.read(BlockHeader.size):
+            if len(header) < BlockHeader.size:
+                break
+            magic, size, _, count, first, last, crc = BlockHeader.unpack(header)
+            offset = fp.tell() - BlockHeader.size
+            body = fp.read(size)
+            if magic != BLOCK_MAGIC or len(body) < size or zlib.crc32(body) != crc:
+                logger.warning(f"Truncated or corrupt block in {path} at {offset:#x}")
+                break
+            records = list(decode_block(body, compression))
+            blocks.append(
+                BlockIndex(
+                    offset=offset,
+                    first=first,
+                    last=last,
+                    count=count,
+                    uuids=sorted({record.uuid for record in records}),
+                    namespaces=sorted({record.namespace for record in records}),
+                )
+            )
+    return blocks
+
+
+def _read_segment_header(fp, path: Path) -> int:
+    data = fp.read(SegmentHeader.size)
+    if len(data) < SegmentHeader.size:
+        raise TelemetryError(f"Truncated segment: {path}")
+    magic, version, compression, _, _ = SegmentHeader.unpack(data)
+    if magic != SEGMENT_MAGIC or version != SEGMENT_VERSION:
+        raise TelemetryError(f"Not a telemetry segment: {path}")
+    return compression
+
+
+def query(
+    directory: str | Path,
+    uuid: str | None = None,
+    namespace: str | None = None,
+    since: int | None = None,
+    until: int | None = None,
+) -> Iterator[Record]:
+    for path in list_segments(directory):
+        blocks = [
+            block
+            for block in read_index(path)
+            if (since is None or block.last >= since)
+            and (until is None or block.first <= until)
+            and (uuid is None or uuid in block.uuids)
+            and (namespace is None or namespace in block.namespaces)
+        ]
+        if not blocks:
+            continue
+
+        with open(path, "rb") as fp:
+            compression = _read_segment_header(fp, path)
+            for block in blocks:
+                fp.seek(block.offset)
+                magic, size, *_, crc = BlockHeader.unpack(fp.read(BlockHeader.size))
+                body = fp.read(size)
+                if magic != BLOCK_MAGIC or zlib.crc32(body) != crc:
+                    logger.warning(f"Skipping corrupt block in {path} at {block.offset:#x}")
+                    continue
+
+                for record in decode_block(body, compression):
+                    if (
+                        (uuid is None or record.uuid == uuid)
+                        and (namespace is None or record.namespace == namespace)
+                        and (since is None or record.timestamp >= since)
+                        and (until is None or record.timestamp <= until)
+                    ):
+                        yield record
+
+
+def uuid_from_topic(topic: str) -> str | None:
+    # /appliance/<uuid>/publish
+    parts = topic.split("/")
+    if len(parts) >= 3 and parts[1] == "appliance":
+        return parts[2]
+    return None
@@ -0,0 +1,80 @@
+import hashlib
+
+import pytest
+
+from caterpillar.py import pack
+
+from libmeross.ambz2.layout import (
+    CALIBRATION_PATTERN,
+    HASH_KEY,
+    Header,
+    ImageType,
+    PartitionTable,
+    PartitionTableInfo,
+    PartitionTableRecord,
+    PartitionType,
+)
+
+DUMP_SIZE = 0x200000
+BOOT = (0x4000, 0xC000)
+FW1 = (0x10000, 0x80000)
+FW2 = (0x90000, 0x80000)
+
+
+def build_partition_table() -> PartitionTable:
+    table = PartitionTable(
+        hdr=Header(
+            segment_size=0,
+            type=ImageType.PARTAB,
+            encrypted=False,
+            is_special=True,
+            serial=0,
+        ),
+        info=PartitionTableInfo(
+            eFWV=0,
+            num=2,
+            fw1_idx=1,
+            fw2_idx=2,
+            user_len=0,
+            boot_record=PartitionTableRecord(start=BOOT[0], length=BOOT[1], type=PartitionType.BOOT),
+            records=[
+                PartitionTableRecord(start=FW1[0], length=FW1[1], type=PartitionType.FW1),
+                PartitionTableRecord(start=FW2[0], length=FW2[1], type=PartitionType.FW2),
+            ],
+            user_data=b"",
+        ),
+    )
+    table.set_segment_size()
+    table.build_hash(HASH_KEY)
+    return table
+
+
+def build_image(data: bytearray, offset: int, headers: list[tuple[ImageType, int]]) -> None:
+    # public keys, then header + segment + SHA-256 for every segment
+    start, pos = offset, offset + 0x40
+    for idx, (image_type, size) in enumerate(headers):
+        end = pos + 0x60 + size
+        header = Header(
+            segment_size=size,
+            next_=end + 32 - pos if idx < len(headers) - 1 else 0xFFFFFFFF,
+            type=image_type,
+            encrypted=False,
+            is_special=False,
+            serial=idx,
+        )
+        data[pos : pos + 0x60] = pack(header)
+        data[end : end + 32] = hashlib.sha256(data[start:end]).digest()
+        start = pos = end + 32
+
+
+@pytest.fixture
+def flash_dump(tmp_path):
+    data = bytearray(b"\xff" * DUMP_SIZE)
+    data[:16] = CALIBRATION_PATTERN
+    table = pack(build_partition_table())
+    data[0x20 : 0x20 + len(table)] = table
+    build_image(data, BOOT[0], [(ImageType.BOOT, 0x3000)])
+    build_image(data, FW1[0], [(ImageType.FWHS_S, 0x8000), (ImageType.XIP, 0x40000)])
+    path = tmp_path / "flash.bin"
+    path.write_bytes(data)
+    return path
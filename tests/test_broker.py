@@ -0,0 +1,159 @@
+import asyncio
+
+from libmeross import broker as mb
+from libmeross.mqtt import generate_app_password, generate_password, verify_password
+
+KEY = "secret"
+USER_ID = "1000"
+MAC = "48:e1:e9:00:00:01"
+
+
+def test_verify_password() -> None:
+    device = generate_password(USER_ID, MAC, KEY)
+    assert verify_password(MAC, device, KEY)
+    assert verify_password(MAC, device, KEY, USER_ID)
+    assert not verify_password(MAC, device, KEY, "1001")
+    assert not verify_password(MAC, device, "other")
+    assert not verify_password("48:e1:e9:00:00:02", device, KEY)
+
+    app = generate_app_password(USER_ID, KEY)
+    assert verify_password(USER_ID, app, KEY)
+    assert not verify_password("1001", app, KEY, USER_ID)
+
+    # without a key, everyone can compute md5(<username>)
+    assert not verify_password(MAC, generate_password(USER_ID, MAC), None)
+    assert not verify_password(USER_ID, generate_app_password(USER_ID), "")
+    assert verify_password(MAC, generate_password(USER_ID, MAC), None, USER_ID)
+
+
+class Client:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.reader = reader
+        self.writer = writer
+
+    async def packet(self) -> tuple[int, bytes]:
+        header = (await self.reader.readexactly(1))[0]
+        length, shift = 0, 0
+        while True:
+            byte = (await self.reader.readexactly(1))[0]
+            length |= (byte & 0x7F) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+        return header, await self.reader.readexactly(length)
+
+    async def publishes(self, timeout: float = 0.2) -> list[tuple[str, bytes]]:
+        received = []
+        while True:
+            try:
+                header, body = await asyncio.wait_for(self.packet(), timeout)
+            except asyncio.TimeoutError:
+                return received
+            assert header & 0xF0 == mb.PUBLISH
+            length = int.from_bytes(body[:2], "big")
+            received.append((body[2 : 2 + length].decode(), body[2 + length :]))
+
+    def send(self, data: bytes) -> None:
+        self.writer.write(data)
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+async def connect(port: int, username: str | None, password: str | None):
+    client = Client(*await asyncio.open_connection("127.0.0.1", port))
+    client.send(mb.encode_connect(f"client-{username}", username, password))
+    header, body = await client.packet()
+    assert header == mb.CONNACK
+    return client, body[1]
+
+
+def run_broker(test, **kwargs) -> None:
+    async def main():
+        broker = mb.Broker(KEY, **kwargs)
+        server = await broker.serve("127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            await test(broker, port)
+        finally:
+            server.close()
+            broker._keepalive_task.cancel()
+
+    asyncio.run(main())
+
+
+def test_connect_auth() -> None:
+    async def test(broker, port):
+        client, code = await connect(port, MAC, generate_password(USER_ID, MAC, KEY))
+        assert code == mb.RC_ACCEPTED
+        client.close()
+        client, code = await connect(port, USER_ID, generate_app_password(USER_ID, KEY))
+        assert code == mb.RC_ACCEPTED
+        client.close()
+
+        _, code = await connect(port, MAC, generate_password(USER_ID, MAC, "other"))
+        assert code == mb.RC_BAD_CREDENTIALS
+        _, code = await connect(port, MAC, generate_password("1001", MAC, KEY))
+        assert code == mb.RC_BAD_CREDENTIALS
+        _, code = await connect(port, None, None)
+        assert code == mb.RC_NOT_AUTHORIZED
+        assert broker.stats.rejected == 3
+
+    run_broker(test, user_id=USER_ID)
+
+
+def test_routing() -> None:
+    topics = ["/appliance/a/subscribe", "/appliance/b/subscribe", "/app/1000/subscribe"]
+
+    async def test(broker, port):
+        clients = {}
+        for name, topic_filter in (
+            ("exact", topics[0]),
+            ("plus", "/appliance/+/subscribe"),
+            ("multi", "/appliance/#"),
+            ("all", "#"),
+        ):
+            mac = f"48:e1:e9:00:00:{len(clients):02x}"
+            client, code = await connect(port, mac, generate_password(USER_ID, mac, KEY))
+            assert code == mb.RC_ACCEPTED
+            client.send(mb.encode_subscribe(1, [(topic_filter, 0)]))
+            assert (await client.packet())[0] == mb.SUBACK
+            clients[name] = client
+
+        for topic in topics:
+            clients["exact"].send(mb.encode_publish(topic, topic.encode()))
+        received = {name: [t for t, _ in await c.publishes()] for name, c in clients.items()}
+        assert received == {
+            "exact": topics[:1],
+            "plus": topics[:2],
+            "multi": topics[:2],
+            "all": topics,
+        }
+
+        # unsubscribed filters receive nothing
+        body = b"\x00\x02" + mb.encode_string("/appliance/+/subscribe")
+        clients["plus"].send(mb.encode_packet(mb.UNSUBSCRIBE | 0x02, body))
+        assert (await clients["plus"].packet())[0] == mb.UNSUBACK
+        clients["all"].send(mb.encode_publish(topics[1], b"{}", qos=1, packet_id=7))
+        assert await clients["plus"].publishes() == []
+        assert await clients["multi"].publishes() == [(topics[1], b"{}")]
+        for client in clients.values():
+            client.close()
+
+    run_broker(test)
+
+
+def test_repeated_subscribe() -> None:
+    broker = mb.Broker(KEY)
+    client = mb.MQTTProtocol(broker)
+    assert broker.subscribe(client, "/appliance/+/subscribe", 0)
+    assert broker.subscribe(client, "/appliance/+/subscribe", 1)
+    assert broker.subscribe(client, "/appliance/a/subscribe", 0)
+    assert not broker.subscribe(client, "/appliance/#/x", 0)
+    assert broker.wildcard_count == 1
+
+    broker.unsubscribe(client, "/appliance/+/subscribe")
+    broker.unsubscribe(client, "/appliance/+/subscribe")
+    broker.unsubscribe(client, "/appliance/a/subscribe")
+    assert broker.wildcard_count == 0
+    assert not broker.exact and not broker.wildcards.root.children
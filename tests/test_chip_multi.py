@@ -0,0 +1,44 @@
+from argparse import Namespace
+from pathlib import Path
+
+from libmeross.commands.chip.amebaz2.multi import device_ids, port_path, resolve_ports
+
+
+def test_port_path() -> None:
+    assert port_path(Path("out/dump.bin"), "/dev/ttyUSB0") == Path("out/dump-ttyUSB0.bin")
+    assert port_path(Path("{port}.bin"), "/dev/ttyUSB1") == Path("ttyUSB1.bin")
+    assert port_path(None, "/dev/ttyUSB0") is None
+
+
+def test_resolve_ports() -> None:
+    assert resolve_ports("/dev/ttyUSB0,/dev/ttyUSB1,") == ["/dev/ttyUSB0", "/dev/ttyUSB1"]
+
+
+def test_device_ids() -> None:
+    data = (
+        b"\xff" * 16
+        + b'{"uuid":"0123456789ABCDEF0123456789abcdef","mac":"48:E1:E9:01:02:03"}'
+    )
+    assert device_ids(data) == ("48:e1:e9:01:02:03", "0123456789abcdef0123456789abcdef")
+    assert device_ids(b"\xff" * 64) == (None, None)
+
+
+class FakePort:
+    baudrate = 115200
+    closed = False
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def test_port_closed_on_failed_handshake(monkeypatch) -> None:
+    from libmeross.commands.chip.amebaz2 import read, write
+
+    argv = Namespace(port="/dev/ttyUSB0", assume_download=False)
+    for module in (read, write):
+        port = FakePort()
+        monkeypatch.setattr(module, "open_serial", lambda *args, **kwargs: port)
+        monkeypatch.setattr(module, "init_fallback_connection", lambda *args: False)
+        monkeypatch.setattr(write, "_read_image", lambda argv: b"\xff" * 64)
+        assert not module._run(argv).success
+        assert port.closed, module.__name__
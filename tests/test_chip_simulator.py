@@ -0,0 +1,156 @@
+import io
+import random
+import subprocess
+import sys
+import time
+
+import pytest
+import serial
+
+from rich.console import Console
+
+from libmeross.commands.chip.amebaz2.download import (
+    FlashHash,
+    VerifiedReader,
+    changed_sectors,
+    enter_download_mode,
+    escalate_baudrate,
+    flash_write,
+)
+from libmeross.commands.chip.amebaz2.dump import ChunkedReader, read_memory
+from libmeross.commands.chip.amebaz2.script import ScriptRunner, load_script
+from libmeross.commands.chip.amebaz2.session import SessionPort
+from libmeross.commands.chip.amebaz2.transport import SerialTransport
+from libmeross.commands.chip.amebaz2.util import command, init_fallback_connection
+
+# the simulator needs a pty
+pytest.importorskip("termios")
+
+from libmeross.commands.chip.amebaz2.simulator import ChipSimulator  # noqa: E402
+
+FLASH = random.Random(1).randbytes(0x20000)
+
+
+def open_chip(simulator, fallback: bool = True) -> SerialTransport:
+    ser = SerialTransport(serial.Serial(simulator.port, 115200, timeout=0.2))
+    if fallback:
+        assert init_fallback_connection(ser, Console())
+    return ser
+
+
+def test_fallback_console() -> None:
+    with ChipSimulator(FLASH, throttle=False, faults=[(0x98010000, 0x98011000)]) as sim:
+        ser = open_chip(sim)
+        assert "98000000: f5 b1 65 22" in command(ser, "DB 98000000 16")
+        assert read_memory(ser, 0x98000100, 0x100) == FLASH[0x100:0x200]
+        assert read_memory(ser, 0x98000100, 0x100, words=True) == FLASH[0x100:0x200]
+        # the last line of a partial dump ends with the ASCII column
+        for length in (0x14, 0x11, 0x1F):
+            assert read_memory(ser, 0x98000000, length) == FLASH[:length]
+        assert read_memory(ser, 0x98000000, 0x14, words=True) == FLASH[:0x14]
+
+        # the chip hangs after a bus fault until it is reset
+        assert command(ser, "DB 98010000 16") is None
+        assert sim.state == "fault"
+        sim.reset()
+        assert init_fallback_connection(ser, Console())
+        ser.close()
+
+
+def test_download_mode_read() -> None:
+    with ChipSimulator(FLASH, throttle=False, max_baudrate=921600, seed=0) as sim:
+        ser = open_chip(sim)
+        enter_download_mode(ser)
+        assert sim.state == "download"
+        assert escalate_baudrate(ser, (1500000, 921600)) == 921600
+
+        # corrupted lines are caught by the hash check and read again
+        sim.corrupt_rate = 0.001
+        output = io.BytesIO()
+        reader = ChunkedReader(ser, 0x2000, reader=VerifiedReader(ser), prompt=False)
+        assert reader.read(0x98000000, len(FLASH), output)
+        assert output.getvalue() == FLASH
+        ser.close()
+
+
+def test_download_mode_write() -> None:
+    with ChipSimulator(FLASH, throttle=False) as sim:
+        ser = open_chip(sim)
+        enter_download_mode(ser)
+
+        image = bytearray(FLASH[:0x8000])
+        image[0x1234] ^= 0xFF
+        image[0x5000:0x5100] = bytes(0x100)
+        flash_hash = FlashHash(ser)
+        assert changed_sectors(flash_hash, 0, image) == [1, 5]
+
+        for sector in (1, 5):
+            data = bytes(image[sector * 0x1000 : (sector + 1) * 0x1000])
+            assert flash_write(flash_hash, sector * 0x1000, data)
+        assert changed_sectors(flash_hash, 0, image) == []
+        assert sim.flash[:0x8000] == image
+        ser.close()
+
+
+def test_console_script() -> None:
+    script = "# patch\n" + "".join(f"EW {0x10001000 + i * 4:X} {i:08X}\n" for i in range(32))
+    script += "DB 98000000 32\nFOO\nDW 98000010 4\nDB 98010000 4\nDB 98000000 4\n"
+    with ChipSimulator(FLASH, throttle=False, faults=[(0x98010000, 0x98011000)]) as sim:
+        ser = open_chip(sim)
+        results = load_script(script)
+        assert not ScriptRunner(ser, on_error="continue", timeout=0.5).run(results)
+        assert sim.read(0x10001000, 32 * 4) == b"".join(i.to_bytes(4, "little") for i in range(32))
+        assert [r.status for r in results[32:]] == ["ok", "error", "ok", "fault", "skipped"]
+        assert results[32].data == FLASH[:32].hex()
+        assert results[34].data == FLASH[16:32].hex()
+
+        # invalid commands stop the script before anything is sent
+        results = load_script("EW 10001004 FF\nDB 98000000 xyz\n")
+        sim.reset()
+        assert init_fallback_connection(ser, Console())
+        assert not ScriptRunner(ser).run(results)
+        assert [r.status for r in results] == ["skipped", "invalid"]
+        assert sim.read(0x10001004, 4) == (1).to_bytes(4, "little")
+        ser.close()
+
+
+def test_session(tmp_path) -> None:
+    path = tmp_path / "session.sock"
+    with ChipSimulator(FLASH, throttle=False) as sim:
+        daemon = subprocess.Popen(
+            [sys.executable, "-m", "libmeross", "chip", "amebaz2", "serve"]
+            + ["--port", sim.port, "--socket", str(path)]
+        )
+        try:
+            while not path.exists():
+                assert daemon.poll() is None
+                time.sleep(0.05)
+
+            for _ in range(2):
+                ser = SerialTransport(SessionPort(path, timeout=0.2))
+                assert ser.ser.state == "fallback"
+                # no handshake, the daemon keeps the chip at the prompt
+                assert init_fallback_connection(ser, Console())
+                assert read_memory(ser, 0x98000100, 0x100) == FLASH[0x100:0x200]
+                ser.close()
+
+            # the next client gets the chip in the mode the last one left it
+            ser = SerialTransport(SessionPort(path, timeout=0.2))
+            enter_download_mode(ser)
+            assert escalate_baudrate(ser, (921600,)) == 921600
+            ser.close()
+            ser = SerialTransport(SessionPort(path, timeout=0.2))
+            assert ser.ser.state == "download" and ser.baudrate == 115200
+            assert read_memory(ser, 0x98000000, 0x40, prompt=False) == FLASH[:0x40]
+            ser.close()
+        finally:
+            daemon.terminate()
+            daemon.wait()
+
+
+def test_session_unsupported(tmp_path, monkeypatch) -> None:
+    from libmeross.commands.chip.amebaz2 import session
+
+    monkeypatch.setattr(session, "SESSIONS_SUPPORTED", False)
+    with pytest.raises(session.SessionError, match="Unix sockets"):
+        SessionPort(tmp_path / "session.sock")
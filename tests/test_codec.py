@@ -0,0 +1,82 @@
+import random
+
+import pytest
+
+from caterpillar.py import pack, unpack
+
+from libmeross.ambz2.codec import Codec, CodecError
+from libmeross.ambz2.layout import (
+    HEADER_CODEC,
+    RECORD_CODEC,
+    Header,
+    ImageType,
+    PartitionTable,
+    PartitionTableInfo,
+    PartitionTableRecord,
+    PartitionType,
+    pack_info,
+    pack_partition_table,
+    unpack_partition_table,
+)
+
+from conftest import build_partition_table
+
+
+def test_fixed_structs() -> None:
+    rng = random.Random(1)
+    for model, codec in ((Header, HEADER_CODEC), (PartitionTableRecord, RECORD_CODEC)):
+        assert codec.size == len(pack(unpack(model, bytes(0x60))))
+        for _ in range(200):
+            data = rng.randbytes(codec.size)
+            expected = unpack(model, data)
+            decoded = codec.unpack(data)
+            assert vars(decoded) == vars(expected)
+            assert codec.pack(decoded) == pack(expected)
+
+
+def test_unknown_enum() -> None:
+    data = bytearray(pack(build_partition_table().hdr))
+    data[8] = 0x33
+    header = HEADER_CODEC.unpack(data)
+    assert header.type == unpack(Header, bytes(data)).type == 0x33
+    assert not isinstance(header.type, ImageType)
+    assert HEADER_CODEC.pack(header) == bytes(data)
+
+
+def test_partition_table() -> None:
+    table = build_partition_table()
+    table.info.user_data = b"\x01\x02\x03"
+    table.info.user_len = 3
+    table.info.records.append(
+        PartitionTableRecord(
+            start=0x1000,
+            length=0x2000,
+            type=PartitionType.USER,
+            hkey_valid=True,
+            hash_key=b"\x11" * 32,
+        )
+    )
+    table.info.num = 3
+    data = pack(table)
+    assert pack_info(table.info) == pack(table.info)
+    assert pack_partition_table(table) == data
+
+    decoded = unpack_partition_table(data + b"\xff" * 0x100)
+    expected = unpack(PartitionTable, data)
+    assert vars(decoded.info) == vars(expected.info)
+    assert vars(decoded.hdr) == vars(expected.hdr)
+    assert pack_partition_table(decoded) == data
+
+    with pytest.raises(CodecError):
+        unpack_partition_table(b"\xff" * 0x1000)
+
+
+def test_dynamic_struct() -> None:
+    with pytest.raises(CodecError):
+        Codec(PartitionTableInfo)
+    codec = Codec(PartitionTableInfo, prefix=True)
+    assert codec.tail == ["boot_record", "records", "user_data"]
+    with pytest.raises(CodecError):
+        codec.unpack(bytes(0x100))
+    with pytest.raises(CodecError):
+        HEADER_CODEC.unpack(bytes(0x20))
@@ -0,0 +1,212 @@
+import io
+import json
+
+from argparse import Namespace
+
+from libmeross.commands.cloud.devices import add_
+from libmeross.model import OriginDevice
+
+KEY = "secret"
+USER_ID = "1000"
+
+
+def local_config(idx: int, mac: str | None = None) -> dict:
+    return {
+        "firmware": {
+            "version": "6.1.8",
+            "compileTime": "2023/01/01 00:00:00",
+            "wifiMac": "aa:bb:cc:dd:ee:ff",
+            "innerIp": "192.168.1.10",
+            "server": "iot.meross.com",
+            "port": 443,
+            "userId": 2000,
+        },
+        "hardware": {
+            "type": "mss310",
+            "subType": "un",
+            "version": "6.0.0",
+            "chipType": "rtl8720cf",
+            "uuid": f"{idx:032x}",
+            "macAddress": mac or f"48:e1:e9:00:00:{idx:02x}",
+        },
+    }
+
+
+def arguments(**kwargs) -> Namespace:
+    options = dict(
+        key=KEY,
+        token="token",
+        user_id=USER_ID,
+        mqtt_domain="mqtt.example.com",
+        no_privacy=False,
+        timeout=1,
+        concurrency=4,
+        bulk=None,
+        report=None,
+    )
+    options.update(kwargs)
+    return Namespace(**options)
+
+
+def run_bulk(tmp_path, records: list, **kwargs) -> list[dict]:
+    path = tmp_path / "devices.json"
+    path.write_text(json.dumps(records))
+    report = tmp_path / "report.json"
+    with open(path) as bulk, open(report, "w") as output:
+        add_.cli_bulk(arguments(bulk=bulk, report=output, **kwargs))
+    return json.loads(report.read_text() or "null")
+
+
+def test_load_bulk_records() -> None:
+    records = [{"uuid": "a", "deviceIp": "10.0.0.1"}, {"localConfig": "a.json"}]
+    loaded = add_._load_bulk_records(io.StringIO(json.dumps(records)))
+    assert [r.model_dump(exclude_none=True) for r in loaded] == records
+
+    lines = "\n".join(json.dumps(record) for record in records) + "\n\n"
+    assert add_._load_bulk_records(io.StringIO(lines)) == loaded
+
+    assert add_._load_bulk_records(io.StringIO('{"uuid": "a"}\n{"uuid":')) is None
+    assert add_._load_bulk_records(io.StringIO('[{"uuid": 1}]')) is None
+
+
+def test_resolve_job(tmp_path) -> None:
+    argv = arguments()
+    (tmp_path / "configs").mkdir()
+    (tmp_path / "configs" / "1.json").write_text(json.dumps(local_config(1)))
+
+    # relative paths are resolved against the records file
+    job = add_._BindJob(add_.BulkRecord(localConfig="configs/1.json"))
+    add_._resolve_job(argv, job, tmp_path)
+    assert not job.report.error
+    assert (job.report.uuid, job.report.mac) == (f"{1:032x}", "48:e1:e9:00:00:01")
+    assert job.user_id == USER_ID
+    assert job.firmware.server == argv.mqtt_domain  # privacy mode
+
+    # record values win over the config, the device user id is the fallback
+    argv.no_privacy, argv.user_id = True, None
+    job = add_._BindJob(add_.BulkRecord(uuid="x", mac="m", localConfig=local_config(2)))
+    add_._resolve_job(argv, job, tmp_path)
+    assert (job.report.uuid, job.report.mac, job.user_id) == ("x", "m", "2000")
+    assert job.firmware.server == "iot.meross.com"
+
+    for record, error in (
+        (add_.BulkRecord(uuid="a"), "Missing device IP"),
+        (add_.BulkRecord(localConfig="missing.json"), "Invalid local config"),
+        (add_.BulkRecord(localConfig={"firmware": {}}), "Invalid local config"),
+    ):
+        job = add_._BindJob(record)
+        add_._resolve_job(argv, job, tmp_path)
+        assert job.report.error.startswith(error)
+        assert not job.report.published and not job.report.bound
+
+
+class FakeInfo:
+    def __init__(self, published: bool) -> None:
+        self.published = published
+
+    def wait_for_publish(self, timeout: float) -> None:
+        pass
+
+    def is_published(self) -> bool:
+        return self.published
+
+
+class FakeClient:
+    clients: list["FakeClient"] = []
+
+    def __init__(self, uuid: str, mac: str, user_id: str) -> None:
+        self.username = mac
+        self.user_id = user_id
+        self.topics: list[str] = []
+        self.on_connect = None
+        self.closed = False
+        FakeClient.clients.append(self)
+
+    def connect(self, host: str, port: int, keepalive: int) -> None:
+        if self.username.endswith(":ff"):
+            raise OSError("unreachable")
+
+    def loop_start(self) -> None:
+        self.on_connect(self, None, {}, 5 if self.username.endswith(":fe") else 0)
+
+    def publish(self, topic: str, payload: bytes, qos: int = 0) -> FakeInfo:
+        message = json.loads(payload)
+        assert message["header"]["namespace"] == "Appliance.Control.Bind"
+        self.topics.append(topic)
+        return FakeInfo(not topic.startswith("/appliance/lost"))
+
+    def disconnect(self) -> None:
+        self.closed = True
+
+    def loop_stop(self) -> None:
+        pass
+
+
+def origin_device(uuid: str) -> OriginDevice:
+    return OriginDevice(
+        uuid=uuid,
+        devName=f"plug {uuid}",
+        devIconId="",
+        bindTime=0,
+        deviceType="mss310",
+        subType="un",
+        region="eu",
+        fmwareVersion="6.1.8",
+        hdwareVersion="6.0.0",
+        userDevIcon="",
+        iconType=0,
+        domain="",
+        reservedDomain="",
+        hardwareCapabilities=[],
+        channels=[],
+    )
+
+
+def test_cli_bulk(tmp_path, monkeypatch) -> None:
+    def request_device_info(argv, uuid):
+        if uuid == "unknown":
+            return None, "API status 1: not found"
+        return origin_device(uuid), ""
+
+    FakeClient.clients = []
+    monkeypatch.setattr(
+        add_, "_create_client", lambda argv, uuid, mac, user_id: FakeClient(uuid, mac, user_id)
+    )
+    monkeypatch.setattr(add_, "_request_device_info", request_device_info)
+
+    records = [
+        {"localConfig": local_config(1)},
+        # same credentials as the first record: published in the same session
+        {"uuid": "b", "mac": "48:E1:E9:00:00:01", "localConfig": local_config(1)},
+        {"uuid": "unknown", "localConfig": local_config(2)},
+        {"uuid": "lost", "localConfig": local_config(3)},
+        {"localConfig": local_config(4, mac="48:e1:e9:00:00:ff")},
+        {"localConfig": local_config(5, mac="48:e1:e9:00:00:fe")},
+        {"uuid": "nothing"},
+    ]
+    report = {item["uuid"]: item for item in run_bulk(tmp_path, records)}
+    assert list(report) == [
+        f"{1:032x}", "b", "unknown", "lost", f"{4:032x}", f"{5:032x}", "nothing"
+    ]
+    assert report[f"{1:032x}"]["bound"] and report["b"]["bound"]
+    assert report["b"]["device"] == "MSS310-UN (plug b)"
+    assert report["unknown"]["published"] and not report["unknown"]["bound"]
+    assert report["unknown"]["error"] == "API status 1: not found"
+    assert not report["lost"]["published"]
+    assert report["lost"]["error"] == "Bind message was not acknowledged"
+    assert report[f"{4:032x}"]["error"] == "MQTT connection failed: unreachable"
+    assert report[f"{5:032x}"]["error"] == "MQTT connection refused: 5"
+    assert report["nothing"]["error"] == "Missing device IP or local config"
+
+    # one session per MAC / user id, always closed
+    assert len(FakeClient.clients) == 5
+    assert all(client.closed for client in FakeClient.clients if client.topics)
+    (session,) = [client for client in FakeClient.clients if len(client.topics) == 2]
+    assert session.topics == [f"/appliance/{1:032x}/publish", "/appliance/b/publish"]
+    assert session.user_id == USER_ID
+
+
+def test_cli_bulk_nothing_to_do(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(add_, "_create_client", None)
+    assert run_bulk(tmp_path, [{"localConfig": local_config(1)}], token=None) is None
+    assert run_bulk(tmp_path, []) is None
@@ -0,0 +1,128 @@
+from caterpillar.py import pack
+
+from libmeross.ambz2.batch import VerifyCache, verify_paths
+from libmeross.ambz2.diff import Change, diff, sector_digests
+from libmeross.ambz2.image import FlashImage
+from libmeross.ambz2.layout import HASH_KEY, ImageType, PartitionType
+from libmeross.ambz2.verify import verify
+
+from conftest import FW1, FW2, build_partition_table
+
+
+def test_regions(flash_dump) -> None:
+    with FlashImage(flash_dump) as image:
+        assert image.calibration_valid
+        assert image.partition_table.info.num == 2
+        assert [r.name for r in image.regions[4:]] == ["boot", "fw1", "fw2"]
+        fw1 = image.region("fw1")
+        assert (fw1.offset, fw1.length) == FW1
+        assert fw1.record.type == PartitionType.FW1
+        assert image.region_at(FW1[0] + 0x100) is fw1
+        assert image.region_at(0x1800).name == "system data"
+        assert not image.errors
+
+        view = image.view("fw1")
+        assert isinstance(view, memoryview) and view.obj is image.data.obj
+        assert len(view) == FW1[1]
+        view.release()
+
+
+def test_image_headers(flash_dump) -> None:
+    with FlashImage(flash_dump) as image:
+        assert [h.type for h in image.image_headers("boot")] == [ImageType.BOOT]
+        headers = image.image_headers("fw1")
+        assert [h.type for h in headers] == [ImageType.FWHS_S, ImageType.XIP]
+        assert headers[1].offset == FW1[0] + 0x40 + 0x60 + 0x8000 + 32
+        assert image.image_headers("fw2") == []
+
+
+def test_erased_dump(tmp_path) -> None:
+    path = tmp_path / "erased.bin"
+    path.write_bytes(b"\xff" * 0x10000)
+    with FlashImage(path) as image:
+        assert not image.calibration_valid
+        assert image.partition_table is None
+        assert len(image.regions) == 4
+        assert image.errors
+
+
+def test_verify(flash_dump) -> None:
+    with FlashImage(flash_dump) as image:
+        checks = verify(image)
+    assert [(c.region, c.status) for c in checks] == [
+        ("calibration pattern", "passed"),
+        ("partition table", "passed"),
+        ("boot", "passed"),
+        ("fw1", "passed"),
+        ("fw1", "passed"),
+        ("fw2", "skipped"),
+    ]
+    assert checks[1].method == "hmac (default key)"
+    assert checks[2].method == "sha256"
+
+    # a flipped bit in the second segment of fw1
+    data = bytearray(flash_dump.read_bytes())
+    data[checks[4].offset + 0x100] ^= 1
+    flash_dump.write_bytes(data)
+    with FlashImage(flash_dump) as image:
+        assert [c.status for c in verify(image)][3:5] == ["passed", "failed"]
+
+
+def test_verify_batch(flash_dump, tmp_path) -> None:
+    good = bytearray(flash_dump.read_bytes())
+    (tmp_path / "copy.bin").write_bytes(good)
+    bad = bytearray(good)
+    bad[FW1[0] + 0x200] ^= 1
+    (tmp_path / "bad.bin").write_bytes(bad)
+    files = [flash_dump, tmp_path / "copy.bin", tmp_path / "bad.bin"]
+
+    def run() -> list:
+        cache = VerifyCache(tmp_path / "cache.json", [])
+        summaries = list(verify_paths(files, cache=cache, workers=1))
+        cache.save()
+        return [(s.status, s.segments_passed, s.cached) for s in summaries]
+
+    # copy.bin has the same content as flash.bin, but both are new
+    assert run() == [("passed", 3, False), ("passed", 3, False), ("failed", 2, False)]
+    assert run() == [("passed", 3, True), ("passed", 3, True), ("failed", 2, True)]
+
+    (tmp_path / "bad.bin").write_bytes(good + b"\xff")
+    assert run()[2] == ("passed", 3, False)
+    # other keys, other results
+    cache = VerifyCache(tmp_path / "cache.json", [bytes(32)])
+    assert not any(s.cached for s in verify_paths(files, [bytes(32)], cache, workers=1))
+
+
+def test_sign_partition_table() -> None:
+    table = build_partition_table()
+    table.hash = b"\xff" * 32
+    table.hdr.segment_size = 0
+    assert table.sign(HASH_KEY) == pack(build_partition_table())
+
+
+def test_diff(flash_dump, tmp_path) -> None:
+    data = bytearray(flash_dump.read_bytes())
+    data[0x30] ^= 1
+    data[FW1[0] + 0xFFF : FW1[0] + 0x1002] = b"\x00\x00\x00"  # crosses a sector
+    data[FW2[0] + 0x10] ^= 0xFF
+    data += b"\x00" * 4
+    other = tmp_path / "other.bin"
+    other.write_bytes(data)
+
+    with FlashImage(flash_dump) as a, FlashImage(other) as b:
+        assert diff(a, a).identical
+        result = diff(a, b, digests_a=sector_digests(a.data))
+    end = len(data) - 4
+    assert result.changed_sectors == [0, 16, 17, FW2[0] // 0x1000, end // 0x1000]
+    assert result.changes == [
+        Change(0x30, 1, "partition table"),
+        Change(FW1[0] + 0xFFF, 3, "fw1"),
+        Change(FW2[0] + 0x10, 1, "fw2"),
+        Change(end, 4, "unmapped"),
+    ]
+    assert [(r.name, r.sectors, r.bytes) for r in result.by_region()] == [
+        ("partition table", 1, 1),
+        ("fw1", 2, 3),
+        ("fw2", 1, 1),
+        ("unmapped", 1, 4),
+    ]
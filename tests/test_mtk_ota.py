@@ -0,0 +1,62 @@
+import hashlib
+import io
+import lzma
+import os
+
+import pytest
+
+from caterpillar.py import unpack
+
+from libmeross.mtk.image import fota_bin_info_t, fota_bin_t
+from libmeross.mtk.ota import SignatureError, extract_bin
+
+OFFSET = 0x100
+
+
+def build_bin(data: bytes) -> bytes:
+    return b"\x00" * OFFSET + data + hashlib.sha1(data).digest()
+
+
+def bin_info(length: int, compressed: bool) -> fota_bin_info_t:
+    return fota_bin_info_t(
+        bin_offset=OFFSET,
+        bin_start_addr=0x08000000,
+        bin_length=length,
+        partition_length=length,
+        sig_offset=OFFSET + length,
+        sig_length=20,
+        is_compressed=int(compressed),
+    )
+
+
+@pytest.mark.parametrize("compressed", [False, True])
+def test_extract_bin(compressed: bool) -> None:
+    plain = os.urandom(0x8000) * 8
+    data = lzma.compress(plain) if compressed else plain
+    info = bin_info(len(data), compressed)
+    fp = io.BytesIO(build_bin(data))
+
+    out = io.BytesIO()
+    assert extract_bin(fp, info, out, chunk_size=0x1000) == len(plain)
+    assert out.getvalue() == plain
+    # same result as unpacking the whole struct
+    fp.seek(OFFSET)
+    assert unpack(fota_bin_t, fp, length=len(data)).bin_data == data
+
+    broken = bytearray(fp.getvalue())
+    broken[-1] ^= 1
+    with pytest.raises(SignatureError):
+        extract_bin(io.BytesIO(broken), info)
+    with pytest.raises(EOFError):
+        extract_bin(io.BytesIO(fp.getvalue()[:-30]), info)
+
+
+def test_extract_concatenated_streams() -> None:
+    data = lzma.compress(b"a" * 0x3000) + lzma.compress(b"b" * 0x100)
+    out = io.BytesIO()
+    extract_bin(io.BytesIO(build_bin(data)), bin_info(len(data), True), out, chunk_size=0x80)
+    assert out.getvalue() == lzma.decompress(data)
+
+    with pytest.raises(lzma.LZMAError):
+        truncated = data[:-0x120]
+        extract_bin(io.BytesIO(build_bin(truncated)), bin_info(len(truncated), True))
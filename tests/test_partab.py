@@ -0,0 +1,76 @@
+import pytest
+
+from caterpillar.py import pack
+
+from libmeross.ambz2.image import FlashImage
+from libmeross.ambz2.layout import CALIBRATION_PATTERN
+from libmeross.ambz2.partab import SpecError, build_blob, expand_matrix, spec_from_table
+from libmeross.ambz2.reconstruct import reconstruct
+
+from conftest import BOOT, FW1, FW2, build_partition_table
+
+SPEC = {
+    "boot": {"start": hex(BOOT[0]), "length": hex(BOOT[1])},
+    "records": [
+        {"type": "fw1", "start": hex(FW1[0]), "length": hex(FW1[1])},
+        {"type": "FW2", "start": FW2[0], "length": FW2[1]},
+    ],
+}
+
+
+def test_build_blob() -> None:
+    blob = build_blob(SPEC)
+    assert blob[:16] == CALIBRATION_PATTERN
+    assert blob[16:0x20] == b"\xff" * 16
+    assert blob[0x20:] == pack(build_partition_table())
+
+
+def test_spec_from_dump(flash_dump) -> None:
+    with FlashImage(flash_dump) as image:
+        spec = spec_from_table(image.partition_table)
+        assert build_blob(spec) == bytes(image.data[: len(build_blob(SPEC))])
+
+
+def test_matrix() -> None:
+    spec = dict(SPEC, variants=[{"name": "a"}, {"name": "b", "eFWV": 1, "user_data": "0102"}])
+    tables = expand_matrix(spec)
+    assert [name for name, _ in tables] == ["a", "b"]
+    blobs = [build_blob(table) for _, table in tables]
+    assert blobs[0] == build_blob(SPEC)
+    assert len(blobs[1]) == len(blobs[0]) + 2
+
+    with pytest.raises(SpecError):
+        expand_matrix(dict(SPEC, variants=[{"name": "a"}, {"name": "a"}]))
+    with pytest.raises(SpecError, match="No variants"):
+        expand_matrix(dict(SPEC, variants=[]))
+    with pytest.raises(SpecError, match="not an object"):
+        expand_matrix(dict(SPEC, variants=[{"name": "a"}, "b"]))
+    with pytest.raises(SpecError):
+        build_blob(dict(SPEC, fw2_idx=3))
+    with pytest.raises(SpecError):
+        build_blob(dict(SPEC, eFWV=0x100))
+
+
+def test_reconstruct(flash_dump) -> None:
+    data = bytearray(flash_dump.read_bytes())
+    data[0x20:0x1000] = b"\xff" * (0x1000 - 0x20)
+    flash_dump.write_bytes(data)
+    with FlashImage(flash_dump) as image:
+        assert image.partition_table is None
+        result = reconstruct(image)
+
+    assert [found.offset for found in result.images] == [BOOT[0], FW1[0]]
+    assert result.spec["boot"] == {"start": hex(BOOT[0]), "length": hex(BOOT[1])}
+    # only FW1 holds an image: the free space is split in halves
+    assert result.spec["records"] == [
+        {"type": "FW1", "start": "0x10000", "length": "0xf8000"},
+        {"type": "FW2", "start": "0x108000", "length": "0xf8000"},
+    ]
+    assert result.notes
+
+    blob = build_blob(result.spec)
+    data[: len(blob)] = blob
+    flash_dump.write_bytes(data)
+    with FlashImage(flash_dump) as image:
+        assert image.partition_table is not None
+        assert image.region("fw1").offset == FW1[0]
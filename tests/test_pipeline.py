@@ -0,0 +1,112 @@
+import time
+
+from libmeross.pipeline import (
+    InboundPipeline,
+    InboundResult,
+    ReplayFilter,
+    ShardedPipeline,
+    Verdict,
+    process_message,
+)
+from libmeross.protocol import LocalMessage
+
+KEY = "secret"
+
+
+def message(key: str | None = KEY, age: float = 0) -> LocalMessage:
+    msg = LocalMessage.new("PUSH", "Appliance.Control.ToggleX", {"togglex": {"onoff": 1}}, KEY)
+    if age or key != KEY:
+        header = msg.header
+        header.timestamp -= int(age)
+        header.sign, _ = LocalMessage.signature(header.messageId, header.timestamp, key)
+    return msg
+
+
+def test_replay_filter_bounds() -> None:
+    seen = ReplayFilter(capacity=3, window=10)
+    for idx in range(5):
+        seen.add(str(idx), now=100.0 + idx)
+    # least recently added ids are evicted first
+    assert list(seen.entries) == ["2", "3", "4"]
+    seen.add("2", now=105.0)
+    seen.add("5", now=106.0)
+    assert list(seen.entries) == ["4", "2", "5"]
+
+    seen.expire(now=114.5)
+    assert list(seen.entries) == ["2", "5"]
+    seen.expire(now=200.0)
+    assert len(seen) == 0
+
+
+def test_duplicates() -> None:
+    pipeline = InboundPipeline(KEY)
+    msg = message()
+    assert pipeline.check(msg) is Verdict.ACCEPTED
+    assert pipeline.check(msg) is Verdict.DUPLICATE
+    assert pipeline.check(message()) is Verdict.ACCEPTED
+
+    # a full filter forgets the oldest id
+    pipeline = InboundPipeline(KEY, capacity=2)
+    first, *others = [message() for _ in range(3)]
+    for msg in (first, *others):
+        assert pipeline.accept(msg)
+    assert pipeline.check(others[-1]) is Verdict.DUPLICATE
+    assert pipeline.check(first) is Verdict.ACCEPTED
+    assert len(pipeline.seen) == 2
+
+
+def test_stale_and_forged() -> None:
+    pipeline = InboundPipeline(KEY, max_age=60)
+    assert pipeline.check(message(age=30)) is Verdict.ACCEPTED
+    assert pipeline.check(message(age=120)) is Verdict.STALE
+
+    forged = message(key="other")
+    assert pipeline.check(forged) is Verdict.INVALID_SIGNATURE
+    # forged messages are not remembered: the genuine one still passes
+    genuine = forged.model_copy(deep=True)
+    genuine.header.sign, _ = LocalMessage.signature(
+        genuine.header.messageId, genuine.header.timestamp, KEY
+    )
+    assert pipeline.check(genuine) is Verdict.ACCEPTED
+
+    assert pipeline.stats.accepted == 2
+    assert (pipeline.stats.stale, pipeline.stats.invalid) == (1, 1)
+    assert InboundPipeline(KEY, verify=False).accept(forged)
+
+
+def test_process_message() -> None:
+    pipeline = InboundPipeline(KEY)
+    now = int(time.time() * 1000)
+    msg = message()
+    result = process_message(pipeline, "uuid", now, msg.model_dump_json().encode())
+    assert result == InboundResult(
+        "uuid", now, Verdict.ACCEPTED, msg.header.namespace, "PUSH", msg.payload
+    )
+    result = process_message(pipeline, "uuid", now, msg.model_dump_json().encode())
+    assert result.verdict is Verdict.DUPLICATE
+
+    result = process_message(pipeline, "uuid", now, b'{"header": {}}')
+    assert result.verdict is Verdict.MALFORMED and result.error
+
+
+def test_sharded_order() -> None:
+    results = []
+    pipeline = ShardedPipeline(results.append, workers=2, batch_size=7, verify=False)
+    try:
+        uuids = [f"{idx:032x}" for idx in range(6)]
+        # every worker gets some of the devices
+        assert {pipeline.shard(uuid) for uuid in uuids} == {0, 1}
+        for seq in range(100):
+            for uuid in uuids:
+                msg = LocalMessage.new("PUSH", "Appliance.Control.ToggleX", {"seq": seq})
+                pipeline.submit(uuid, msg.model_dump_json().encode())
+            if seq % 10 == 0:
+                pipeline.flush()
+    finally:
+        pipeline.close(timeout=10)
+
+    assert len(results) == 600
+    assert all(result.verdict is Verdict.ACCEPTED for result in results)
+    for uuid in uuids:
+        assert [r.payload["seq"] for r in results if r.uuid == uuid] == list(range(100))
+    assert pipeline.stats.accepted == 600
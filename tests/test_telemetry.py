@@ -0,0 +1,75 @@
+import time
+
+from libmeross.telemetry import TelemetryWriter, list_segments, query
+
+NOW = int(time.time() * 1000)
+ELECTRICITY = "Appliance.Control.Electricity"
+
+
+def payload(timestamp: int) -> dict:
+    return {"electricity": {"channel": 0, "power": timestamp % 1000, "tags": ["x", "y"]}}
+
+
+def write(writer: TelemetryWriter, timestamp: int, uuid: str = "a", namespace: str = ELECTRICITY):
+    writer.append(uuid, namespace, "PUSH", payload(timestamp), timestamp=timestamp)
+
+
+def test_round_trip(tmp_path) -> None:
+    for compression in ("zlib", "lzma"):
+        directory = tmp_path / compression
+        writer = TelemetryWriter(directory, compression=compression, block_records=3)
+        for idx in range(10):
+            write(writer, NOW + idx, uuid="ab"[idx % 2], namespace=f"ns{idx % 3}")
+        writer.close()
+
+        records = list(query(directory))
+        assert [r.timestamp for r in records] == [NOW + idx for idx in range(10)]
+        assert records[3].payload == payload(NOW + 3)
+        assert records[3].method == "PUSH"
+        assert [r.timestamp - NOW for r in query(directory, uuid="b")] == [1, 3, 5, 7, 9]
+        assert [r.timestamp - NOW for r in query(directory, namespace="ns0")] == [0, 3, 6, 9]
+        selected = query(directory, uuid="a", since=NOW + 2, until=NOW + 6)
+        assert [r.timestamp - NOW for r in selected] == [2, 4, 6]
+
+        # the index is rebuilt from the block headers
+        for path in list_segments(directory):
+            path.with_suffix(".idx").unlink()
+        assert len(list(query(directory, uuid="a"))) == 5
+
+
+def test_max_segments(tmp_path) -> None:
+    # every block starts a new segment
+    writer = TelemetryWriter(tmp_path, block_records=1, segment_size=1, max_segments=2)
+    for idx in range(5):
+        write(writer, NOW + idx * 1000)
+    writer.close()
+    assert [r.timestamp for r in query(tmp_path)] == [NOW + 3000, NOW + 4000]
+
+
+def test_retention(tmp_path) -> None:
+    writer = TelemetryWriter(tmp_path, block_records=1, segment_size=1, retention=3600)
+    write(writer, NOW - 7200 * 1000)
+    write(writer, NOW - 60 * 1000)
+    write(writer, NOW)
+    writer.close()
+    assert [r.timestamp for r in query(tmp_path)] == [NOW - 60 * 1000, NOW]
+
+
+def test_retention_keeps_active_segment(tmp_path) -> None:
+    # the clock stepped back: the active segment is the first one by name
+    writer = TelemetryWriter(tmp_path, block_records=1, segment_size=1, max_segments=2)
+    write(writer, NOW)
+    write(writer, NOW + 1000)
+    write(writer, NOW - 5000)
+    write(writer, NOW - 4000)
+    writer.close()
+    assert NOW - 4000 in [r.timestamp for r in query(tmp_path)]
+
+    # records older than the retention period, in the segment being written
+    writer = TelemetryWriter(tmp_path / "old", block_records=2, segment_size=1, retention=60)
+    write(writer, 1000)
+    write(writer, 2000)
+    write(writer, 3000)
+    write(writer, 4000)
+    writer.close()
+    assert [r.timestamp for r in query(tmp_path / "old")] == [3000, 4000]
@@ -0,0 +1,47 @@
+import threading
+import time
+
+from libmeross.commands.chip.amebaz2.transport import SerialTransport
+
+
+class SlowPort:
+    """Hands out a stale chunk once the pending read is cancelled."""
+
+    timeout = 0.2
+    in_waiting = 0
+
+    def __init__(self) -> None:
+        self.chunks = [b"stale", b"fresh\n"]
+        self.reading = threading.Event()
+        self.release = threading.Event()
+
+    def read(self, size: int = 1) -> bytes:
+        if not self.chunks:
+            time.sleep(self.timeout)
+            return b""
+        chunk = self.chunks.pop(0)
+        if chunk == b"stale":
+            self.reading.set()
+            self.release.wait(1)
+        return chunk
+
+    def cancel_read(self) -> None:
+        self.release.set()
+
+    def reset_input_buffer(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+def test_reset_drops_pending_read() -> None:
+    port = SlowPort()
+    ser = SerialTransport(port)
+    try:
+        # the reader thread holds the stale chunk while the buffer is reset
+        assert port.reading.wait(1)
+        ser.reset_input_buffer()
+        assert ser.readline() == b"fresh\n"
+    finally:
+        ser.close()